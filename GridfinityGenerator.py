@@ -1,4 +1,5 @@
 # Assuming you have not changed the general structure of the template no modification is needed in this file.
+import time
 from . import commands
 from .lib import fusion360utils as futil
 
@@ -6,7 +7,9 @@ from .lib import fusion360utils as futil
 def run(context):
     try:
         # This will run the start function in each of your commands as defined in commands/__init__.py
+        started = time.perf_counter()
         commands.start()
+        futil.log(f'GridfinityGenerator: add-in loaded in {(time.perf_counter() - started) * 1000:.0f} ms')
 
     except:
         futil.handle_error('run')
@@ -0,0 +1,130 @@
+"""Recording stand-in for the Fusion 360 `adsk` API.
+
+`install()` registers fake `adsk`, `adsk.core` and `adsk.fusion` modules.
+Every object handed out is a Recorder: attribute reads return stable child
+recorders, calls return new ones, and each read, call and assignment is
+counted so benchmarks can report API traffic per bin without Fusion.
+
+`load_addin()` then imports the add-in package from the repository root
+under a fixed name, whatever the checkout folder is called.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+ADDIN_PACKAGE = 'gridfinity_addin'
+
+# Values for attributes the add-in compares or branches on
+CONSTANTS = {
+    'PlaneSurfaceType': 1,
+    'surfaceType': 1,
+    'ParametricDesignType': 1,
+    'DirectDesignType': 0,
+    'designType': 1,
+    'isComputeDeferred': False,
+    'isValid': True,
+    'count': 1,
+    'z': float('inf'),
+}
+ITERATION_LENGTH = 6  # Items yielded when a collection is iterated, e.g. body faces
+
+
+class CallStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.gets = 0
+        self.sets = 0
+        self.by_name = {}
+
+    @property
+    def total(self):
+        return self.calls + self.gets + self.sets
+
+    def record(self, kind, name):
+        setattr(self, kind, getattr(self, kind) + 1)
+        self.by_name[name] = self.by_name.get(name, 0) + 1
+
+
+stats = CallStats()
+
+
+class Recorder:
+    """Any Fusion object: every property exists and every method succeeds"""
+
+    def __init__(self, name='adsk'):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_children', {})
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        stats.record('gets', name)
+        if name in CONSTANTS:
+            return CONSTANTS[name]
+        children = object.__getattribute__(self, '_children')
+        if name not in children:
+            children[name] = Recorder(name)
+        return children[name]
+
+    def __setattr__(self, name, value):
+        stats.record('sets', name)
+        object.__setattr__(self, name, value)
+
+    def __call__(self, *args, **kwargs):
+        name = object.__getattribute__(self, '_name')
+        stats.record('calls', name)
+        if name == 'cast' and args:
+            return args[0]
+        return Recorder(name)
+
+    def __iter__(self):
+        name = object.__getattribute__(self, '_name')
+        return iter([Recorder(name) for _ in range(ITERATION_LENGTH)])
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f'<Recorder {object.__getattribute__(self, "_name")}>'
+
+
+class _Handler:
+    def __init__(self):
+        pass
+
+
+def _module(name, handler_names):
+    module = types.ModuleType(name)
+    root = Recorder(name)
+    for handler_name in handler_names:
+        setattr(module, handler_name, type(handler_name, (_Handler,), {}))
+    module.__getattr__ = lambda attribute: getattr(root, attribute)
+    return module
+
+
+def install():
+    """Register the stub modules, returns the shared CallStats"""
+    adsk = types.ModuleType('adsk')
+    adsk.core = _module('adsk.core', ('CommandEventHandler', 'CommandCreatedEventHandler',
+                                      'InputChangedEventHandler', 'CustomEventHandler'))
+    adsk.fusion = _module('adsk.fusion', ())
+    adsk.doEvents = lambda: None
+    sys.modules.update({'adsk': adsk, 'adsk.core': adsk.core, 'adsk.fusion': adsk.fusion})
+    return stats
+
+
+def load_addin(module='commands.BatchProcessorCommand'):
+    """Import an add-in module (relative imports included) with the stub installed"""
+    if 'adsk' not in sys.modules:
+        install()
+    if ADDIN_PACKAGE not in sys.modules:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        package = types.ModuleType(ADDIN_PACKAGE)
+        package.__path__ = [root]
+        sys.modules[ADDIN_PACKAGE] = package
+    return importlib.import_module(f'{ADDIN_PACKAGE}.{module}')
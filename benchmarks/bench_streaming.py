@@ -0,0 +1,53 @@
+"""Peak memory of the streaming batch readers against file size.
+
+Writes synthetic catalogs of growing size in every supported format, then
+streams them through the planner with tracemalloc enabled. Peak memory
+should stay flat while the row count grows.
+
+    python -m benchmarks.bench_streaming [max rows]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import EXTENSIONS, write_catalog
+import config
+from lib import batch_planner
+from lib import grid_profiles
+
+GRIDS = grid_profiles.GridSet(config.GRID_CONFIG, config.ACTIVE_GRID)
+
+def measure(path, size_group):
+    """Stream a file through the planner, return (bins, seconds, peak bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    bins, _, errors = batch_planner.scan_batch(path, size_group, GRIDS)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if errors:
+        raise RuntimeError(f'{path}: {errors[:3]}')
+    return bins, elapsed, peak
+
+
+def main(argv):
+    max_rows = int(argv[1]) if len(argv) > 1 else 100000
+    row_counts = [count for count in (1000, 10000, 100000, 1000000) if count <= max_rows]
+    print(f'{"format":<8}{"rows":>10}{"group":>7}{"bins":>10}{"rows/s":>12}{"peak KiB":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in EXTENSIONS:
+            for rows in row_counts:
+                path = write_catalog(directory, rows, extension)
+                for size_group in (0, 3):
+                    bins, elapsed, peak = measure(path, size_group)
+                    print(f'{extension:<8}{rows:>10}{size_group:>7}{bins:>10}'
+                          f'{rows / elapsed:>12.0f}{peak / 1024:>10.1f}')
+                os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,197 @@
+"""Throughput benchmarks for parsing, planning and generation.
+
+Runs without Fusion 360: batch files are synthetic, Fusion calls go to the
+recording stub in benchmarks/adsk_stub.py.
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --sizes 100,10000,1000000 --baseline results.json
+
+Metrics ending in `_per_s` are better when higher, all others when lower.
+With --baseline the run fails (exit code 1) when any metric regresses by
+more than --threshold, rises from zero or is no longer reported.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import adsk_stub
+from benchmarks.synthetic import EXTENSIONS, write_catalog
+import config
+from lib import batch_index
+from lib import batch_planner
+from lib import batch_readers
+from lib import grid_profiles
+from lib import mesh_backend
+
+DEFAULT_SIZES = (100, 10000)
+API_ROWS = 100
+GRIDS = grid_profiles.GridSet(config.GRID_CONFIG, config.ACTIVE_GRID)
+
+
+def best_time(function, repeat):
+    """Shortest wall time of `repeat` runs and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def check_index(path, size_group):
+    """Fail when seeking through the sidecar index streams other rows than the plain reader"""
+    batch_index.build_index(path, GRIDS)
+    indexed = list(batch_index.iter_records(path, size_group))
+    read = list(batch_readers.iter_records(path, size_group))
+    if indexed != read:
+        raise RuntimeError(f'{path}: group {size_group} index path streams {len(indexed)} rows, '
+                           f'reader streams {len(read)}')
+
+
+def bench_file(path, rows, metrics, prefix):
+    check_index(path, 3)
+    repeat = max(1, min(5, 10000 // rows))
+
+    def parse():
+        return sum(1 for _ in batch_readers.iter_records(path))
+
+    elapsed, _ = best_time(parse, repeat)
+    metrics[f'parse.{prefix}.rows_per_s'] = rows / elapsed
+
+    elapsed, jobs = best_time(lambda: batch_planner.plan_batch(path, 0, GRIDS), repeat)
+    metrics[f'plan.{prefix}.jobs_per_s'] = len(jobs) / elapsed
+    del jobs
+
+    tracemalloc.start()
+    batch_planner.scan_batch(path, 0, GRIDS)
+    metrics[f'memory.{prefix}.scan_peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+
+def bench_api(directory, metrics):
+    """Fusion API traffic per bin through the stubbed generator and batch executor"""
+    stats = adsk_stub.install()
+    # Measure the feature chain itself, not the on-disk geometry cache
+    adsk_stub.load_addin('config').USE_GEOMETRY_CACHE = False
+    batch = adsk_stub.load_addin('commands.BatchProcessorCommand')
+    generator = adsk_stub.load_addin('commands.BinGeneratorCommand')
+    jobs = batch_planner.plan_batch(write_catalog(directory, API_ROWS, '.csv'), 0, GRIDS)
+
+    specs = list(dict.fromkeys(job.spec for job in jobs))
+    failed = 0
+    stats.reset()
+    for spec in specs:
+        try:
+            generator.generate_bin(spec.width, spec.length, spec.height, spec.compartments,
+                                   {name: True for name in spec.features})
+        except Exception:
+            failed += 1
+    metrics['api.generate_bin.calls_per_bin'] = stats.total / len(specs)
+    metrics['api.generate_bin.failed_bins'] = failed
+
+    failed = 0
+    stats.reset()
+    batch.component_cache.reset_stats()
+    for job in jobs:
+        try:
+            batch.execute_plan([job])
+        except Exception:
+            failed += 1
+    metrics['api.batch.calls_per_bin'] = stats.total / len(jobs)
+    metrics['api.batch.failed_bins'] = failed
+
+
+def bench_mesh(metrics):
+    backend = mesh_backend.MeshBackend(config.GRID_CONFIG[config.ACTIVE_GRID])
+    specs = [(width, length, 3, (width, length)) for width in range(1, 9) for length in range(1, 9)]
+    elapsed, _ = best_time(lambda: [backend.generate_bin(*spec) for spec in specs], 3)
+    metrics['mesh.bins_per_s'] = len(specs) / elapsed
+
+
+def run(sizes):
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            for extension in EXTENSIONS:
+                path = write_catalog(directory, rows, extension)
+                bench_file(path, rows, metrics, f'{extension[1:]}.{rows}')
+                os.remove(path)
+        bench_api(directory, metrics)
+    bench_mesh(metrics)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sizes': list(sizes),
+        },
+        'metrics': metrics,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return (metric, baseline, current, change) rows that regressed beyond threshold.
+
+    A metric missing from the current run is a regression with value and
+    change None, so is any rise from a zero baseline of a lower-is-better
+    metric such as `api.*.failed_bins` (change is infinite).
+    """
+    regressions = []
+    for name, base in sorted(baseline['metrics'].items()):
+        value = current['metrics'].get(name)
+        higher_is_better = name.endswith('_per_s')
+        if value is None:
+            regressions.append((name, base, None, None))
+            continue
+        if not base:
+            if not higher_is_better and value > 0:
+                regressions.append((name, base, value, float('inf')))
+            continue
+        change = (value - base) / base
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append((name, base, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gridfinity generator benchmarks')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated row counts, e.g. 100,10000,1000000')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='allowed relative regression, default 0.15')
+    args = parser.parse_args(argv)
+
+    results = run([int(size) for size in args.sizes.split(',')])
+    for name, value in sorted(results['metrics'].items()):
+        print(f'{name:<44}{value:>16.2f}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, value, change in regressions:
+            if value is None:
+                print(f'REGRESSION {name}: {base:.2f} -> missing')
+            else:
+                print(f'REGRESSION {name}: {base:.2f} -> {value:.2f} ({change:+.1%})')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
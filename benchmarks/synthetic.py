@@ -0,0 +1,49 @@
+"""Synthetic batch catalogs for benchmarks.
+
+Files are written row by row so catalogs of millions of rows never have to
+fit in memory.
+"""
+
+import json
+import os
+
+GROUPS = 8
+SIZES = ('10x10', '10x20', '20x20', '20x30', '30x30')
+COMPARTMENTS = ('1x1', '1x2', '2x2', '3x3')
+FEATURES = ('base', 'base+magnet', 'base+magnet+label', 'base+magnet+scoop')
+EXTENSIONS = ('.csv', '.txt', '.json', '.jsonl')
+
+
+def write_catalog(directory, rows, extension):
+    """Write a catalog with `rows` bins spread over GROUPS groups, returns its path"""
+    path = os.path.join(directory, f'catalog_{rows}{extension}')
+    with open(path, 'w', newline='') as file:
+        if extension == '.csv':
+            file.write('Group,BinSize,Quantity,TrayPosition,Compartments,Features\n')
+            for i in range(rows):
+                file.write(f'{i % GROUPS + 1},{SIZES[i % len(SIZES)]},1,0:160:90,'
+                           f'{COMPARTMENTS[i % len(COMPARTMENTS)]},{FEATURES[i % len(FEATURES)]}\n')
+        elif extension == '.txt':
+            # One row before the first header belongs to no size group
+            if rows:
+                file.write(f'{SIZES[0]},1,Level0,Pos[0-240,140]\n')
+                rows -= 1
+            per_group, remainder = divmod(rows, GROUPS)
+            for group in range(1, GROUPS + 1):
+                file.write(f'GROUP{group}_BINS:\n')
+                for i in range(per_group + (1 if group <= remainder else 0)):
+                    file.write(f'{SIZES[i % len(SIZES)]},1,Level{i % 6},Pos[0-240,140]\n')
+        else:
+            if extension == '.json':
+                file.write('{"bins": [\n')
+            for i in range(rows):
+                item = {'Group': i % GROUPS + 1, 'BinSize': SIZES[i % len(SIZES)], 'Quantity': 1,
+                        'TrayPosition': '0:160:90', 'Compartments': COMPARTMENTS[i % len(COMPARTMENTS)],
+                        'Features': {'magnet': i % 2 == 0, 'label': i % 3 == 0}}
+                if extension == '.json':
+                    file.write((',\n' if i else '') + json.dumps(item))
+                else:
+                    file.write(json.dumps(item) + '\n')
+            if extension == '.json':
+                file.write('\n]}\n')
+    return path
@@ -1,15 +1,329 @@
 import adsk.core
 import adsk.fusion
-import json
-import csv
 import os
+import time
+from contextlib import ExitStack
 from ..lib import fusion360utils as futil
+from ..lib import batch_estimate
+from ..lib import batch_index
+from ..lib import batch_journal
+from ..lib import batch_progress
+from ..lib import bin_geometry
+from ..lib import batch_planner
+from ..lib import batch_readers
+from ..lib import batch_sync
+from ..lib import grid_profiles
+from ..lib import mesh_export
+from ..lib import placement
+from ..lib import plan_cache
 from .. import config
+from . import BATCH_PROCESSOR
 from . import BinGeneratorCommand
 
 app = adsk.core.Application.get()
 ui = app.userInterface
 
+
+class BinComponentCache:
+    """Per-design cache of generated bin components keyed by (normalized spec, grid).
+
+    The first bin of a spec is built through the full feature chain, every
+    further bin of the same spec is placed as a new occurrence of the
+    already built component.
+    """
+
+    def __init__(self):
+        self.design = None
+        self.components = {}
+        self.hits = 0
+        self.misses = 0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, design):
+        """Drop cached components if the design changed"""
+        if self.design is None or self.design != design:
+            self.components.clear()
+            self.design = design
+
+    def adopt(self, design):
+        """Reuse components stamped with their spec by earlier runs, also from saved designs"""
+        self.validate(design)
+        for attribute in design.findAttributes(batch_sync.ATTRIBUTE_GROUP, batch_sync.SPEC_ATTRIBUTE):
+            comp = attribute.parent
+            if comp is None or not comp.isValid:
+                continue
+            try:
+                spec, grid = batch_sync.spec_from_json(attribute.value)
+            except (TypeError, ValueError):
+                continue
+            self.components.setdefault((spec, grid), comp)
+
+    def place_bin(self, spec, transform=None, grid=None):
+        """Return a new occurrence of the bin at `transform`, generating it only on a cache miss"""
+        design = adsk.fusion.Design.cast(app.activeProduct)
+        rootComp = design.rootComponent
+        self.validate(design)
+
+        grid = grid or config.ACTIVE_GRID
+        key = (spec, grid)
+        comp = self.components.get(key)
+        if comp is not None and comp.isValid:
+            self.hits += 1
+            return rootComp.occurrences.addExistingComponent(comp, transform or adsk.core.Matrix3D.create())
+
+        self.misses += 1
+        comp = BinGeneratorCommand.generate_bin(
+            width_units=spec.width,
+            length_units=spec.length,
+            height_units=spec.height,
+            compartments=spec.compartments,
+            features={name: True for name in spec.features},
+            grid=grid
+        )
+        comp.attributes.add(batch_sync.ATTRIBUTE_GROUP, batch_sync.SPEC_ATTRIBUTE,
+                            batch_sync.spec_json(spec, grid))
+        self.components[key] = comp
+        occurrence = rootComp.allOccurrencesByComponent(comp).item(0)
+        if transform is not None:
+            occurrence.transform = transform
+        return occurrence
+
+    def summary(self):
+        return f'Component cache: {self.hits} hits, {self.misses} misses'
+
+
+component_cache = BinComponentCache()
+
+
+def report_batch(message):
+    """Show the batch result together with component and geometry cache statistics"""
+    stats = f'{component_cache.summary()}\n{BinGeneratorCommand.geometry_cache.summary()}'
+    futil.log(f'{CMD_NAME}: {message}. {stats}')
+    if config.DEBUG:
+        futil.log(futil.format_timing_summary())
+        if config.PROFILE_EXPORT_PATH:
+            futil.export_timings(config.PROFILE_EXPORT_PATH)
+    ui.messageBox(f'{message}\n{stats}')
+
+
+class BatchRun:
+    """A planned batch built a chunk of bins per custom event, cancellable between bins
+    
+    Every step deletes, moves or builds and stamps one bin before the next
+    one starts, so a cancelled run leaves stamped bins an incremental
+    re-run completes. Finished and failed jobs are appended to `journal`.
+    Without `sync` jobs in `done` (completed by an interrupted run) are
+    skipped, with it `sync.add` read from the design is trusted instead: a
+    bin the journal lists may have been lost when Fusion closed unsaved.
+    Only the job `indexes` of a shard are built, all of them by default.
+    """
+    
+    def __init__(self, config_file, size_group, jobs, positions, stamps, sync=None, notes=(),
+                 export_directory=None, grids=None, indexes=None, journal=None, done=(), shard=None):
+        self.config_file = config_file
+        self.size_group = size_group
+        self.jobs = jobs
+        self.positions = positions
+        self.stamps = stamps
+        self.sync = sync
+        self.notes = list(notes)
+        self.export_directory = export_directory
+        self.grids = grids
+        self.indexes = range(len(jobs)) if indexes is None else indexes
+        self.journal = journal
+        self.shard = shard
+        if sync is None:
+            deletes, moves, adds = (), (), list(self.indexes)
+        else:
+            in_shard = set(self.indexes)
+            deletes = sync.delete
+            moves = [(index, placed) for index, placed in sync.move if index in in_shard]
+            adds = [index for index in sync.add if index in in_shard]
+            done = ()
+        self.resumed = sum(1 for index in adds if jobs[index].job_id in done)
+        self.steps = ([('delete', None, placed) for placed in deletes] +
+                      [('move', index, placed) for index, placed in moves] +
+                      [('add', index, None) for index in adds if jobs[index].job_id not in done])
+        self.exported = set()  # (spec, grid) exported as they were built
+        self.next_step = 0
+        self.generated = 0
+        self.progress = batch_progress.BatchProgress(len(self.steps))
+        self.dialog = None
+        self.stack = ExitStack()
+        self.samples = []  # (Operations, seconds) of built bins, calibrate the dry-run estimate
+        self.operations = {}
+    
+    def begin(self, design, capture_history):
+        """Suspend recompute until the run ends and show the progress dialog"""
+        if self.export_directory:
+            os.makedirs(self.export_directory, exist_ok=True)
+        self.stack.enter_context(futil.deferred_compute(design, capture_history,
+                                                        f'{CMD_NAME} {self.config_file}'))
+        self.dialog = ui.createProgressDialog()
+        self.dialog.isCancelButtonShown = True
+        self.dialog.cancelButtonText = 'Cancel'
+        self.dialog.show(CMD_NAME, self.progress.status(), 0, max(len(self.steps), 1), 0)
+    
+    @property
+    def cancelled(self):
+        return self.dialog is not None and self.dialog.wasCancelled
+    
+    def run_chunk(self, budget):
+        """Run steps for about `budget` seconds, False once nothing is left or the user cancelled"""
+        started = time.perf_counter()
+        while self.next_step < len(self.steps) and not self.cancelled:
+            self.run_step(*self.steps[self.next_step])
+            self.next_step += 1
+            if time.perf_counter() - started >= budget:
+                break
+        self.dialog.progressValue = self.progress.done
+        self.dialog.message = self.progress.status()
+        return self.next_step < len(self.steps) and not self.cancelled
+    
+    def run_step(self, kind, index, placed):
+        started = time.perf_counter()
+        files = ()
+        try:
+            if kind == 'delete':
+                placed.handle.deleteMe()
+                group = placed.group
+            elif kind == 'move':
+                move_bin(self.jobs, self.positions, index, placed, self.stamps)
+                group = self.jobs[index].group
+            else:
+                misses = component_cache.misses
+                imports = BinGeneratorCommand.geometry_cache.hits
+                build_bin(self.jobs, self.positions, index, self.stamps)
+                self.generated += 1
+                group = self.jobs[index].group
+                built = component_cache.misses != misses
+                # Bins imported from the geometry cache say nothing about the cost of building one
+                if BinGeneratorCommand.geometry_cache.hits == imports:
+                    self.record_sample(index, built, time.perf_counter() - started)
+                if built and self.export_directory:
+                    # Exported right away so an interrupted run keeps them
+                    files = self.export_job(index)
+        except Exception as e:
+            if index is not None:
+                self.log_job(index, 'failed', time.perf_counter() - started, error=str(e))
+            raise
+        seconds = time.perf_counter() - started
+        if index is not None:
+            self.log_job(index, 'done', seconds, files)
+        self.progress.record(group, seconds)
+    
+    def log_job(self, index, status, seconds, files=(), error=''):
+        if self.journal is not None:
+            job = self.jobs[index]
+            self.journal.record(job.job_id, batch_journal.job_spec_hash(job, self.grids), status, seconds,
+                                [os.path.basename(path) for path in files], error)
+    
+    def export_job(self, index):
+        job = self.jobs[index]
+        key = (job.spec, self.grids.resolve(job.grid))
+        self.exported.add(key)
+        return export_component(component_cache.components.get(key), *key, self.export_directory)
+    
+    def record_sample(self, index, built, seconds):
+        operations = batch_estimate.PLACEMENT
+        if built:
+            job = self.jobs[index]
+            key = (job.grid, job.spec)
+            operations = self.operations.get(key)
+            if operations is None:
+                operations = self.operations[key] = batch_estimate.spec_operations(
+                    self.grids.profile(job.grid), job.spec)
+        self.samples.append((operations, seconds))
+    
+    def close(self):
+        """Recompute once and hide the dialog, safe to call more than once"""
+        self.stack.close()
+        if self.dialog is not None:
+            self.dialog.hide()
+        if self.journal is not None:
+            self.journal.close()
+    
+    def finish(self):
+        self.close()
+        batch_estimate.record_samples(config.COST_SAMPLES_PATH, self.samples)
+        progress = self.progress
+        if progress.finished:
+            message = f'Generated {self.generated} bins from {self.config_file} for Size Group {self.size_group}'
+        else:
+            message = (f'Cancelled after {progress.done} of {progress.total} bins from {self.config_file}, '
+                       f'run again with Resume Interrupted Run to finish')
+        message += f'\n{batch_progress.format_duration(progress.elapsed)}, {progress.throughput:.1f} bins/s'
+        if self.sync is not None:
+            message += f'\nUpdate: {self.sync.summary()}'
+        if self.resumed:
+            message += f'\nResumed: skipped {self.resumed} bins completed by the interrupted run'
+        if self.shard is not None:
+            message += f'\nShard {self.shard.index} of {self.shard.count}: {len(self.indexes)} of {len(self.jobs)} bins'
+        for line in self.notes + progress.group_summary():
+            message += f'\n{line}'
+        if self.export_directory and progress.finished:
+            message += self.export()
+        if self.journal is not None and progress.finished:
+            self.journal.finish()
+            self.journal.close()
+        report_batch(message)
+    
+    def export(self):
+        """Export the specs not exported while building and the manifest, merge complete shards"""
+        jobs = [self.jobs[index] for index in self.indexes]
+        export_components(jobs, self.export_directory, self.grids, exported=self.exported)
+        files = [path for spec, grid in dict.fromkeys((job.spec, self.grids.resolve(job.grid)) for job in jobs)
+                 for path in export_paths(self.export_directory, spec, grid) if os.path.isfile(path)]
+        message = f'\nExported {len(files)} files to {self.export_directory}'
+        if self.shard is None:
+            return message
+        batch_journal.write_shard_manifest(self.export_directory, self.config_file, self.journal.plan, self.shard,
+                                           jobs, len(self.jobs), mesh_export.manifest_rows(jobs, self.grids),
+                                           files)
+        # Shards built on this machine are merged as soon as the last one is done
+        parent = os.path.dirname(self.export_directory)
+        if len(batch_journal.find_shards([parent])) == self.shard.count:
+            try:
+                message += f'\n{batch_journal.merge_shards([parent], parent).describe()}'
+            except (OSError, ValueError) as e:
+                # Leftover shards of an older run, this shard is still complete
+                futil.log(f'{CMD_NAME}: could not merge shards in {parent}: {e}')
+                message += f'\nShards not merged: {e}'
+        return message
+    
+    def fail(self, error):
+        self.close()
+        ui.messageBox(f'Batch processing failed after {self.progress.done} of {self.progress.total} bins:\n'
+                      f'{str(error)}')
+
+
+# The batch being built, at most one at a time
+active_runs = []
+
+
+class BatchStepHandler(adsk.core.CustomEventHandler):
+    def __init__(self):
+        super().__init__()
+    
+    def notify(self, args):
+        if not active_runs:
+            return
+        run = active_runs[0]
+        try:
+            if run.run_chunk(config.BATCH_CHUNK_SECONDS):
+                # Return to Fusion so the UI and the cancel button are serviced
+                app.fireCustomEvent(BATCH_EVENT_ID)
+                return
+            active_runs.clear()
+            run.finish()
+        except Exception as e:
+            active_runs.clear()
+            run.fail(e)
+
+
 class BatchProcessorExecuteHandler(adsk.core.CommandEventHandler):
     def __init__(self):
         super().__init__()
@@ -21,214 +335,294 @@ class BatchProcessorExecuteHandler(adsk.core.CommandEventHandler):
             
             # Get selected configuration file
             config_file = inputs.itemById('config_file').selectedItem.name
-            size_group = inputs.itemById('size_group').value
+            size_group = group_choices[inputs.itemById('size_group').selectedItem.index]
+            export_files = inputs.itemById('export_files').value
+            capture_history = not inputs.itemById('skip_history').value
+            grid = BinGeneratorCommand.selected_grid(inputs.itemById('grid_system'))
+            incremental = inputs.itemById('incremental').value
+            resume = inputs.itemById('resume').value
+            shard = batch_journal.Shard(inputs.itemById('shard_index').value, inputs.itemById('shard_count').value)
+            if shard.index > shard.count:
+                ui.messageBox(f'There is no shard {shard.index} of {shard.count}.')
+                return
+            if inputs.itemById('dry_run').value:
+                report_estimate(config_file, size_group, grid)
+                return
+            if active_runs:
+                ui.messageBox('A batch is still running, cancel it or wait for it to finish.')
+                return
+            if not capture_history and not confirm_drop_history():
+                return
+            component_cache.reset_stats()
+            BinGeneratorCommand.geometry_cache.reset_stats()
+            futil.reset_timings()
             
-            # Process batch configuration
-            if config_file.endswith('.csv'):
-                process_csv_batch(config_file, size_group)
-            elif config_file.endswith('.json'):
-                process_json_batch(config_file, size_group)
-            else:
-                process_text_batch(config_file, size_group)
+            # Plan the batch, the bins are built by BatchStepHandler
+            process_batch(config_file, size_group, export_files, capture_history, grid, incremental, resume,
+                          shard if shard.count > 1 else None)
                 
+        except batch_planner.BatchPlanError as e:
+            ui.messageBox(f'Batch configuration is invalid, nothing was generated:\n{str(e)}')
         except Exception as e:
             ui.messageBox(f'Batch processing failed:\n{str(e)}')
 
-def process_csv_batch(csv_file, size_group):
-    """Process CSV configuration for batch bin generation"""
-    
-    csv_path = os.path.join(config.BATCH_CONFIG_PATH, csv_file)
+def confirm_drop_history():
+    """Ask before a parametric design is switched to direct modeling, which deletes its timeline"""
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if design.designType != adsk.fusion.DesignTypes.ParametricDesignType:
+        return True
+    result = ui.messageBox('Deleting the design history permanently removes the whole timeline of this '
+                           'design, it is not restored after the batch.\n\nDelete the timeline and continue?',
+                           CMD_NAME, adsk.core.MessageBoxButtonTypes.YesNoButtonType,
+                           adsk.core.MessageBoxIconTypes.WarningIconType)
+    return result == adsk.core.DialogResults.DialogYes
+
+def retarget_design(grid, design=None):
+    """Drive every parametric bin of the design by the user parameters of `grid`, one recompute
     
-    with open(csv_path, 'r') as file:
-        reader = csv.DictReader(file)
-        
-        bins_generated = 0
-        for row in reader:
-            if int(row['Group']) == size_group or size_group == 0:  # 0 = all groups
-                # Parse bin dimensions
-                size_parts = row['BinSize'].split('x')
-                width = int(size_parts[0]) // 10  # Convert to grid units
-                length = int(size_parts[1]) // 10
-                
-                # Parse compartments
-                comp_parts = row['Compartments'].split('x')
-                comp_x = int(comp_parts[0])
-                comp_y = int(comp_parts[1])
-                
-                # Parse features
-                features = {}
-                if 'magnet' in row['Features']:
-                    features['magnet'] = True
-                if 'scoop' in row['Features']:
-                    features['scoop'] = True
-                if 'label' in row['Features']:
-                    features['label'] = True
-                
-                # Generate bins
-                quantity = int(row['Quantity'])
-                for i in range(quantity):
-                    comp = BinGeneratorCommand.generate_bin(
-                        width_units=width,
-                        length_units=length,
-                        height_units=2,  # Default height
-                        compartments=(comp_x, comp_y),
-                        features=features
-                    )
-                    
-                    # Position bins in grid layout
-                    position_bin_in_tray(comp, row['TrayPosition'], i)
-                    bins_generated += 1
-        
-        ui.messageBox(f'Successfully generated {bins_generated} bins for Size Group {size_group}')
+    Placements are not parametric, bins resize around their centers. Returns
+    the number of retargeted components and the occurrence overlaps found
+    afterwards, which are also logged.
+    """
+    design = design or adsk.fusion.Design.cast(app.activeProduct)
+    with futil.deferred_compute(design, True, f'{CMD_NAME} retarget to {grid}'):
+        retargeted = BinGeneratorCommand.retarget_bins(BinGeneratorCommand.parametric_components(design), grid)
+    # Components are cached per grid, adopt() re-reads the rewritten spec stamps
+    component_cache.components.clear()
+    return retargeted, design_overlaps(design)
+
+def design_overlaps(design):
+    """(name, name) pairs of root occurrences whose bounding boxes overlap"""
+    with futil.timer('collisions'):
+        boxes = []
+        names = []
+        for occurrence in design.rootComponent.occurrences:
+            box = occurrence.boundingBox
+            boxes.append((box.minPoint.x, box.minPoint.y, box.minPoint.z,
+                          box.maxPoint.x, box.maxPoint.y, box.maxPoint.z))
+            names.append(occurrence.name)
+        overlaps = [(names[i], names[j]) for i, j in placement.box_collisions(boxes)]
+    for first, second in overlaps:
+        futil.log(f'{CMD_NAME}: {first} overlaps {second}')
+    return overlaps
+
+def batch_grids(grid=None):
+    """Grids available to batch rows, `grid` (config.ACTIVE_GRID by default) for rows without one"""
+    return grid_profiles.GridSet(config.GRID_CONFIG, grid or config.ACTIVE_GRID)
 
-def process_text_batch(text_file, size_group):
-    """Process your custom text format for batch generation"""
+def report_estimate(config_file, size_group, grid=None):
+    """Show the estimated build time and material of a batch without touching the design"""
+    config_path = os.path.join(config.BATCH_CONFIG_PATH, config_file)
+    grids = batch_grids(grid)
+    jobs = plan_cache.cached_plan(config_path, size_group, grids, config.TRAY_SIZE)
+    estimate = batch_estimate.estimate_plan(jobs, grids, batch_estimate.load_model(config.COST_SAMPLES_PATH),
+                                            config.FILAMENT_DENSITY)
+    lines = batch_estimate.describe(estimate, config.BATCH_SESSION_SECONDS)
+    futil.log(f'{CMD_NAME}: estimate for {config_file}\n' + '\n'.join(lines + batch_estimate.describe_specs(estimate)))
+    ui.messageBox(f'Estimate for {config_file}, nothing was generated:\n' + '\n'.join(lines))
+    return estimate
+
+def process_batch(config_file, size_group, export_files=False, capture_history=True, grid=None,
+                  incremental=True, resume=True, shard=None):
+    """Plan the whole configuration first, then start building it in the design
     
-    text_path = os.path.join(config.BATCH_CONFIG_PATH, text_file)
+    Planning errors raise here, the bins are built a chunk per custom event
+    by the returned BatchRun. With `incremental` the plan is diffed against the bins an earlier run
+    of the same file and group left in the design, only the difference is
+    built, moved or deleted. With `resume` the checkpoint journal continues
+    an interrupted run, without `incremental` the jobs it lists as completed
+    are skipped. A `shard` builds only
+    its slice of the plan, placed where the whole plan puts it.
+    """
     
-    # Parse format: "10x20,8,Level4,Pos[0-160,90]"
-    with open(text_path, 'r') as file:
-        lines = file.readlines()
-        
-        current_group = None
-        bins_generated = 0
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Check for group header
-            if line.startswith('GROUP'):
-                current_group = int(line.split('GROUP')[1].split('_')[0])
-                continue
-            
-            # Skip if not target group
-            if current_group != size_group and size_group != 0:
-                continue
-            
-            # Parse bin configuration
-            if ',' in line:
-                parts = line.split(',')
-                if len(parts) >= 4:
-                    # Parse size
-                    size = parts[0]
-                    width, length = map(lambda x: int(x)//10, size.split('x'))
-                    
-                    # Parse quantity
-                    quantity = int(parts[1])
-                    
-                    # Parse level (for Z positioning)
-                    level = int(parts[2].replace('Level', ''))
-                    
-                    # Parse position
-                    pos_str = parts[3]
-                    
-                    # Generate bins
-                    for i in range(quantity):
-                        comp = BinGeneratorCommand.generate_bin(
-                            width_units=width,
-                            length_units=length,
-                            height_units=2,
-                            compartments=(1, 1)
-                        )
-                        
-                        # Calculate position
-                        z_offset = level * 20  # 20mm per level
-                        position_bin_with_offset(comp, pos_str, i, z_offset)
-                        bins_generated += 1
-        
-        ui.messageBox(f'Generated {bins_generated} bins from text configuration')
-
-def process_json_batch(json_file, size_group):
-    """Process JSON configuration for batch bin generation"""
-    json_path = os.path.join(config.BATCH_CONFIG_PATH, json_file)
-    with open(json_path, 'r') as file:
-        data = json.load(file)
-    bins_generated = 0
-    for item in data.get('bins', []):
-        if int(item.get('Group', 0)) == size_group or size_group == 0:
-            width = int(item['BinSize'].split('x')[0]) // 10
-            length = int(item['BinSize'].split('x')[1]) // 10
-            comp_x, comp_y = map(int, item.get('Compartments', '1x1').split('x'))
-            features = item.get('Features', {})
-            quantity = int(item.get('Quantity', 1))
-            for i in range(quantity):
-                comp = BinGeneratorCommand.generate_bin(
-                    width_units=width,
-                    length_units=length,
-                    height_units=2,
-                    compartments=(comp_x, comp_y),
-                    features=features
-                )
-                position_bin_in_tray(comp, item.get('TrayPosition', '0:0'), i)
-                bins_generated += 1
-    ui.messageBox(f'Generated {bins_generated} bins from JSON configuration')
-
-def position_bin_in_tray(component, position_string, index):
-    """Position bin component in tray based on position string"""
-    
-    # Parse position string like "0:90" or "0:160:90"
-    pos_parts = position_string.split(':')
-    
-    if len(pos_parts) >= 2:
-        if len(pos_parts) == 2:
-            x = float(pos_parts[0])
-            y = float(pos_parts[1])
-        else:
-            # Range positioning
-            x_start = float(pos_parts[0])
-            x_end = float(pos_parts[1])
-            y = float(pos_parts[2])
-            x = x_start + (index * 20)  # 20mm spacing
-        
-        # Create transform
-        transform = adsk.core.Matrix3D.create()
-        transform.translation = adsk.core.Vector3D.create(x/10.0, y/10.0, 0)
-        
-        # Apply transform to component
-        component.transform = transform
-
-def position_bin_with_offset(component, position_string, index, z_offset):
-    """Position bin with additional Z offset"""
-    pos = position_string[position_string.find('[')+1:position_string.find(']')]
-    coords = pos.split(',')
-    x_part = coords[0]
-    y = float(coords[1])
-    if '-' in x_part:
-        x_start, x_end = map(float, x_part.split('-'))
-        x = x_start + (index * 20)
-    else:
-        x = float(x_part)
+    config_path = os.path.join(config.BATCH_CONFIG_PATH, config_file)
+    grids = batch_grids(grid)
+    
+    # Raises BatchPlanError before any geometry is created, an unchanged
+    # config is not parsed again but loaded from its cached plan
+    layouts = []
+    digest = plan_cache.file_digest(config_path)
+    jobs = plan_cache.cached_plan(config_path, size_group, grids, config.TRAY_SIZE, layouts, digest)
+    indexes = None
+    if shard is not None:
+        indexes = batch_journal.shard_jobs(jobs, grids, shard.count)[shard.index - 1]
+    journal = batch_journal.Journal(
+        batch_journal.journal_path(config_path, size_group, grids.default, shard),
+        batch_journal.plan_id(plan_cache.plan_key(digest, size_group, grids, config.TRAY_SIZE))
+    )
+    done = journal.completed() if resume else {}
+    
+    # Overlaps are found on the planned boxes before anything is built
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    positions = placement.plan_placement(jobs, grids)
+    slots = batch_sync.job_slots(jobs, grids)
+    previous = []
+    sync = None
+    if incremental:
+        with futil.timer('sync'):
+            component_cache.adopt(design)
+            previous = [placed for placed in stamped_bins(design)
+                        if batch_sync.in_scope(placed, config_file, size_group)]
+            translations = [positions.translation(index) for index in range(len(jobs))]
+            sync = batch_sync.diff_plan(slots, translations, previous)
+    
+    # Bins of the previous run are replaced by the plan, they do not count as obstacles
+    replaced = {placed.handle.entityToken for placed in previous}
+    overlaps = check_overlaps(design, jobs, positions, replaced)
+    if overlaps and config.OVERLAP_POLICY == 'error':
+        raise batch_planner.BatchPlanError(config_file, overlaps)
+    
+    stamps = [batch_sync.placement_json(config_file, job.group, slots[index], positions.translation(index))
+              for index, job in enumerate(jobs)]
+    
+    notes = []
+    if overlaps:
+        notes.append(f'{len(overlaps)} overlapping bins, see the log for rows')
+    notes.extend(f'Layout {layout.describe()}' for layout in layouts)
+    export_directory = None
+    if export_files:
+        export_directory = os.path.join(config.BATCH_EXPORT_PATH, os.path.splitext(config_file)[0])
+        if shard is not None:
+            export_directory = os.path.join(export_directory, shard.label)
+    
+    run = BatchRun(config_file, size_group, jobs, positions, stamps, sync, notes, export_directory, grids,
+                   indexes, journal, done, shard)
+    try:
+        if not resume:
+            journal.start()
+        run.begin(design, capture_history)
+    except Exception:
+        run.close()
+        raise
+    active_runs.append(run)
+    app.fireCustomEvent(BATCH_EVENT_ID)
+    return run
+
+def stamped_bins(design):
+    """PlacedBins of every occurrence stamped by a batch run"""
+    placed_bins = []
+    for attribute in design.findAttributes(batch_sync.ATTRIBUTE_GROUP, batch_sync.PLACEMENT_ATTRIBUTE):
+        occurrence = attribute.parent
+        if occurrence is None or not occurrence.isValid:
+            continue
+        placed = batch_sync.placed_bin(occurrence, attribute.value)
+        if placed is not None:
+            placed_bins.append(placed)
+    return placed_bins
+
+def move_bin(jobs, positions, index, placed, stamps):
+    with futil.timer('position', bin_geometry.spec_label(*jobs[index].spec)):
+        placed.handle.transform = plan_transform(positions, index)
+        stamp_occurrence(placed.handle, stamps[index])
+
+def build_bin(jobs, positions, index, stamps=None):
+    """Place one job of a plan at its precomputed transform and stamp it"""
+    job = jobs[index]
+    with futil.timer('position', bin_geometry.spec_label(*job.spec)):
+        transform = plan_transform(positions, index)
+    occurrence = component_cache.place_bin(job.spec, transform, job.grid)
+    if stamps:
+        stamp_occurrence(occurrence, stamps[index])
+    return occurrence
+
+def plan_transform(positions, index):
     transform = adsk.core.Matrix3D.create()
-    transform.translation = adsk.core.Vector3D.create(x/10.0, y/10.0, z_offset/10.0)
-    component.transform = transform
+    transform.setWithArray(list(positions.transform(index)))
+    return transform
 
-CMD_NAME = 'Batch Bin Processor'
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_batchProcessor'
-CMD_Description = 'Generate multiple bins from configuration files'
+def stamp_occurrence(occurrence, stamp):
+    """Record where a bin came from, so a re-run can diff against it"""
+    occurrence.attributes.add(batch_sync.ATTRIBUTE_GROUP, batch_sync.PLACEMENT_ATTRIBUTE, stamp)
 
-def start():
-    """Create the batch processor command"""
-    cmd_def = ui.commandDefinitions.addButtonDefinition(
-        CMD_ID, CMD_NAME, CMD_Description
-    )
+def check_overlaps(design, jobs, positions, ignored=()):
+    """Rows whose planned bins overlap each other or occurrences already in the design
+    
+    Occurrences whose entity token is in `ignored` are left out.
+    """
+    with futil.timer('collisions'):
+        boxes = []
+        names = []
+        for occurrence in design.rootComponent.occurrences:
+            if ignored and occurrence.entityToken in ignored:
+                continue
+            box = occurrence.boundingBox
+            boxes.append((box.minPoint.x, box.minPoint.y, box.minPoint.z,
+                          box.maxPoint.x, box.maxPoint.y, box.maxPoint.z))
+            names.append(occurrence.name)
+        collisions = placement.find_collisions(positions, boxes)
+        overlaps = placement.collision_errors(jobs, collisions, names)
+    for row, message in overlaps:
+        futil.log(f'{CMD_NAME}: row {row}: {message}')
+    return overlaps
+
+def execute_plan(jobs, positions=None, indexes=None, stamps=None):
+    """Create the bins of a validated plan (all, or the job `indexes`) at their precomputed transforms"""
+    if positions is None:
+        positions = placement.plan_placement(jobs, batch_grids())
+    if indexes is None:
+        indexes = range(len(jobs))
+    for index in indexes:
+        build_bin(jobs, positions, index, stamps)
+    return len(indexes)
+
+def export_paths(directory, spec, grid, formats=('stl', '3mf')):
+    name = mesh_export.spec_name(spec, grid)
+    return [os.path.join(directory, f'{name}.{extension}') for extension in ('stl', '3mf') if extension in formats]
+
+def export_component(comp, spec, grid, directory, formats=('stl', '3mf')):
+    """Export the component of one spec, returns the written paths"""
+    if comp is None or not comp.isValid:
+        return []
+    exportManager = adsk.fusion.Design.cast(app.activeProduct).exportManager
+    written = []
+    for path in export_paths(directory, spec, grid, formats):
+        if path.endswith('.stl'):
+            stlOptions = exportManager.createSTLExportOptions(comp, path)
+            stlOptions.isBinaryFormat = True
+            exportManager.execute(stlOptions)
+        else:
+            exportManager.execute(exportManager.createC3MFExportOptions(comp, path))
+        written.append(path)
+    return written
+
+def export_components(jobs, directory, grids, formats=('stl', '3mf'), exported=()):
+    """Export one file per unique spec of a built plan plus the quantity manifest
     
-    futil.add_handler(cmd_def.commandCreated, command_created_batch)
+    Specs in `exported` ((spec, grid) pairs) are already written and skipped.
+    """
+    os.makedirs(directory, exist_ok=True)
     
-    workspace = ui.workspaces.itemById('FusionSolidEnvironment')
-    panel = workspace.toolbarPanels.itemById('SolidCreatePanel')
-    control = panel.controls.addCommand(cmd_def)
+    written = []
+    for spec, grid in dict.fromkeys((job.spec, grids.resolve(job.grid)) for job in jobs):
+        if (spec, grid) not in exported:
+            written.extend(export_component(component_cache.components.get((spec, grid)), spec, grid,
+                                            directory, formats))
+    
+    rows = mesh_export.manifest_rows(jobs, grids)
+    written.append(mesh_export.write_manifest(directory, rows))
+    return written
+
+CMD_NAME = BATCH_PROCESSOR.name
+CMD_ID = BATCH_PROCESSOR.id
+BATCH_EVENT_ID = f'{CMD_ID}_step'
+MAX_SHARDS = 64
+
+# Fusion only keeps weak references to handlers added directly
+local_handlers = []
+
+def start():
+    """Register the custom event batch chunks run from, called when the module is first loaded"""
+    step_handler = BatchStepHandler()
+    app.registerCustomEvent(BATCH_EVENT_ID).add(step_handler)
+    local_handlers.append(step_handler)
 
 def stop():
-    """Clean up the command"""
-    workspace = ui.workspaces.itemById('FusionSolidEnvironment')
-    panel = workspace.toolbarPanels.itemById('SolidCreatePanel')
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-    
-    if command_control:
-        command_control.deleteMe()
-    if command_definition:
-        command_definition.deleteMe()
+    """Close a running batch and unregister its event"""
+    for run in active_runs:
+        run.close()
+    active_runs.clear()
+    app.unregisterCustomEvent(BATCH_EVENT_ID)
+    local_handlers.clear()
 
 def command_created_batch(args: adsk.core.CommandCreatedEventArgs):
     """Set up the batch command dialog"""
@@ -236,16 +630,66 @@ def command_created_batch(args: adsk.core.CommandCreatedEventArgs):
     cmd = args.command
     onExecute = BatchProcessorExecuteHandler()
     cmd.execute.add(onExecute)
+    futil.add_handler(cmd.inputChanged, command_input_changed_batch)
     
     inputs = cmd.commandInputs
     
     # Configuration file selector
-    config_files = os.listdir(config.BATCH_CONFIG_PATH)
+    config_files = batch_index.list_configs(config.BATCH_CONFIG_PATH)
     fileDropdown = inputs.addDropDownCommandInput('config_file', 'Configuration File', 
                                                   adsk.core.DropDownStyles.TextListDropDownStyle)
-    for file in config_files:
-        if file.endswith(('.csv', '.json', '.txt')):
-            fileDropdown.listItems.add(file, False)
+    for i, file in enumerate(config_files):
+        fileDropdown.listItems.add(file, i == 0)
     
-    # Size group selector
-    inputs.addIntegerSpinnerCommandInput('size_group', 'Size Group (0=All)', 0, 5, 1, 2)
+    # Size group selector, filled from the sidecar index of the selected file
+    inputs.addDropDownCommandInput('size_group', 'Size Group',
+                                   adsk.core.DropDownStyles.TextListDropDownStyle)
+    inputs.addTextBoxCommandInput('config_summary', 'Contents', '', 2, True)
+    gridDropdown = inputs.addDropDownCommandInput('grid_system', 'Default Grid',
+                                                  adsk.core.DropDownStyles.TextListDropDownStyle)
+    BinGeneratorCommand.add_grid_items(gridDropdown)
+    inputs.addBoolValueInput('export_files', 'Export STL/3MF', True, '', False)
+    inputs.addBoolValueInput('skip_history', 'Delete Design History (destructive)', True, '', False)
+    inputs.addBoolValueInput('incremental', 'Update Previous Run', True, '', True)
+    inputs.addBoolValueInput('resume', 'Resume Interrupted Run', True, '', True)
+    inputs.addIntegerSpinnerCommandInput('shard_count', 'Shards', 1, MAX_SHARDS, 1, 1)
+    inputs.addIntegerSpinnerCommandInput('shard_index', 'Build Shard', 1, MAX_SHARDS, 1, 1)
+    inputs.addBoolValueInput('dry_run', 'Estimate Only (dry run)', True, '', False)
+    if config_files:
+        populate_groups(inputs, config_files[0])
+
+# Group numbers matching the items of the size group dropdown, 0 = all groups
+group_choices = [0]
+
+def populate_groups(inputs, config_file):
+    """Fill the size group dropdown with the groups and bin counts of a config"""
+    grids = batch_grids(BinGeneratorCommand.selected_grid(inputs.itemById('grid_system')))
+    index = batch_index.get_index(os.path.join(config.BATCH_CONFIG_PATH, config_file), grids)
+    summaries = batch_index.group_summaries(index)
+    
+    total_bins = sum(summary.bins for summary in summaries)
+    total_specs = len(batch_index.distinct_specs(index))
+    invalid = sum(summary.invalid for summary in summaries)
+    
+    groupDropdown = inputs.itemById('size_group')
+    groupDropdown.listItems.clear()
+    group_choices[:] = [0]
+    groupDropdown.listItems.add(f'All groups ({total_bins} bins)', len(summaries) != 1)
+    for summary in summaries:
+        group_choices.append(summary.group)
+        groupDropdown.listItems.add(
+            f'Group {summary.group} ({summary.bins} bins, {len(summary.specs)} specs)',
+            len(summaries) == 1
+        )
+    
+    summary_text = f'{len(summaries)} groups, {total_bins} bins, {total_specs} distinct specs'
+    if invalid:
+        summary_text += f', {invalid} invalid rows'
+    inputs.itemById('config_summary').text = summary_text
+
+def command_input_changed_batch(args: adsk.core.InputChangedEventArgs):
+    """Refresh group information when another configuration file or default grid is selected"""
+    if args.input.id in ('config_file', 'grid_system') and args.input.selectedItem:
+        config_file = args.inputs.itemById('config_file').selectedItem
+        if config_file:
+            populate_groups(args.inputs, config_file.name)
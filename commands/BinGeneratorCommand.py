@@ -1,16 +1,20 @@
 import adsk.core
 import adsk.fusion
-import os
 import traceback
 from ..lib import fusion360utils as futil
+from ..lib import batch_planner
+from ..lib import batch_sync
+from ..lib import bin_features
+from ..lib import bin_geometry
+from ..lib import geometry_cache as geometry_cache_lib
+from ..lib import grid_profiles
+from ..lib import parametric
 from .. import config
+from . import BIN_GENERATOR
 
 app = adsk.core.Application.get()
 ui = app.userInterface
 
-# Get active grid configuration
-grid_config = config.GRID_CONFIG[config.ACTIVE_GRID]
-
 class BinGeneratorCommandExecuteHandler(adsk.core.CommandEventHandler):
     def __init__(self):
         super().__init__()
@@ -28,145 +32,422 @@ class BinGeneratorCommandExecuteHandler(adsk.core.CommandEventHandler):
             compartments_y = inputs.itemById('compartments_y').value
             has_scoop = inputs.itemById('has_scoop').value
             has_label = inputs.itemById('has_label').value
+            grid = selected_grid(inputs.itemById('grid_system'))
+            parametric_bin = inputs.itemById('parametric').value
             
-            # Generate bin with 10mm grid
+            # Generate bin on the selected grid
             generate_bin(
                 width_units=bin_width,
                 length_units=bin_length,
                 height_units=bin_height,
                 compartments=(compartments_x, compartments_y),
-                features={'scoop': has_scoop, 'label': has_label}
+                features={'scoop': has_scoop, 'label': has_label},
+                grid=grid,
+                backend=fusion_backend(grid, parametric_bin)
             )
+            if parametric_bin and (has_scoop or has_label):
+                ui.messageBox('Scoops and labels do not follow the grid parameters, '
+                              'the bin was built with fixed dimensions.')
             
         except:
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
-def generate_bin(width_units, length_units, height_units, compartments=(1,1), features={}):
-    """Generate a Gridfinity bin with 10mm grid units"""
+# Archives of built bins shared across sessions, the folder is created on first store
+geometry_cache = geometry_cache_lib.GeometryCache(config.GEOMETRY_CACHE_PATH, config.GEOMETRY_CACHE_MAX_BYTES)
+
+def generate_bin(width_units, length_units, height_units, compartments=(1,1), features={}, grid=None, backend=None):
+    """Generate a Gridfinity bin in units of `grid`, config.ACTIVE_GRID by default
     
-    design = adsk.fusion.Design.cast(app.activeProduct)
-    rootComp = design.rootComponent
+    Geometry is built by `backend`, the Fusion backend creating a new
+    component in the active design is used by default, parametric when
+    config.PARAMETRIC_BINS is set. Other Fusion bins come from the geometry
+    cache when config.USE_GEOMETRY_CACHE is set.
     
-    # Calculate actual dimensions based on grid
-    base_unit = grid_config['base_unit']
-    height_unit = grid_config['height_unit']
-    wall_thickness = grid_config['wall_thickness']
+    Feature sizes are not linear in the grid parameters (scoops follow the
+    smaller of compartment depth and height, sockets the magnet fields), a
+    parametric bin with features is built with baked dimensions instead.
+    """
+    backend = backend or fusion_backend(grid or config.ACTIVE_GRID, config.PARAMETRIC_BINS)
+    key = bin_geometry.spec_label(width_units, length_units, height_units, compartments, features)
+    if is_parametric(backend) and has_features(features):
+        futil.log(f'{CMD_NAME}: {key} has features, built with baked dimensions instead of parametric')
+        backend = fusion_backend(backend.profile.name, False)
+    with futil.timer('generate_bin', key):
+        # Parametric bins reference the design's user parameters, an archive would not
+        if config.USE_GEOMETRY_CACHE and isinstance(backend, FusionBackend) and not backend.parametric:
+            return cached_bin(backend, width_units, length_units, height_units, compartments, features)
+        return backend.generate_bin(width_units, length_units, height_units, compartments, features)
+
+def is_parametric(backend):
+    return isinstance(backend, FusionBackend) and backend.parametric
+
+def has_features(features):
+    if isinstance(features, dict):
+        return any(features.values())
+    return bool(features)
+
+def cached_bin(backend, width_units, length_units, height_units, compartments, features):
+    """Import the bin's archive from the geometry cache, building and storing it on a miss"""
+    spec = batch_planner.BinSpec(width_units, length_units, height_units, tuple(compartments),
+                                 batch_planner.parse_features(features))
+    key = geometry_cache_lib.cache_key(spec, backend.profile)
+    label = bin_geometry.spec_label(*spec)
     
-    width = width_units * base_unit
-    length = length_units * base_unit
-    height = height_units * height_unit
+    path = geometry_cache.get(key, '.f3d')
+    if path:
+        with futil.timer('cache_import', label):
+            try:
+                comp = import_archive(path)
+            except Exception as e:
+                # A corrupt archive is rebuilt like a miss
+                futil.log(f'{CMD_NAME}: could not import cached {label}: {e}')
+                comp = None
+        geometry_cache.record(comp is not None)
+        if comp:
+            comp.name = f"Bin_{width_units}x{length_units}x{height_units}"
+            return comp
     
-    # Create new component for bin
-    occ = rootComp.occurrences.addNewComponent(adsk.core.Matrix3D.create())
-    comp = occ.component
-    comp.name = f"Bin_{width_units}x{length_units}x{height_units}"
+    comp = backend.generate_bin(width_units, length_units, height_units, compartments, features)
+    with futil.timer('cache_store', label):
+        try:
+            geometry_cache.put(key, '.f3d', lambda temp: export_archive(comp, temp))
+        except Exception as e:
+            # A bin that cannot be cached is still a good bin
+            futil.log(f'{CMD_NAME}: could not cache {label}: {e}')
+    return comp
+
+def import_archive(path):
+    """Import a .f3d into the active design, returns the new component or None"""
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    importManager = app.importManager
+    options = importManager.createFusionArchiveImportOptions(path)
+    occurrences = importManager.importToTarget2(options, design.rootComponent)
+    if not occurrences or occurrences.count == 0:
+        return None
+    return occurrences.item(0).component
+
+def export_archive(comp, path):
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    exportManager = design.exportManager
+    exportManager.execute(exportManager.createFusionArchiveExportOptions(path, comp))
+
+# One backend per grid and mode, each holding its memoized profile
+backends = {}
+
+def fusion_backend(grid, parametric_bins=False):
+    """Fusion backend of a grid from config.GRID_CONFIG"""
+    profile = grid_profiles.grid_profile(grid, config.GRID_CONFIG[grid])
+    backend = backends.get((grid, parametric_bins))
+    if backend is None or backend.profile != profile:
+        backend = backends[grid, parametric_bins] = FusionBackend(profile, parametric_bins)
+    return backend
+
+class FusionBackend(bin_geometry.BinBackend):
+    """Builds bins as components of the active Fusion design
     
-    # Create base sketch
-    sketches = comp.sketches
-    xyPlane = comp.xYConstructionPlane
-    sketch = sketches.add(xyPlane)
+    With `parametric` every dimension is an expression of the grid's user
+    parameters (see lib/parametric.py) instead of a baked value.
+    """
     
-    # Draw outer rectangle
-    lines = sketch.sketchCurves.sketchLines
-    rect = lines.addCenterRectangle(
-        adsk.core.Point3D.create(0, 0, 0),
-        adsk.core.Point3D.create(width/2, length/2, 0)
-    )
+    name = 'fusion'
     
-    # Create base extrusion
-    prof = sketch.profiles.item(0)
-    extrudes = comp.features.extrudeFeatures
-    extInput = extrudes.createInput(prof, adsk.core.FeatureOperations.NewBodyFeatureOperation)
-    distance = adsk.core.ValueInput.createByReal(height)
-    extInput.setDistanceExtent(False, distance)
-    baseExtrude = extrudes.add(extInput)
-    
-    # Shell to create hollow bin
-    shells = comp.features.shellFeatures
-    shellInput = shells.createInput()
-    shellInput.insideThickness = adsk.core.ValueInput.createByReal(wall_thickness/10.0)
-    
-    # Select top face for shell opening
-    body = baseExtrude.bodies.item(0)
-    topFace = None
-    for face in body.faces:
-        if face.geometry.surfaceType == adsk.core.SurfaceTypes.PlaneSurfaceType:
-            if face.boundingBox.maxPoint.z > height * 0.9:
-                topFace = face
-                break
-    
-    if topFace:
-        shellInput.inputEntities.add(topFace)
-        shells.add(shellInput)
-    
-    # Add compartment dividers if specified
-    if compartments[0] > 1 or compartments[1] > 1:
-        add_compartments(comp, width, length, height, compartments, wall_thickness)
-    
-    # Add features
-    if features.get('scoop'):
-        add_scoop_feature(comp, width, length, height)
-    if features.get('label'):
-        add_label_feature(comp, width, length, height)
+    def __init__(self, grid_config, parametric=False):
+        super().__init__(grid_config)
+        self.parametric = parametric
     
-    return comp
-
-def add_compartments(comp, width, length, height, compartments, wall_thickness):
-    """Add internal dividers for compartments"""
-    sketches = comp.sketches
-    xyPlane = comp.xYConstructionPlane
+    def value_input(self, value, expression):
+        """ValueInput of a cm value, or of its expression for parametric bins"""
+        if self.parametric:
+            return adsk.core.ValueInput.createByString(expression)
+        return adsk.core.ValueInput.createByReal(value)
     
-    # X-direction dividers
-    if compartments[0] > 1:
-        for i in range(1, compartments[0]):
-            x_pos = -width/2 + (width/compartments[0]) * i
-            sketch = sketches.add(xyPlane)
-            lines = sketch.sketchCurves.sketchLines
-            lines.addByTwoPoints(
-                adsk.core.Point3D.create(x_pos - wall_thickness/2, -length/2, 0),
-                adsk.core.Point3D.create(x_pos - wall_thickness/2, length/2, 0)
-            )
-            lines.addByTwoPoints(
-                adsk.core.Point3D.create(x_pos + wall_thickness/2, -length/2, 0),
-                adsk.core.Point3D.create(x_pos + wall_thickness/2, length/2, 0)
-            )
-            # Close the rectangle
-            lines.addByTwoPoints(
-                adsk.core.Point3D.create(x_pos - wall_thickness/2, -length/2, 0),
-                adsk.core.Point3D.create(x_pos + wall_thickness/2, -length/2, 0)
-            )
-            lines.addByTwoPoints(
-                adsk.core.Point3D.create(x_pos - wall_thickness/2, length/2, 0),
-                adsk.core.Point3D.create(x_pos + wall_thickness/2, length/2, 0)
-            )
+    def generate_bin(self, width_units, length_units, height_units, compartments=(1,1), features=None):
+        features = features or {}
+        if self.parametric and has_features(features):
+            # Features would be baked into an otherwise parametric bin, see generate_bin()
+            return FusionBackend(self.profile).generate_bin(width_units, length_units, height_units,
+                                                            compartments, features)
+        key = bin_geometry.spec_label(width_units, length_units, height_units, compartments, features)
+        # Raises for features that do not fit before any component is created
+        geometry = bin_features.bin_features(self.profile, width_units, length_units, height_units,
+                                             compartments, features)
+        design = adsk.fusion.Design.cast(app.activeProduct)
+        rootComp = design.rootComponent
+        
+        # Dimensions come from the grid profile's precomputed cm values
+        layout = self.layout(width_units, length_units, height_units, compartments)
+        width = width_units * self.profile.base_unit_cm
+        length = length_units * self.profile.base_unit_cm
+        height = height_units * self.profile.height_unit_cm
+        wall_thickness = self.profile.wall_thickness_cm
+        grid = self.profile.name
+        terms = None
+        if self.parametric:
+            add_grid_parameters(design, self.profile)
+            terms = parametric.bin_terms(width_units, length_units, compartments)
+        
+        # Create new component for bin
+        with futil.timer('sketch', key):
+            occ = rootComp.occurrences.addNewComponent(adsk.core.Matrix3D.create())
+            comp = occ.component
+            comp.name = f"Bin_{width_units}x{length_units}x{height_units}"
             
-            # Extrude divider
-            prof = sketch.profiles.item(0)
-            extrudes = comp.features.extrudeFeatures
-            extInput = extrudes.createInput(prof, adsk.core.FeatureOperations.JoinFeatureOperation)
-            distance = adsk.core.ValueInput.createByReal(height * 0.8)  # 80% height for dividers
-            extInput.setDistanceExtent(False, distance)
-            extrudes.add(extInput)
-    
-    # Y-direction dividers (similar logic)
-    if compartments[1] > 1:
-        for i in range(1, compartments[1]):
-            y_pos = -length/2 + (length/compartments[1]) * i
+            # Create base sketch
+            sketches = comp.sketches
+            xyPlane = comp.xYConstructionPlane
             sketch = sketches.add(xyPlane)
-            lines = sketch.sketchCurves.sketchLines
-            # Create divider rectangle
-            rect = lines.addCenterRectangle(
-                adsk.core.Point3D.create(0, y_pos, 0),
-                adsk.core.Point3D.create(width/2, y_pos + wall_thickness/2, 0)
-            )
             
-            # Extrude divider
+            # Draw outer rectangle
+            lines = sketch.sketchCurves.sketchLines
+            if terms:
+                rect = lines.addTwoPointRectangle(
+                    adsk.core.Point3D.create(-width/2, -length/2, 0),
+                    adsk.core.Point3D.create(width/2, length/2, 0)
+                )
+                drive_rectangle(sketch, rect, terms.outline, self.profile)
+            else:
+                rect = lines.addCenterRectangle(
+                    adsk.core.Point3D.create(0, 0, 0),
+                    adsk.core.Point3D.create(width/2, length/2, 0)
+                )
+        
+        # Create base extrusion
+        with futil.timer('extrude', key):
             prof = sketch.profiles.item(0)
             extrudes = comp.features.extrudeFeatures
-            extInput = extrudes.createInput(prof, adsk.core.FeatureOperations.JoinFeatureOperation)
-            distance = adsk.core.ValueInput.createByReal(height * 0.8)
+            extInput = extrudes.createInput(prof, adsk.fusion.FeatureOperations.NewBodyFeatureOperation)
+            distance = self.value_input(height, parametric.height_expression(grid, height_units))
             extInput.setDistanceExtent(False, distance)
-            extrudes.add(extInput)
+            baseExtrude = extrudes.add(extInput)
+        
+        # Shell to create hollow bin
+        with futil.timer('shell', key):
+            shells = comp.features.shellFeatures
+            shellInput = shells.createInput()
+            shellInput.insideThickness = self.value_input(wall_thickness, parametric.wall_expression(grid))
+            
+            # The open top of the bin is the end cap of the base extrude
+            topFace = extrude_face(baseExtrude, 'end')
+            
+            if topFace:
+                shellInput.inputEntities.add(topFace)
+                shells.add(shellInput)
+        
+        # Add compartment dividers if specified
+        if layout.dividers:
+            with futil.timer('compartments', key):
+                if terms:
+                    add_compartments(comp, layout, self.value_input(
+                        layout.divider_height/10.0, parametric.divider_height_expression(grid, height_units)),
+                        terms.dividers, self.profile)
+                else:
+                    add_compartments(comp, layout)
+        
+        if terms:
+            comp.attributes.add(batch_sync.ATTRIBUTE_GROUP, parametric.PARAMETRIC_ATTRIBUTE, grid)
+        
+        # Magnets, scoops and labels of every cell, one operation per feature type
+        if geometry:
+            with futil.timer('features', key):
+                add_features(comp, geometry)
+        
+        return comp
+
+# Face collections of an extrude feature by position
+EXTRUDE_FACES = {
+    'start': lambda extrude: extrude.startFaces,
+    'end': lambda extrude: extrude.endFaces,
+    'side': lambda extrude: extrude.sideFaces,
+}
+
+def extrude_face(extrude, position, index=0):
+    """Face created by an extrude, e.g. 'end' for the cap at the extent
+    
+    Reads the face straight from the feature instead of scanning the body,
+    so the pick stays the same however much geometry the bin gains.
+    """
+    faces = EXTRUDE_FACES[position](extrude)
+    if faces.count <= index:
+        return None
+    return faces.item(index)
+
+def add_compartments(comp, layout, height=None, terms=None, profile=None):
+    """Add internal dividers for compartments
+    
+    The whole divider lattice is drawn in one sketch and joined with one
+    extrude, the timeline grows by two features whatever the compartment count.
+    Parametric bins pass the divider `height` ValueInput and the dividers'
+    LinearTerms, every rectangle corner is then dimensioned by expression.
+    """
+    sketch = comp.sketches.add(comp.xYConstructionPlane)
+    sketch.isComputeDeferred = True
+    lines = sketch.sketchCurves.sketchLines
+    for index, (x0, y0, x1, y1) in enumerate(layout.dividers):
+        rect = lines.addTwoPointRectangle(
+            adsk.core.Point3D.create(x0/10.0, y0/10.0, 0),
+            adsk.core.Point3D.create(x1/10.0, y1/10.0, 0)
+        )
+        if terms:
+            drive_rectangle(sketch, rect, terms[index], profile)
+    sketch.isComputeDeferred = False
+    
+    # Every profile of the sketch is a piece of the lattice
+    profiles = adsk.core.ObjectCollection.create()
+    for prof in sketch.profiles:
+        profiles.add(prof)
+    
+    extrudes = comp.features.extrudeFeatures
+    extInput = extrudes.createInput(profiles, adsk.fusion.FeatureOperations.JoinFeatureOperation)
+    distance = height or adsk.core.ValueInput.createByReal(layout.divider_height/10.0)
+    extInput.setDistanceExtent(False, distance)
+    return extrudes.add(extInput)
+
+def add_features(comp, geometry):
+    """Apply the BinFeatures of a bin
+    
+    Magnets take a floor join and one cut for all sockets, scoops and labels
+    one sketch and one join per x extent, a single one for uniform grids.
+    """
+    if geometry.magnets:
+        add_magnet_sockets(comp, geometry)
+    for group in geometry.scoops:
+        add_ledges(comp, group, lambda sketch, ledge: draw_scoop(sketch, ledge, geometry.floor))
+    for group in geometry.labels:
+        add_ledges(comp, group, lambda sketch, ledge: draw_label(sketch, ledge, geometry.top))
+
+def add_magnet_sockets(comp, geometry):
+    """Raise the cavity floor over the socket depth, then cut every socket in one extrude"""
+    extrudes = comp.features.extrudeFeatures
+    x0, y0, x1, y1 = geometry.cavity
+    sketch = comp.sketches.add(comp.xYConstructionPlane)
+    sketch.sketchCurves.sketchLines.addTwoPointRectangle(
+        adsk.core.Point3D.create(x0/10.0, y0/10.0, 0),
+        adsk.core.Point3D.create(x1/10.0, y1/10.0, 0)
+    )
+    extInput = extrudes.createInput(sketch.profiles.item(0), adsk.fusion.FeatureOperations.JoinFeatureOperation)
+    extInput.setDistanceExtent(False, adsk.core.ValueInput.createByReal(geometry.floor/10.0))
+    extrudes.add(extInput)
+    
+    sketch = comp.sketches.add(comp.xYConstructionPlane)
+    sketch.isComputeDeferred = True
+    circles = sketch.sketchCurves.sketchCircles
+    for x, y in geometry.magnets:
+        circles.addByCenterRadius(adsk.core.Point3D.create(x/10.0, y/10.0, 0), geometry.magnet_radius/10.0)
+    sketch.isComputeDeferred = False
+    
+    profiles = adsk.core.ObjectCollection.create()
+    for prof in sketch.profiles:
+        profiles.add(prof)
+    extInput = extrudes.createInput(profiles, adsk.fusion.FeatureOperations.CutFeatureOperation)
+    extInput.setDistanceExtent(False, adsk.core.ValueInput.createByReal(geometry.magnet_depth/10.0))
+    return extrudes.add(extInput)
+
+def add_ledges(comp, group, draw):
+    """Draw the profiles of a LedgeGroup on the YZ plane and join them from x0 to x1 in one extrude"""
+    sketch = comp.sketches.add(comp.yZConstructionPlane)
+    sketch.isComputeDeferred = True
+    for ledge in group.ledges:
+        draw(sketch, ledge)
+    sketch.isComputeDeferred = False
+    
+    profiles = adsk.core.ObjectCollection.create()
+    for prof in sketch.profiles:
+        profiles.add(prof)
+    extrudes = comp.features.extrudeFeatures
+    extInput = extrudes.createInput(profiles, adsk.fusion.FeatureOperations.JoinFeatureOperation)
+    extInput.startExtent = adsk.fusion.OffsetStartDefinition.create(
+        adsk.core.ValueInput.createByReal(group.x0/10.0))
+    extInput.setDistanceExtent(False, adsk.core.ValueInput.createByReal((group.x1 - group.x0)/10.0))
+    return extrudes.add(extInput)
+
+def yz_point(sketch, y, z):
+    """Sketch space point of a (y, z) position in mm on the YZ plane"""
+    return sketch.modelToSketchSpace(adsk.core.Point3D.create(0, y/10.0, z/10.0))
+
+def draw_scoop(sketch, ledge, floor):
+    """Quarter round between the floor and the wall at ledge.y"""
+    y, r, d = ledge
+    lines = sketch.sketchCurves.sketchLines
+    bottom = lines.addByTwoPoints(yz_point(sketch, y, floor), yz_point(sketch, y + d * r, floor))
+    wall = lines.addByTwoPoints(bottom.startSketchPoint, yz_point(sketch, y, floor + r))
+    inset = r * (1 - 0.5 ** 0.5)
+    sketch.sketchCurves.sketchArcs.addByThreePoints(
+        bottom.endSketchPoint, yz_point(sketch, y + d * inset, floor + inset), wall.endSketchPoint)
+
+def draw_label(sketch, ledge, top):
+    """45 degree ledge under the top of the wall at ledge.y"""
+    y, size, d = ledge
+    lines = sketch.sketchCurves.sketchLines
+    shelf = lines.addByTwoPoints(yz_point(sketch, y, top), yz_point(sketch, y + d * size, top))
+    wall = lines.addByTwoPoints(shelf.startSketchPoint, yz_point(sketch, y, top - size))
+    lines.addByTwoPoints(shelf.endSketchPoint, wall.endSketchPoint)
+
+def add_grid_parameters(design, profile):
+    """Create the user parameters of a grid profile, existing ones keep their value"""
+    userParameters = design.userParameters
+    for name, expression, comment in parametric.profile_parameters(profile):
+        if userParameters.itemByName(name) is None:
+            userParameters.add(name, adsk.core.ValueInput.createByString(expression), 'mm', comment)
+
+def drive_rectangle(sketch, rect, terms, profile):
+    """Dimension two opposite corners of a rectangle from the sketch origin by expression
+    
+    `terms` are the (x0, y0, x1, y1) LinearTerms of the rectangle, the
+    rectangle's own constraints keep the other two corners in place.
+    """
+    corners = [rect.item(index).startSketchPoint for index in range(rect.count)]
+    x0, y0, x1, y1 = (term.value(profile) / 10.0 for term in terms)
+    dimensions = sketch.sketchDimensions
+    for (x, y), (x_term, y_term) in (((x0, y0), terms[0:2]), ((x1, y1), terms[2:4])):
+        point = min(corners, key=lambda corner: abs(corner.geometry.x - x) + abs(corner.geometry.y - y))
+        for term, orientation, text in (
+                (x_term, adsk.fusion.DimensionOrientations.HorizontalDimensionOrientation, (x / 2, y)),
+                (y_term, adsk.fusion.DimensionOrientations.VerticalDimensionOrientation, (x, y / 2))):
+            expression = term.distance(profile.name, profile)
+            if expression is None:
+                continue
+            dimension = dimensions.addDistanceDimension(
+                sketch.originPoint, point, orientation, adsk.core.Point3D.create(text[0], text[1], 0))
+            dimension.parameter.expression = expression
+
+def retarget_bins(components, grid):
+    """Drive parametric bin components by the user parameters of another grid, in place
+    
+    Expressions are rewritten from the old grid's parameters to the new
+    ones, so the bins resize in the next recompute without being rebuilt.
+    Components that are not parametric or already on `grid` are skipped,
+    returns the number retargeted.
+    """
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    add_grid_parameters(design, grid_profiles.grid_profile(grid, config.GRID_CONFIG[grid]))
+    retargeted = 0
+    for comp in components:
+        attribute = comp.attributes.itemByName(batch_sync.ATTRIBUTE_GROUP, parametric.PARAMETRIC_ATTRIBUTE)
+        if attribute is None or attribute.value == grid:
+            continue
+        old_grid = attribute.value
+        for parameter in comp.modelParameters:
+            expression = parametric.retarget_expression(parameter.expression, old_grid, grid)
+            if expression != parameter.expression:
+                parameter.expression = expression
+        attribute.value = grid
+        
+        # Keep the batch stamp in line so incremental runs see the new grid
+        spec_attribute = comp.attributes.itemByName(batch_sync.ATTRIBUTE_GROUP, batch_sync.SPEC_ATTRIBUTE)
+        if spec_attribute is not None:
+            spec, _ = batch_sync.spec_from_json(spec_attribute.value)
+            spec_attribute.value = batch_sync.spec_json(spec, grid)
+        retargeted += 1
+    return retargeted
+
+def parametric_components(design):
+    """Components of the design built as parametric bins"""
+    components = []
+    for attribute in design.findAttributes(batch_sync.ATTRIBUTE_GROUP, parametric.PARAMETRIC_ATTRIBUTE):
+        comp = attribute.parent
+        if comp is not None and comp.isValid:
+            components.append(comp)
+    return components
 
 def command_created(args: adsk.core.CommandCreatedEventArgs):
     """Set up the command dialog"""
@@ -197,39 +478,21 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     # Grid system selector
     gridSystemInput = inputs.addDropDownCommandInput('grid_system', 'Grid System', 
                                                      adsk.core.DropDownStyles.TextListDropDownStyle)
-    gridSystemInput.listItems.add('10mm Micro Grid', config.ACTIVE_GRID == 'micro_10mm')
-    gridSystemInput.listItems.add('42mm Standard Gridfinity', config.ACTIVE_GRID == 'standard')
-
-CMD_NAME = 'Gridfinity Bin Generator'
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_binGenerator'
-CMD_Description = 'Generate Gridfinity bins with 10mm or 42mm grid'
-IS_PROMOTED = True
-WORKSPACE_ID = 'FusionSolidEnvironment'
-PANEL_ID = 'SolidCreatePanel'
-COMMAND_BESIDE_ID = ''
-ICON_FOLDER = os.path.join(os.path.dirname(__file__), 'resources', '')
-
-def start():
-    """Create the command definition"""
-    cmd_def = ui.commandDefinitions.addButtonDefinition(
-        CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER
-    )
-    
-    futil.add_handler(cmd_def.commandCreated, command_created)
-    
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
-    control.isPromoted = IS_PROMOTED
+    add_grid_items(gridSystemInput)
+    parametricInput = inputs.addBoolValueInput('parametric', 'Parametric (user parameters)', True, '',
+                                               config.PARAMETRIC_BINS)
+    parametricInput.tooltip = ('Editing a gf_ parameter resizes the bin around its center, '
+                               'bins placed next to it are not moved apart. '
+                               'Bins with scoops or labels are built with fixed dimensions')
 
-def stop():
-    """Clean up the command"""
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-    
-    if command_control:
-        command_control.deleteMe()
-    if command_definition:
-        command_definition.deleteMe()
+def add_grid_items(dropdown):
+    """Fill a dropdown with the grids of config.GRID_CONFIG, the active one selected"""
+    for name, grid in config.GRID_CONFIG.items():
+        dropdown.listItems.add(grid.get('label', name), name == config.ACTIVE_GRID)
+
+def selected_grid(dropdown):
+    """Grid name of the item selected in a dropdown filled by add_grid_items"""
+    return list(config.GRID_CONFIG)[dropdown.selectedItem.index]
+
+CMD_NAME = BIN_GENERATOR.name
+CMD_ID = BIN_GENERATOR.id
@@ -1,22 +1,103 @@
-"""Placeholder command for configuration loading."""
+"""Config loader: validates batch configurations and compiles their plan cache.
+
+Every group of the selected config is checked against the batch schema and
+planned once, the plans are pickled next to the config (see
+lib/plan_cache.py) so the batch processor starts from them without parsing
+the file again. Problems are reported per row before any geometry exists.
+"""
 
 import adsk.core
 import adsk.fusion
+import os
+import time
 from ..lib import fusion360utils as futil
+from ..lib import batch_index
+from ..lib import batch_planner
+from ..lib import grid_profiles
+from ..lib import plan_cache
 from .. import config
+from . import CONFIG_LOADER
+from . import BinGeneratorCommand
 
 app = adsk.core.Application.get()
 ui = app.userInterface
 
-CMD_NAME = 'Config Loader'
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_configLoader'
-CMD_Description = 'Load configuration settings'
+CMD_NAME = CONFIG_LOADER.name
+CMD_ID = CONFIG_LOADER.id
+MAX_REPORTED_ERRORS = 20  # Rows listed in the message box, the log gets all of them
+
+
+class ConfigLoaderExecuteHandler(adsk.core.CommandEventHandler):
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            inputs = args.firingEvent.sender.commandInputs
+            config_file = inputs.itemById('config_file').selectedItem
+            if config_file is None:
+                ui.messageBox(f'No configuration files in {config.BATCH_CONFIG_PATH}')
+                return
+            grid = BinGeneratorCommand.selected_grid(inputs.itemById('grid_system'))
+            ui.messageBox(load_config(config_file.name, grid))
+        except Exception as e:
+            ui.messageBox(f'Loading the configuration failed:\n{str(e)}')
+
+def load_config(config_file, grid=None):
+    """Validate every group of a config and cache its plans, returns the report text"""
+    config_path = os.path.join(config.BATCH_CONFIG_PATH, config_file)
+    grids = grid_profiles.GridSet(config.GRID_CONFIG, grid or config.ACTIVE_GRID)
+    start = time.perf_counter()
+    digest = plan_cache.file_digest(config_path)
+    index = batch_index.get_index(config_path, grids)
+    summaries = batch_index.group_summaries(index)
+
+    errors = []
+    compiled = []
+    for size_group in [0] + [summary.group for summary in summaries]:
+        try:
+            plan_cache.compile_plan(config_path, size_group, grids, config.TRAY_SIZE, digest=digest)
+            compiled.append(size_group)
+        except batch_planner.BatchPlanError as e:
+            if size_group == 0:
+                # The whole file lists every bad row once
+                errors = e.errors
+    elapsed = (time.perf_counter() - start) * 1000
+
+    bins = sum(summary.bins for summary in summaries)
+    specs = len(batch_index.distinct_specs(index))
+    message = f'{config_file}: {len(summaries)} groups, {bins} bins, {specs} distinct specs'
+    groups = ', '.join('all' if group == 0 else str(group) for group in compiled) or 'none'
+    message += f'\nPlans cached for groups: {groups} ({elapsed:.0f} ms)'
+    if errors:
+        futil.log(str(batch_planner.BatchPlanError(config_file, errors)))
+        message += f'\n{len(errors)} invalid row(s):'
+        for row, problem in errors[:MAX_REPORTED_ERRORS]:
+            message += f'\nrow {row}: {problem}'
+        if len(errors) > MAX_REPORTED_ERRORS:
+            message += f'\n... see the log for the other {len(errors) - MAX_REPORTED_ERRORS}'
+    futil.log(f'{CMD_NAME}: {message}')
+    return message
+
+def command_created(args: adsk.core.CommandCreatedEventArgs):
+    """Set up the config loader dialog"""
 
+    cmd = args.command
+    onExecute = ConfigLoaderExecuteHandler()
+    cmd.execute.add(onExecute)
+    local_handlers.append(onExecute)
 
-def start():
-    # Placeholder for potential future implementation
-    pass
+    inputs = cmd.commandInputs
+    fileDropdown = inputs.addDropDownCommandInput('config_file', 'Configuration File',
+                                                  adsk.core.DropDownStyles.TextListDropDownStyle)
+    for i, file in enumerate(batch_index.list_configs(config.BATCH_CONFIG_PATH)):
+        fileDropdown.listItems.add(file, i == 0)
+    gridDropdown = inputs.addDropDownCommandInput('grid_system', 'Default Grid',
+                                                  adsk.core.DropDownStyles.TextListDropDownStyle)
+    BinGeneratorCommand.add_grid_items(gridDropdown)
 
+# Fusion only keeps weak references to handlers added directly
+local_handlers = []
 
 def stop():
-    pass
+    local_handlers.clear()
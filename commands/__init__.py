@@ -1,20 +1,120 @@
-# Define the command definitions
-from . import BinGeneratorCommand
-from . import BatchProcessorCommand
-from . import ConfigLoaderCommand
+"""Command registry.
+
+Only the button definitions are created when the add-in loads. A command's
+module, and with it the parsers and geometry engines it imports, is loaded
+on the first click, its `start()` runs then and its command created
+handler takes over.
+"""
+import adsk.core
+import importlib
+import os
+import time
+from typing import NamedTuple
+from ..lib import fusion360utils as futil
+from .. import config
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+WORKSPACE_ID = 'FusionSolidEnvironment'
+PANEL_ID = 'SolidCreatePanel'
+
+
+class CommandInfo(NamedTuple):
+    """What a button needs before its command module is imported"""
+    module: str
+    id: str
+    name: str
+    description: str
+    created: str  # Name of the module's command created handler
+    resources: str = ''
+    promoted: bool = False
+
+
+BIN_GENERATOR = CommandInfo(
+    'BinGeneratorCommand',
+    f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_binGenerator',
+    'Gridfinity Bin Generator',
+    'Generate Gridfinity bins with 10mm or 42mm grid',
+    'command_created',
+    os.path.join(os.path.dirname(__file__), 'resources', ''),
+    True
+)
+BATCH_PROCESSOR = CommandInfo(
+    'BatchProcessorCommand',
+    f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_batchProcessor',
+    'Batch Bin Processor',
+    'Generate multiple bins from configuration files',
+    'command_created_batch'
+)
+CONFIG_LOADER = CommandInfo(
+    'ConfigLoaderCommand',
+    f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_configLoader',
+    'Config Loader',
+    'Validate batch configurations and cache their plans',
+    'command_created'
+)
 
 # List of commands
 commands = [
-    BinGeneratorCommand,
-    BatchProcessorCommand,
-    ConfigLoaderCommand
+    BIN_GENERATOR,
+    BATCH_PROCESSOR,
+    CONFIG_LOADER,
 ]
 
+# Command modules imported so far, by module name
+loaded = {}
+
+
+def load(info):
+    """Import a command's module on first use and run its start()"""
+    module = loaded.get(info.module)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(f'{__name__}.{info.module}')
+        if hasattr(module, 'start'):
+            module.start()
+        loaded[info.module] = module
+        futil.log(f'{info.name}: loaded in {(time.perf_counter() - started) * 1000:.0f} ms')
+    return module
+
+
+def lazy_created(info):
+    """Command created handler importing the command's module when first fired"""
+    def command_created(args: adsk.core.CommandCreatedEventArgs):
+        try:
+            getattr(load(info), info.created)(args)
+        except:
+            futil.handle_error(info.name)
+    return command_created
+
+
 # Initialize the commands
 def start():
-    for command in commands:
-        command.start()
+    for info in commands:
+        cmd_def = ui.commandDefinitions.itemById(info.id) or ui.commandDefinitions.addButtonDefinition(
+            info.id, info.name, info.description, info.resources
+        )
+        futil.add_handler(cmd_def.commandCreated, lazy_created(info))
+
+        workspace = ui.workspaces.itemById(WORKSPACE_ID)
+        panel = workspace.toolbarPanels.itemById(PANEL_ID)
+        control = panel.controls.addCommand(cmd_def, '', False)
+        control.isPromoted = info.promoted
+
 
 def stop():
-    for command in commands:
-        command.stop()
+    for module in loaded.values():
+        if hasattr(module, 'stop'):
+            module.stop()
+    loaded.clear()
+
+    workspace = ui.workspaces.itemById(WORKSPACE_ID)
+    panel = workspace.toolbarPanels.itemById(PANEL_ID)
+    for info in commands:
+        command_control = panel.controls.itemById(info.id)
+        command_definition = ui.commandDefinitions.itemById(info.id)
+        if command_control:
+            command_control.deleteMe()
+        if command_definition:
+            command_definition.deleteMe()
@@ -2,7 +2,8 @@
 import os
 import json
 
-DEBUG = True
+DEBUG = True  # Also enables stage timing instrumentation
+PROFILE_EXPORT_PATH = None  # Set to a .json path to save batch stage timings
 ADDIN_NAME = 'GridfinityGenerator'
 COMPANY_NAME = 'LevMishin'
 
@@ -12,24 +13,59 @@ sample_palette_id = f'{COMPANY_NAME}_{ADDIN_NAME}_palette_id'
 # GRID CONFIGURATION - Modified for 10mm system
 GRID_CONFIG = {
     'standard': {
+        'label': '42mm Standard Gridfinity',
         'base_unit': 42.0,  # mm - Original Gridfinity
         'height_unit': 7.0,  # mm
         'xy_tolerance': 0.25,  # mm
         'wall_thickness': 1.6,  # mm
+        'magnet_diameter': 6.5,  # mm - 6x2mm magnets
+        'magnet_depth': 2.4,  # mm
+        'magnet_inset': 8.0,  # mm - Socket centers from the cell edges, 4 per cell
     },
     'micro_10mm': {
+        'label': '10mm Micro Grid',
         'base_unit': 10.0,  # mm - Your custom grid
         'height_unit': 1.7,  # mm - Scaled proportionally
         'xy_tolerance': 0.1,  # mm - Tighter tolerance for smaller scale
         'wall_thickness': 0.5,  # mm - Thinner walls for small bins
         'minimum_feature': 0.4,  # mm - Minimum printable feature
+        'magnet_diameter': 3.2,  # mm - 3x1mm magnets
+        'magnet_depth': 1.2,  # mm
+        'magnet_inset': 5.0,  # mm - Half a cell, one centered socket per cell
     }
 }
 
-# Set active grid system
+# Default grid system, the dialogs preselect it and batch rows without a Grid column use it
 ACTIVE_GRID = 'micro_10mm'  # Change to 'standard' for original 42mm grid
 
-# Batch processing configuration paths
+# Build bins from shared user parameters (gf_<grid>_base_unit, ...) so editing one
+# resizes every bin, slower to build than bins with baked dimensions. Bins resize
+# around their placed centers, neighbours are not moved apart. Bins with magnets,
+# scoops or labels are always built with baked dimensions
+PARAMETRIC_BINS = False
+
+# Tray footprint in units of the default grid, bins without a position are packed into it
+TRAY_SIZE = (30, 30)
+
+# Seconds of building per custom event, Fusion's UI and the cancel button respond in between
+BATCH_CHUNK_SECONDS = 0.25
+
+# Dry-run estimates: build step timings recorded to calibrate the cost model,
+# filament density in g/cm^3 and the time budget batches are split into sessions by
+COST_SAMPLES_PATH = os.path.join(os.path.dirname(__file__), 'cost_samples.json')
+FILAMENT_DENSITY = 1.24  # PLA
+BATCH_SESSION_SECONDS = 900
+
+# 'warn' lists overlapping bins in the batch report, 'error' refuses the batch
+OVERLAP_POLICY = 'warn'
+
+# Batch processing configuration paths, a missing folder lists no configs
 BATCH_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'batch_configs')
-if not os.path.exists(BATCH_CONFIG_PATH):
-    os.makedirs(BATCH_CONFIG_PATH)
+
+# Batch export output, created on first export
+BATCH_EXPORT_PATH = os.path.join(os.path.dirname(__file__), 'batch_exports')
+
+# Generated geometry reused across sessions, created on first store
+GEOMETRY_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'geometry_cache')
+GEOMETRY_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used files are evicted above this
+USE_GEOMETRY_CACHE = True
@@ -0,0 +1,152 @@
+"""Command line entry point for headless bin generation.
+
+Runs the planner and the mesh backend without Fusion 360:
+
+    python gridfinity_cli.py bin 3 2 4 --compartments 2x2
+    python gridfinity_cli.py batch batch_configs/size_group_2.csv --group 2 --export out/
+    python gridfinity_cli.py batch big_catalog.csv --workers 0 --export out/
+    python gridfinity_cli.py batch big_catalog.csv --shard 2/4 --export out/shard-2of4
+    python gridfinity_cli.py merge out/ out/
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import config
+from lib import batch_journal
+from lib import batch_planner
+from lib import grid_profiles
+from lib import mesh_backend
+from lib import mesh_export
+from lib import parallel_batch
+from lib import plan_cache
+
+
+def generate_specs(backend, specs):
+    """Build a mesh for every spec, returns {spec: mesh}"""
+    meshes = {}
+    for spec in specs:
+        meshes[spec] = backend.generate_bin(
+            spec.width, spec.length, spec.height, spec.compartments,
+            {name: True for name in spec.features}
+        )
+    return meshes
+
+
+def command_bin(args, backend):
+    spec = batch_planner.BinSpec(args.width, args.length, args.height,
+                                 batch_planner.parse_compartments(args.compartments),
+                                 batch_planner.parse_features(args.features))
+    start = time.perf_counter()
+    mesh = generate_specs(backend, [spec])[spec]
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f'{spec}: {mesh.triangle_count} triangles, {mesh.volume():.1f} mm^3 in {elapsed:.2f} ms')
+    return 0
+
+
+def command_batch(args, backend):
+    grids = grid_profiles.GridSet(config.GRID_CONFIG, args.grid)
+    layouts = []
+    try:
+        jobs = batch_planner.plan_batch(args.config_file, args.group, grids, args.tray, layouts)
+    except batch_planner.BatchPlanError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for layout in layouts:
+        print(f'Layout {layout.describe()}')
+    planned = jobs
+    if args.shard:
+        indexes = batch_journal.shard_jobs(jobs, grids, args.shard.count)[args.shard.index - 1]
+        jobs = [jobs[index] for index in indexes]
+        print(f'Shard {args.shard.index} of {args.shard.count}: {len(jobs)} of {len(planned)} bins')
+
+    formats = tuple(args.formats.split(','))
+    cache_directory = None if args.no_cache else args.cache
+    report = parallel_batch.run_parallel(jobs, grids, args.export, args.workers, formats,
+                                         cache_directory, config.GEOMETRY_CACHE_MAX_BYTES)
+
+    results = report.results
+    triangles = sum(result.triangles for result in results)
+    rate = len(results) / report.wall_seconds * 60 if report.wall_seconds else float('inf')
+    print(f'{len(jobs)} bins, {len(results)} unique specs, {triangles} triangles '
+          f'in {report.wall_seconds * 1000:.1f} ms ({rate:.0f} specs/min)')
+    if cache_directory and args.export:
+        print(f'Geometry cache: {report.cache_hits} of {len(results)} specs reused')
+    for worker, (count, seconds) in sorted(report.worker_times.items()):
+        print(f'  worker {worker}: {count} specs, {seconds * 1000:.1f} ms busy')
+    if report.manifest:
+        print(f'Exported {sum(len(result.files) for result in results)} files and {report.manifest}')
+        if args.shard:
+            key = plan_cache.plan_key(plan_cache.file_digest(args.config_file), args.group, grids, args.tray)
+            files = [path for result in results for path in result.files]
+            batch_journal.write_shard_manifest(args.export, os.path.basename(args.config_file),
+                                               batch_journal.plan_id(key), args.shard, jobs, len(planned),
+                                               mesh_export.manifest_rows(
+                                                   parallel_batch.succeeded_jobs(jobs, grids, results), grids),
+                                               files)
+    for failure in report.failures:
+        print(f'FAILED {failure.spec} ({failure.grid}):\n{failure.error}', file=sys.stderr)
+    return 1 if report.failures else 0
+
+
+def command_merge(args, backend):
+    try:
+        report = batch_journal.merge_shards(args.directories, args.target)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(report.describe())
+    for path in report.absent:
+        print(f'not found: {path}', file=sys.stderr)
+    print(f'Wrote {report.manifest}')
+    return 0 if report.complete else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Headless Gridfinity bin generation')
+    parser.add_argument('--grid', default=config.ACTIVE_GRID, choices=sorted(config.GRID_CONFIG),
+                        help='grid profile from config.GRID_CONFIG, batch rows may override it '
+                             'with a Grid column')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bin_parser = subparsers.add_parser('bin', help='generate a single bin')
+    bin_parser.add_argument('width', type=int, help='width in grid units')
+    bin_parser.add_argument('length', type=int, help='length in grid units')
+    bin_parser.add_argument('height', type=int, help='height in height units')
+    bin_parser.add_argument('--compartments', default='1x1')
+    bin_parser.add_argument('--features', default='', help='e.g. magnet+label')
+    bin_parser.set_defaults(handler=command_bin)
+
+    batch_parser = subparsers.add_parser('batch', help='generate every bin of a batch config')
+    batch_parser.add_argument('config_file')
+    batch_parser.add_argument('--group', type=int, default=0, help='size group, 0 = all')
+    batch_parser.add_argument('--export', metavar='DIR', help='write STL/3MF files and a manifest')
+    batch_parser.add_argument('--formats', default='stl,3mf', help='comma separated: stl, 3mf')
+    batch_parser.add_argument('--workers', type=int, default=1,
+                              help='worker processes, 0 = one per CPU')
+    batch_parser.add_argument('--cache', metavar='DIR', default=config.GEOMETRY_CACHE_PATH,
+                              help='geometry cache for exports, default next to the batch configs')
+    batch_parser.add_argument('--no-cache', action='store_true', help='always regenerate exports')
+    batch_parser.add_argument('--tray', type=batch_planner.parse_compartments, default=config.TRAY_SIZE,
+                              help='tray footprint in grid units for unpositioned bins, e.g. 30x30')
+    batch_parser.add_argument('--shard', type=batch_journal.parse_shard, metavar='I/N',
+                              help='build only slice I of N of the plan, e.g. 2/4')
+    batch_parser.set_defaults(handler=command_batch)
+
+    merge_parser = subparsers.add_parser('merge', help='collate the exports of batch shards')
+    merge_parser.add_argument('target', help='folder for the merged files and manifest')
+    merge_parser.add_argument('directories', nargs='+', help='shard exports, or folders holding them')
+    merge_parser.set_defaults(handler=command_merge)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    backend = mesh_backend.MeshBackend(config.GRID_CONFIG[args.grid])
+    return args.handler(args, backend)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""Dry-run estimates of a batch plan: geometry cost, build time and material.
+
+Everything is computed in closed form from the plan without a design. The
+operation counts mirror how the Fusion backend builds a bin: one component
+per distinct spec, then a fixed number of sketches and features per
+feature type, and one occurrence per bin. Volumes are those of the shelled
+solid it produces. Build time comes from a per operation CostModel fitted
+by `calibrate` to the step timings that real batch runs record:
+
+    python -m lib.batch_estimate batch_configs/size_group_3.txt 3 [grid]
+
+Scoops and label ledges crossing a divider count the crossing twice, a
+fraction of a percent of a bin's volume.
+"""
+
+import json
+import math
+import os
+import sys
+from typing import NamedTuple, Tuple
+
+from . import bin_features
+from . import bin_geometry
+from .batch_progress import format_duration
+
+PLA_DENSITY = 1.24  # g/cm^3
+MAX_SAMPLES = 2000  # Recorded timings kept for calibration, the newest win
+SESSION_SECONDS = 900.0  # Default budget when splitting a batch into sessions
+
+
+class Operations(NamedTuple):
+    """Fusion API work of one step, fields in CostModel order"""
+    components: int = 0
+    sketches: int = 0
+    features: int = 0
+    curves: int = 0  # Sketch curves drawn
+    occurrences: int = 0
+
+    def scaled(self, factor):
+        return Operations(*(value * factor for value in self))
+
+    def plus(self, other):
+        return Operations(*(a + b for a, b in zip(self, other)))
+
+
+PLACEMENT = Operations(occurrences=1)  # A further bin of an already built spec
+
+
+class CostModel(NamedTuple):
+    """Seconds per operation, the defaults are rough figures for an uncalibrated model"""
+    component: float = 0.05
+    sketch: float = 0.03
+    feature: float = 0.08
+    curve: float = 0.002
+    occurrence: float = 0.01
+
+    def seconds(self, operations):
+        return sum(cost * count for cost, count in zip(self, operations))
+
+
+def spec_operations(profile, spec):
+    """Operations of building the first bin of a spec through the feature chain"""
+    layout = bin_geometry.bin_layout(profile, spec.width, spec.length, spec.height, spec.compartments)
+    sketches, features, curves = 1, 2, 4  # Outline sketch, base extrude and shell
+    if layout.dividers:
+        sketches += 1
+        features += 1
+        curves += 4 * len(layout.dividers)
+    geometry = bin_features.bin_features(profile, spec.width, spec.length, spec.height,
+                                         spec.compartments, spec.features)
+    if geometry:
+        if geometry.magnets:
+            sketches += 2
+            features += 2
+            curves += 4 + len(geometry.magnets)
+        for group in geometry.scoops + geometry.labels:
+            sketches += 1
+            features += 1
+            curves += 3 * len(group.ledges)
+    return Operations(1, sketches, features, curves, 1)
+
+
+def spec_volume(profile, spec):
+    """Solid volume of one bin in mm^3"""
+    layout = bin_geometry.bin_layout(profile, spec.width, spec.length, spec.height, spec.compartments)
+    wall = layout.wall
+    inner_width = layout.width - 2 * wall
+    inner_length = layout.length - 2 * wall
+    volume = layout.width * layout.length * layout.height - inner_width * inner_length * (layout.height - wall)
+    divider_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in layout.dividers)
+    volume += divider_area * (layout.divider_height - wall)
+
+    geometry = bin_features.bin_features(profile, spec.width, spec.length, spec.height,
+                                         spec.compartments, spec.features)
+    if geometry:
+        if geometry.magnets:
+            volume += (inner_width * inner_length - divider_area) * (geometry.floor - wall)
+            volume -= len(geometry.magnets) * math.pi * geometry.magnet_radius ** 2 * geometry.magnet_depth
+        for group in geometry.scoops:
+            volume += (group.x1 - group.x0) * sum(ledge.size ** 2 * (1 - math.pi / 4) for ledge in group.ledges)
+        for group in geometry.labels:
+            volume += (group.x1 - group.x0) * sum(ledge.size ** 2 / 2 for ledge in group.ledges)
+    return volume
+
+
+class SpecEstimate(NamedTuple):
+    grid: str
+    spec: tuple
+    bins: int
+    operations: Operations  # Of the first bin, further ones are PLACEMENTs
+    volume: float  # mm^3 per bin
+    mass: float  # g per bin
+
+
+class BatchEstimate(NamedTuple):
+    """Totals of a plan, `job_seconds` is the estimated time of every job in plan order"""
+    operations: Operations
+    seconds: float
+    volume: float  # mm^3
+    mass: float  # g
+    specs: Tuple[SpecEstimate, ...]
+    groups: dict  # group -> (bins, seconds, grams)
+    job_seconds: Tuple[float, ...]
+
+    @property
+    def timeline_items(self):
+        """Sketches, features and one entry per occurrence"""
+        return self.operations.sketches + self.operations.features + self.operations.occurrences
+
+
+def estimate_plan(jobs, grids, model=CostModel(), density=PLA_DENSITY):
+    """Estimate a planned batch without building it, `grids` is the GridSet it was planned with"""
+    specs = {}
+    totals = Operations()
+    job_seconds = []
+    groups = {}
+    for job in jobs:
+        key = (grids.resolve(job.grid), job.spec)
+        entry = specs.get(key)
+        if entry is None:
+            profile = grids.profile(job.grid)
+            operations = spec_operations(profile, job.spec)
+            volume = spec_volume(profile, job.spec)
+            entry = specs[key] = SpecEstimate(key[0], job.spec, 0, operations, volume,
+                                              volume / 1000.0 * density)
+            step = operations
+        else:
+            step = PLACEMENT
+        specs[key] = entry._replace(bins=entry.bins + 1)
+        totals = totals.plus(step)
+        seconds = model.seconds(step)
+        job_seconds.append(seconds)
+        bins, group_seconds, grams = groups.get(job.group, (0, 0.0, 0.0))
+        groups[job.group] = (bins + 1, group_seconds + seconds, grams + entry.mass)
+
+    volume = sum(entry.volume * entry.bins for entry in specs.values())
+    return BatchEstimate(totals, sum(job_seconds), volume, volume / 1000.0 * density,
+                         tuple(specs.values()), groups, tuple(job_seconds))
+
+
+def split_sessions(job_seconds, budget=SESSION_SECONDS):
+    """Consecutive (first job, end job, seconds) slices of a plan that fit `budget` each.
+
+    A single job over the budget gets a session of its own.
+    """
+    sessions = []
+    start = 0
+    total = 0.0
+    for index, seconds in enumerate(job_seconds):
+        if index > start and total + seconds > budget:
+            sessions.append((start, index, total))
+            start = index
+            total = 0.0
+        total += seconds
+    if start < len(job_seconds):
+        sessions.append((start, len(job_seconds), total))
+    return sessions
+
+
+def _solve(matrix, vector):
+    """Solve a small dense linear system by Gaussian elimination with partial pivoting"""
+    size = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-15:
+            raise ValueError('singular system')
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, size):
+            factor = rows[row][column] / rows[column][column]
+            for k in range(column, size + 1):
+                rows[row][k] -= factor * rows[column][k]
+    solution = [0.0] * size
+    for row in reversed(range(size)):
+        solution[row] = (rows[row][size] - sum(rows[row][k] * solution[k]
+                                               for k in range(row + 1, size))) / rows[row][row]
+    return solution
+
+
+def calibrate(samples, prior=CostModel(), weight=1e-3):
+    """Fit a CostModel to (Operations, seconds) samples by least squares.
+
+    The fit is pulled towards `prior` by a small ridge term, so operations
+    the samples cannot tell apart (always occurring together) keep sensible
+    costs. Negative costs are clamped to zero.
+    """
+    if not samples:
+        return prior
+    size = len(prior)
+    normal = [[0.0] * size for _ in range(size)]
+    target = [0.0] * size
+    for operations, seconds in samples:
+        for i in range(size):
+            target[i] += operations[i] * seconds
+            for j in range(size):
+                normal[i][j] += operations[i] * operations[j]
+    ridge = weight * max(sum(normal[i][i] for i in range(size)) / size, 1.0)
+    for i in range(size):
+        normal[i][i] += ridge
+        target[i] += ridge * prior[i]
+    return CostModel(*(max(cost, 0.0) for cost in _solve(normal, target)))
+
+
+def load_samples(path):
+    """(Operations, seconds) samples recorded at `path`, none when the file is missing"""
+    try:
+        with open(path, 'r') as file:
+            return [(Operations(*sample[:-1]), sample[-1]) for sample in json.load(file)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def record_samples(path, samples):
+    """Append samples to the file at `path`, keeping the newest MAX_SAMPLES"""
+    data = [list(operations) + [seconds] for operations, seconds in load_samples(path) + list(samples)]
+    try:
+        temp = f'{path}.tmp'
+        with open(temp, 'w') as file:
+            json.dump(data[-MAX_SAMPLES:], file, separators=(',', ':'))
+        os.replace(temp, path)
+    except OSError:
+        pass
+
+
+def load_model(path):
+    """CostModel calibrated from the samples at `path`, the default model without samples"""
+    return calibrate(load_samples(path))
+
+
+def describe(estimate, budget=SESSION_SECONDS):
+    """Report lines for an estimate"""
+    operations = estimate.operations
+    lines = [
+        f'{operations.occurrences} bins, {operations.components} components, {operations.sketches} sketches, '
+        f'{operations.features} features ({estimate.timeline_items} timeline items)',
+        f'Estimated build time {format_duration(estimate.seconds)}',
+        f'Material {estimate.volume / 1000.0:.1f} cm3, {estimate.mass:.1f} g',
+    ]
+    for group, (bins, seconds, grams) in sorted(estimate.groups.items()):
+        lines.append(f'Group {group}: {bins} bins, {format_duration(seconds)}, {grams:.1f} g')
+    sessions = split_sessions(estimate.job_seconds, budget)
+    if len(sessions) > 1:
+        lines.append(f'{len(sessions)} sessions of at most {format_duration(budget)}: ' +
+                     ', '.join(f'bins {start + 1}-{end} ({format_duration(seconds)})' for start, end, seconds in sessions))
+    return lines
+
+
+def describe_specs(estimate):
+    """One line per distinct spec with its per bin volume and mass"""
+    return [f'{grid} {bin_geometry.spec_label(*spec)}: {bins} bins, {volume / 1000.0:.2f} cm3, '
+            f'{mass:.2f} g each, {operations.sketches} sketches, {operations.features} features'
+            for grid, spec, bins, operations, volume, mass in estimate.specs]
+
+
+def main(argv):
+    from . import batch_planner
+
+    args = batch_planner.parse_args(argv, 'batch_estimate')
+    if args is None:
+        return 2
+    config, path, size_group, grids = args
+    try:
+        jobs = batch_planner.plan_batch(path, size_group, grids, config.TRAY_SIZE)
+    except batch_planner.BatchPlanError as e:
+        print(e)
+        return 1
+    estimate = estimate_plan(jobs, grids, load_model(config.COST_SAMPLES_PATH), config.FILAMENT_DENSITY)
+    print('\n'.join(describe(estimate, config.BATCH_SESSION_SECONDS) + describe_specs(estimate)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
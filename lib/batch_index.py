@@ -0,0 +1,316 @@
+"""Persistent sidecar index for batch configuration files.
+
+For every config in the batch folder an index is kept in `.index/<name>.json`
+next to it. The index is keyed on the file's mtime and size and records for
+each size group the byte ranges of its rows, row count, total bin quantity
+and the distinct (grid, spec) pairs. Sizes depend on the default grid, so
+an index built for another default grid is stale as well. The batch dialog reads group summaries from it
+without parsing configs, and the processor seeks straight to the rows of the
+requested group. Rows whose group cannot be read are counted as `unsorted`,
+they are validated with every group so such a file is read in full.
+"""
+
+import json
+import os
+from typing import NamedTuple, Tuple
+
+from . import batch_planner
+from . import batch_readers
+
+INDEX_DIR = '.index'
+INDEX_VERSION = 3
+
+
+class GroupSummary(NamedTuple):
+    group: int
+    rows: int
+    bins: int
+    invalid: int
+    specs: Tuple[Tuple[str, batch_planner.BinSpec], ...]  # (grid, spec)
+    ranges: Tuple[Tuple[int, int, int], ...]  # (start byte, end byte, first row number)
+
+
+def index_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, INDEX_DIR, name + '.json')
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _spec_to_json(grid, spec):
+    return [grid, spec.width, spec.length, spec.height, list(spec.compartments), list(spec.features)]
+
+
+def _spec_from_json(data):
+    grid, width, length, height, compartments, features = data
+    return grid, batch_planner.BinSpec(width, length, height, tuple(compartments), tuple(features))
+
+
+class _GroupStats:
+    """Mutable accumulator for one group while a file is indexed"""
+
+    def __init__(self, grids):
+        self.grids = grids
+        self.rows = 0
+        self.bins = 0
+        self.invalid = 0
+        self.specs = set()
+        self.ranges = []
+
+    def add_record(self, record):
+        self.rows += 1
+        try:
+            row = batch_planner.parse_record(record, self.grids)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            self.invalid += 1
+            return
+        self.bins += row.quantity
+        self.specs.add((row.grid, row.spec))
+
+    def add_span(self, start, end, row_number):
+        """Extend the last byte range when rows of the group are contiguous"""
+        if self.ranges and self.ranges[-1][1] == start:
+            self.ranges[-1][1] = end
+        else:
+            self.ranges.append([start, end, row_number])
+
+    def to_json(self):
+        return {
+            'rows': self.rows,
+            'bins': self.bins,
+            'invalid': self.invalid,
+            'specs': [_spec_to_json(grid, spec) for grid, spec in sorted(self.specs)],
+            'ranges': self.ranges,
+        }
+
+
+def _numbered_byte_lines(file, first_row):
+    """Yield (start byte, end byte, row number, decoded line) for a binary file"""
+    offset = file.tell()
+    for row_number, raw in enumerate(file, start=first_row):
+        end = offset + len(raw)
+        yield offset, end, row_number, raw.decode('utf-8')
+        offset = end
+
+
+def _index_csv(file, groups, grids):
+    """Index CSV rows, returns (header line, rows without a numeric group)"""
+    header_line = file.readline().decode('utf-8')
+    header, group_index = batch_readers.csv_group_index(header_line)
+    unsorted = 0
+    for start, end, row_number, line in _numbered_byte_lines(file, 2):
+        for _, record in batch_readers.csv_records(header, group_index, [(row_number, line)]):
+            try:
+                group = int(record.get('Group', 0))
+            except ValueError:
+                group = 0
+                unsorted += 1
+            stats = groups.setdefault(group, _GroupStats(grids))
+            stats.add_span(start, end, row_number)
+            stats.add_record(record)
+    return header_line, unsorted
+
+
+def _index_text(file, groups, grids):
+    """Index text rows, returns the number of malformed group headers"""
+    current_group = None
+    unsorted = 0
+    for start, end, row_number, line in _numbered_byte_lines(file, 1):
+        try:
+            header_group = batch_readers.text_header_group(line)
+        except ValueError:
+            header_group = None
+            current_group = None
+            unsorted += 1
+        if header_group is not None:
+            current_group = header_group
+            continue
+        stats = groups.setdefault(current_group or 0, _GroupStats(grids))
+        stats.add_span(start, end, row_number)
+        for _, record in batch_readers.text_records([(row_number, line)], 0, current_group):
+            stats.add_record(record)
+    return unsorted
+
+
+def _index_json_lines(file, groups, grids):
+    """Index JSON Lines rows, returns the number of rows without a numeric group"""
+    unsorted = 0
+    for start, end, row_number, line in _numbered_byte_lines(file, 1):
+        if not line.strip():
+            continue
+        try:
+            group = int(batch_readers.json_line_group(line))
+        except ValueError:
+            group = 0
+            unsorted += 1
+        stats = groups.setdefault(group, _GroupStats(grids))
+        stats.add_span(start, end, row_number)
+        try:
+            stats.add_record(json.loads(line))
+        except ValueError:
+            stats.invalid += 1
+    return unsorted
+
+
+def _index_json_array(path, groups, grids):
+    # Elements of a JSON array have no cheap byte boundaries, only summaries are kept
+    with open(path, 'r') as file:
+        for _, item in batch_readers.iter_json_array(file):
+            try:
+                group = int(item.get('Group', 0))
+            except (AttributeError, TypeError, ValueError):
+                group = 0
+            groups.setdefault(group, _GroupStats(grids)).add_record(item)
+
+
+def build_index(path, grids):
+    """Scan a config once and write its sidecar index, returns the index dict"""
+    mtime_ns, size = _file_key(path)
+    groups = {}
+    header = None
+    unsorted = 0
+    if path.endswith('.json'):
+        file_format = 'json'
+        _index_json_array(path, groups, grids)
+    else:
+        with open(path, 'rb') as file:
+            if path.endswith('.csv'):
+                file_format = 'csv'
+                header, unsorted = _index_csv(file, groups, grids)
+            elif path.endswith(batch_readers.JSON_LINES_EXTENSIONS):
+                file_format = 'jsonl'
+                unsorted = _index_json_lines(file, groups, grids)
+            else:
+                file_format = 'text'
+                unsorted = _index_text(file, groups, grids)
+
+    index = {
+        'version': INDEX_VERSION,
+        'mtime_ns': mtime_ns,
+        'size': size,
+        'grid': grids.default,
+        'format': file_format,
+        'header': header,
+        'unsorted': unsorted,
+        'groups': {str(group): stats.to_json() for group, stats in groups.items()},
+    }
+    _write_index(path, index)
+    return index
+
+
+def write_sidecar(target, write, mode='w'):
+    """Atomically replace a file in an INDEX_DIR with what `write(file)` writes, False on failure.
+
+    Everything kept there is rebuilt from the configs when missing, so a
+    read-only batch folder only costs speed and is not an error.
+    """
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = f'{target}.{os.getpid()}.tmp'
+        with open(temp, mode) as file:
+            write(file)
+        os.replace(temp, target)
+    except OSError:
+        return False
+    return True
+
+
+def _write_index(path, index):
+    write_sidecar(index_path(path), lambda file: json.dump(index, file, separators=(',', ':')))
+
+
+def load_index(path, grids=None):
+    """Return the sidecar index if it matches the file's mtime, size and default grid, else None.
+
+    Without `grids` any default grid is accepted, byte ranges do not depend on it.
+    """
+    try:
+        with open(index_path(path), 'r') as file:
+            index = json.load(file)
+        if index.get('version') != INDEX_VERSION:
+            return None
+        if (index['mtime_ns'], index['size']) != _file_key(path):
+            return None
+        if grids is not None and index['grid'] != grids.default:
+            return None
+        return index
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_index(path, grids):
+    """Load the sidecar index, rebuilding it when missing or stale"""
+    return load_index(path, grids) or build_index(path, grids)
+
+
+def group_summaries(index):
+    """Sorted GroupSummary list of an index"""
+    summaries = []
+    for group, data in index['groups'].items():
+        summaries.append(GroupSummary(
+            int(group), data['rows'], data['bins'], data['invalid'],
+            tuple(_spec_from_json(spec) for spec in data['specs']),
+            tuple(tuple(span) for span in data['ranges']),
+        ))
+    return sorted(summaries)
+
+
+def distinct_specs(index):
+    """All distinct (grid, spec) pairs of a config across groups"""
+    specs = set()
+    for summary in group_summaries(index):
+        specs.update(summary.specs)
+    return specs
+
+
+def list_configs(directory):
+    """Batch config file names in a folder, sorted"""
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entry.name for entry in entries
+                          if entry.is_file() and entry.name.endswith(batch_readers.CONFIG_EXTENSIONS))
+    except OSError:
+        return []
+
+
+def _iter_ranges(path, ranges):
+    """Yield (row_number, line) pairs for the byte ranges of a group"""
+    with open(path, 'rb') as file:
+        for start, end, first_row in ranges:
+            file.seek(start)
+            offset = start
+            row_number = first_row
+            while offset < end:
+                raw = file.readline()
+                if not raw:
+                    break
+                offset += len(raw)
+                yield row_number, raw.decode('utf-8')
+                row_number += 1
+
+
+def iter_records(path, size_group=0):
+    """Stream records of a group, seeking to its rows when a fresh index exists.
+
+    Rows whose group cannot be read belong to every group's validation, a
+    file with any of them is streamed by the reader like an unindexed one.
+    """
+    index = load_index(path) if size_group != 0 else None
+    if index is None or index['format'] == 'json' or index['unsorted']:
+        yield from batch_readers.iter_records(path, size_group)
+        return
+
+    group = index['groups'].get(str(size_group))
+    if group is None:
+        return
+    lines = _iter_ranges(path, group['ranges'])
+    if index['format'] == 'csv':
+        header, group_index = batch_readers.csv_group_index(index['header'])
+        yield from batch_readers.csv_records(header, group_index, lines, size_group)
+    elif index['format'] == 'jsonl':
+        yield from batch_readers.json_line_records(lines, size_group)
+    else:
+        yield from batch_readers.text_records(lines, size_group, size_group)
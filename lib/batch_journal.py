@@ -0,0 +1,279 @@
+"""Checkpoint journals, deterministic shards and merging of shard exports.
+
+A batch run appends one JSON line per finished job to a journal next to its
+config, `.index/<name>.g<group>.<grid>[.s<i>of<n>].journal`: job id, spec
+hash, status, seconds and the files exported with it. Every line is flushed
+when written, so after a crash or a hang the next run resumes after the last
+completed job. An incremental run trusts the bins it finds in the design
+over the journal, which cannot tell an unsaved design was lost. Lines carry the id of the plan they belong to, a changed
+config or grid starts over. A run started without resuming and a finished
+run both write a marker line that ends the session.
+
+`shard_jobs` splits a plan into N slices so several Fusion instances or
+machines each build one. Whole specs are assigned, every bin of a spec lands
+in the same shard and is built once, balanced by the default CostModel. The
+split depends only on the plan, every machine computes the same one.
+`merge_shards` collates the exports and manifests the shards wrote:
+
+    python gridfinity_cli.py merge out/ machine1/shard-1of2 machine2/shard-2of2
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import NamedTuple, Tuple
+
+from . import batch_estimate
+from . import batch_index
+from . import batch_sync
+from . import mesh_export
+
+SHARD_MANIFEST = 'shard.json'
+_SESSION_MARKERS = ('started', 'finished')
+
+
+class Shard(NamedTuple):
+    """Slice `index` (1-based) of `count`"""
+    index: int
+    count: int
+
+    @property
+    def label(self):
+        return f'shard-{self.index}of{self.count}'
+
+
+def parse_shard(value):
+    """Shard of an 'I/N' string, e.g. '2/4'"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f'shard "{value}" is not I/N, e.g. 2/4')
+    if not 1 <= index <= count:
+        raise ValueError(f'shard {index} is not between 1 and {count}')
+    return Shard(index, count)
+
+
+def plan_id(key):
+    """Short stable id of a plan_cache.plan_key"""
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()[:16]
+
+
+def journal_path(path, size_group, grid, shard=None):
+    directory, name = os.path.split(path)
+    suffix = f'.s{shard.index}of{shard.count}' if shard and shard.count > 1 else ''
+    return os.path.join(directory, batch_index.INDEX_DIR, f'{name}.g{size_group}.{grid}{suffix}.journal')
+
+
+def shard_jobs(jobs, grids, count):
+    """Job indexes of each of `count` shards, in plan order.
+
+    Specs are assigned heaviest first to the least loaded shard, ties go to
+    the lower shard and the earlier spec.
+    """
+    specs = {}
+    for index, job in enumerate(jobs):
+        specs.setdefault((grids.resolve(job.grid), job.spec), []).append(index)
+    model = batch_estimate.CostModel()
+    weights = []
+    for (grid, spec), indexes in specs.items():
+        operations = batch_estimate.spec_operations(grids.profile(grid), spec)
+        operations = operations.plus(batch_estimate.PLACEMENT.scaled(len(indexes) - 1))
+        weights.append((-model.seconds(operations), indexes[0], indexes))
+
+    loads = [0.0] * max(count, 1)
+    shards = [[] for _ in loads]
+    for weight, _, indexes in sorted(weights, key=lambda entry: entry[:2]):
+        target = min(range(len(loads)), key=lambda shard: (loads[shard], shard))
+        loads[target] -= weight
+        shards[target].extend(indexes)
+    return [sorted(indexes) for indexes in shards]
+
+
+class JournalEntry(NamedTuple):
+    job: int
+    spec: str
+    status: str  # 'done' or 'failed'
+    seconds: float
+    files: Tuple[str, ...] = ()
+    error: str = ''
+
+
+class Journal:
+    """Append-only checkpoint journal of one plan"""
+
+    def __init__(self, path, plan):
+        self.path = path
+        self.plan = plan
+        self.file = None
+
+    def entries(self):
+        """JournalEntries of the current session, lines of other plans and a torn last line are skipped"""
+        entries = []
+        try:
+            with open(self.path, 'r') as file:
+                lines = file.readlines()
+        except OSError:
+            return entries
+        for line in lines:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(data, dict) or data.get('plan') != self.plan:
+                continue
+            if data.get('status') in _SESSION_MARKERS:
+                entries = []
+                continue
+            try:
+                entries.append(JournalEntry(data['job'], data['spec'], data['status'], data['seconds'],
+                                            tuple(data.get('files', ())), data.get('error', '')))
+            except (KeyError, TypeError):
+                continue
+        return entries
+
+    def completed(self):
+        """{job id: JournalEntry} of jobs done in the current session"""
+        return {entry.job: entry for entry in self.entries() if entry.status == 'done'}
+
+    def _write(self, data):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'a')
+        self.file.write(json.dumps(dict(data, plan=self.plan), separators=(',', ':')) + '\n')
+        # A crashed process loses nothing already flushed to the OS
+        self.file.flush()
+
+    def record(self, job, spec, status, seconds, files=(), error=''):
+        data = {'job': job, 'spec': spec, 'status': status, 'seconds': round(seconds, 4)}
+        if files:
+            data['files'] = list(files)
+        if error:
+            data['error'] = error
+        self._write(data)
+
+    def start(self):
+        """Begin a new session, earlier entries no longer count as completed"""
+        self._write({'status': 'started'})
+
+    def finish(self):
+        self._write({'status': 'finished'})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def job_spec_hash(job, grids):
+    return batch_sync.spec_hash(job.spec, grids.resolve(job.grid))
+
+
+def write_shard_manifest(directory, source, plan, shard, jobs, total, rows, files):
+    """Describe what a shard exported, next to its manifest.csv, for merge_shards"""
+    data = {
+        'source': source,
+        'plan': plan,
+        'shard': shard.index,
+        'count': shard.count,
+        'total': total,
+        'jobs': [job.job_id for job in jobs],
+        'rows': rows,
+        'files': sorted(os.path.basename(path) for path in files),
+    }
+    path = os.path.join(directory, SHARD_MANIFEST)
+    with open(path, 'w') as file:
+        json.dump(data, file, separators=(',', ':'))
+    return path
+
+
+def find_shards(directories):
+    """Shard manifest paths of `directories`, each a shard export or a folder of them"""
+    paths = []
+    for directory in directories:
+        path = os.path.join(directory, SHARD_MANIFEST)
+        if os.path.isfile(path):
+            paths.append(path)
+            continue
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name, SHARD_MANIFEST)
+            if os.path.isfile(path):
+                paths.append(path)
+    return paths
+
+
+class MergeReport(NamedTuple):
+    source: str
+    shards: Tuple[int, ...]
+    missing: Tuple[int, ...]  # Shards no manifest was found for
+    jobs: int
+    total: int
+    files: Tuple[str, ...]  # Copied to the target
+    absent: Tuple[str, ...]  # Listed by a shard but not found
+    manifest: str
+
+    @property
+    def complete(self):
+        return not self.missing and not self.absent and self.jobs == self.total
+
+    def describe(self):
+        text = (f'{self.source}: merged shards {", ".join(map(str, self.shards))}, '
+                f'{self.jobs} of {self.total} bins, {len(self.files)} files')
+        if self.missing:
+            text += f', missing shards {", ".join(map(str, self.missing))}'
+        if self.absent:
+            text += f', {len(self.absent)} files not found'
+        return text
+
+
+def merge_shards(directories, target):
+    """Copy the exports of every shard found in `directories` to `target` and write one manifest.
+
+    Raises ValueError when no shard is found or the shards come from
+    different plans.
+    """
+    paths = find_shards(directories)
+    if not paths:
+        raise ValueError(f'no {SHARD_MANIFEST} found in {", ".join(directories)}')
+    shards = {}
+    for path in paths:
+        with open(path, 'r') as file:
+            data = json.load(file)
+        shards.setdefault(data['shard'], (os.path.dirname(path), data))
+    first = next(iter(shards.values()))[1]
+    for _, data in shards.values():
+        if (data['plan'], data['count']) != (first['plan'], first['count']):
+            raise ValueError(f'shards of different plans: {data["source"]} {data["plan"]} '
+                             f'and {first["source"]} {first["plan"]}')
+
+    os.makedirs(target, exist_ok=True)
+    quantities = {}
+    rows = []
+    jobs = set()
+    copied = []
+    absent = []
+    for index in sorted(shards):
+        directory, data = shards[index]
+        jobs.update(data['jobs'])
+        for row in data['rows']:
+            key = (row['File'], row['Group'], row['Grid'])
+            if key in quantities:
+                quantities[key]['Quantity'] += row['Quantity']
+            else:
+                quantities[key] = dict(row)
+                rows.append(quantities[key])
+        for name in data['files']:
+            source = os.path.join(directory, name)
+            destination = os.path.join(target, name)
+            if not os.path.isfile(source):
+                absent.append(source)
+                continue
+            if os.path.abspath(source) != os.path.abspath(destination):
+                shutil.copyfile(source, destination)
+            copied.append(destination)
+
+    missing = tuple(index for index in range(1, first['count'] + 1) if index not in shards)
+    return MergeReport(first['source'], tuple(sorted(shards)), missing, len(jobs), first['total'],
+                       tuple(copied), tuple(absent), mesh_export.write_manifest(target, rows))
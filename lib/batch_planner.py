@@ -0,0 +1,402 @@
+"""Batch planner: turns batch configuration files into validated bin jobs.
+
+Nothing in this module touches the Fusion API, plans can be built, validated
+and timed on any machine with a plain Python interpreter:
+
+    python -m lib.batch_planner batch_configs/size_group_2.csv 2 [grid]
+
+Bin sizes and positions in batch files are in mm. Sizes are converted to
+units of the grid named in the row's Grid column, rows without one use the
+default grid of the `GridSet` the plan is built for.
+"""
+
+import math
+import os
+import re
+import sys
+import time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from . import batch_readers
+from . import bin_features
+from . import grid_profiles
+from . import tray_layout
+
+LEVEL_HEIGHT_MM = 20  # Z offset per drawer level in text configurations
+DEFAULT_HEIGHT_UNITS = 2
+KNOWN_FEATURES = ('magnet', 'scoop', 'label')
+DEFAULT_TRAY = (30, 30)  # Tray footprint in default grid units for bins without a position
+AUTO_POSITIONS = ('', 'auto', 'distributed')
+PLAIN_FEATURE = 'base'  # Written for bins without features, builds nothing
+
+# The schema every config format is checked against, field -> required
+RECORD_FIELDS = {
+    'Group': False,
+    'BinSize': True,
+    'Quantity': False,
+    'Compartments': False,
+    'Features': False,
+    'Grid': False,
+    'TrayPosition': False,  # CSV and JSON
+    'Level': False,  # Text rows, with Position
+    'Position': False,
+}
+_FEATURE_SEPARATORS = re.compile(r'[+,\s]+')
+
+
+class BinSpec(NamedTuple):
+    """Geometry of a bin, identical specs produce identical components"""
+    width: int
+    length: int
+    height: int
+    compartments: Tuple[int, int] = (1, 1)
+    features: Tuple[str, ...] = ()
+
+
+class BinJob(NamedTuple):
+    """A single bin to place, translation is in cm (Fusion internal units)"""
+    job_id: int
+    group: int
+    row: int
+    spec: BinSpec
+    translation: Optional[Tuple[float, float, float]]  # None until auto layout
+    level: int = 0
+    auto_band: Optional[Tuple[float, float]] = None  # Preferred y range (mm) for auto layout
+    grid: str = ''
+
+
+class RowPlan(NamedTuple):
+    """A parsed config row, `position` is None for automatically laid out bins"""
+    group: int
+    spec: BinSpec
+    quantity: int
+    position: Optional[Callable[[int], Tuple[float, float, float]]]
+    level: int = 0
+    auto_band: Optional[Tuple[float, float]] = None
+    grid: str = ''
+
+
+class BatchPlanError(ValueError):
+    """Raised when a batch configuration has invalid rows.
+
+    `errors` holds (row, message) pairs for every problem found, so the whole
+    file can be reported at once.
+    """
+
+    def __init__(self, source, errors):
+        self.source = source
+        self.errors = errors
+        lines = [f'row {row}: {message}' for row, message in errors]
+        super().__init__(f'{len(errors)} invalid row(s) in {source}:\n' + '\n'.join(lines))
+
+
+def parse_size(size_string, unit_mm):
+    """Convert "20x30" (mm) into units of a grid with `unit_mm` cells"""
+    parts = size_string.strip().split('x')
+    if len(parts) != 2:
+        raise ValueError(f'bad bin size "{size_string}"')
+    width, length = (int(float(part) / unit_mm + 1e-9) for part in parts)
+    if width < 1 or length < 1:
+        raise ValueError(f'bin size "{size_string}" is smaller than one grid unit')
+    return width, length
+
+
+def parse_compartments(compartments_string):
+    """Convert "2x3" into a compartment count tuple"""
+    parts = compartments_string.strip().split('x')
+    if len(parts) != 2:
+        raise ValueError(f'bad compartments "{compartments_string}"')
+    comp_x, comp_y = (int(part) for part in parts)
+    if comp_x < 1 or comp_y < 1:
+        raise ValueError(f'compartments "{compartments_string}" must be at least 1x1')
+    return comp_x, comp_y
+
+
+def parse_features(features):
+    """Normalize "base+magnet" strings or JSON dicts into sorted feature names"""
+    if isinstance(features, dict):
+        enabled = [name for name, value in features.items() if value]
+    else:
+        enabled = [name for name in KNOWN_FEATURES if name in str(features or '')]
+    return tuple(sorted(enabled))
+
+
+def check_record(record):
+    """Check a reader record against RECORD_FIELDS, raises ValueError naming every problem"""
+    if not isinstance(record, dict):
+        raise ValueError(f'expected an object with {", ".join(RECORD_FIELDS)}, got {type(record).__name__}')
+    problems = [f'unknown field "{name}"' for name in record if name not in RECORD_FIELDS]
+    problems += [f'missing {name}' for name, required in RECORD_FIELDS.items()
+                 if required and record.get(name) in (None, '')]
+    if record.get('TrayPosition') and (record.get('Level') or record.get('Position')):
+        problems.append('TrayPosition cannot be combined with Level/Position')
+
+    features = record.get('Features')
+    if isinstance(features, dict):
+        names = list(features)
+    else:
+        names = [name for name in _FEATURE_SEPARATORS.split(str(features or '').lower()) if name]
+    problems += [f'unknown feature "{name}"' for name in names
+                 if name not in KNOWN_FEATURES and name != PLAIN_FEATURE]
+    if problems:
+        raise ValueError(', '.join(problems))
+
+
+def parse_quantity(quantity):
+    quantity = int(quantity)
+    if quantity < 0:
+        raise ValueError(f'negative quantity {quantity}')
+    return quantity
+
+
+def spread(start, end, index, quantity, pitch):
+    """x of the index-th of `quantity` copies spaced evenly from start over the range.
+
+    An empty range places the copies `pitch` (mm) apart.
+    """
+    step = (end - start) / quantity if quantity and end > start else pitch
+    return start + index * step
+
+
+def tray_position(position_string, index, quantity=1, pitch=0.0):
+    """Resolve "x:y" or "x_start:x_end:y" (mm) for the index-th copy"""
+    pos_parts = position_string.split(':')
+    if len(pos_parts) == 2:
+        return float(pos_parts[0]), float(pos_parts[1])
+    if len(pos_parts) == 3:
+        x_start, x_end, y = (float(part) for part in pos_parts)
+        return spread(x_start, x_end, index, quantity, pitch), y
+    raise ValueError(f'bad tray position "{position_string}"')
+
+
+def offset_position(position_string, index, quantity=1, pitch=0.0):
+    """Resolve "Pos[x,y]" or "Pos[x_start-x_end,y]" (mm) for the index-th copy"""
+    start = position_string.find('[')
+    end = position_string.find(']')
+    if start < 0 or end < start:
+        raise ValueError(f'bad position "{position_string}"')
+    coords = position_string[start + 1:end].split(',')
+    if len(coords) != 2:
+        raise ValueError(f'bad position "{position_string}"')
+    x_part = coords[0]
+    y = float(coords[1])
+    if '-' in x_part:
+        x_start, x_end = map(float, x_part.split('-'))
+        x = spread(x_start, x_end, index, quantity, pitch)
+    else:
+        x = float(x_part)
+    return x, y
+
+
+def auto_band(range_string):
+    """Origin y range in mm for "60-80" or "60", preferred by auto layout"""
+    bounds = [float(part) for part in range_string.split('-')]
+    if len(bounds) > 2:
+        raise ValueError(f'bad position range "{range_string}"')
+    return bounds[0], bounds[-1]
+
+
+def auto_position(position_string):
+    """Preferred y band when a position asks for automatic layout, else False.
+
+    Accepts "", "auto", "distributed" and "Pos[distributed,60-80]".
+    """
+    value = position_string.strip()
+    if value.startswith('Pos['):
+        coords = value[value.find('[') + 1:value.find(']')].split(',')
+        if coords[0].strip().lower() in AUTO_POSITIONS:
+            return auto_band(coords[1]) if len(coords) > 1 and coords[1].strip() else None
+        return False
+    return None if value.lower() in AUTO_POSITIONS else False
+
+
+def to_translation(x, y, z=0.0):
+    """mm position to Fusion cm translation"""
+    return (x / 10.0, y / 10.0, z / 10.0)
+
+
+def parse_record(record, grids):
+    """Turn one reader record into a RowPlan, sizes in units of the row's grid"""
+    if isinstance(record, dict) and 'Header' in record:
+        raise ValueError(f'bad group header "{record["Header"]}"')
+    if isinstance(record, dict) and 'Invalid' in record:
+        raise ValueError(record['Invalid'])
+    check_record(record)
+    group = int(record.get('Group', 0))
+    grid = grids.profile(str(record.get('Grid') or '').strip())
+    width, length = parse_size(record['BinSize'], grid.base_unit)
+    spec = BinSpec(width, length, DEFAULT_HEIGHT_UNITS,
+                   parse_compartments(record.get('Compartments') or '1x1'),
+                   parse_features(record.get('Features')))
+    # Features that do not fit the bin are a row error, not a failed build
+    bin_features.bin_features(grid, *spec)
+    quantity = parse_quantity(record.get('Quantity', 1))
+    pitch = width * grid.base_unit
+
+    if 'Level' in record:
+        # Text format: Pos[...] with a Z offset per drawer level
+        level = int(str(record['Level']).strip().replace('Level', ''))
+        z_offset = level * LEVEL_HEIGHT_MM
+        pos_str = record.get('Position') or ''
+        position = lambda i: offset_position(pos_str, i, quantity, pitch) + (z_offset,)
+    else:
+        level = 0
+        pos_str = record.get('TrayPosition') or ''
+        position = lambda i: tray_position(pos_str, i, quantity, pitch) + (0.0,)
+
+    band = auto_position(pos_str)
+    if band is not False:
+        return RowPlan(group, spec, quantity, None, level, band, grid.name)
+    position(0)
+    return RowPlan(group, spec, quantity, position, level, grid=grid.name)
+
+
+def iter_jobs(records, grids, errors):
+    """Stream jobs from reader records, invalid rows are appended to `errors`"""
+    specs = {}
+    job_id = 0
+    for row_number, record in records:
+        try:
+            row = parse_record(record, grids)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            errors.append((row_number, str(e)))
+            continue
+        # Share one spec tuple between all jobs of the same bin
+        spec = specs.setdefault(row.spec, row.spec)
+        for index in range(row.quantity):
+            translation = to_translation(*row.position(index)) if row.position else None
+            yield BinJob(job_id, row.group, row_number, spec, translation, row.level,
+                         row.auto_band, row.grid)
+            job_id += 1
+
+
+def _footprint(job, grids, cell):
+    """Size of a job's bin in mm and in tray cells (rounded up)"""
+    profile = grids.profile(job.grid)
+    width = job.spec.width * profile.base_unit
+    length = job.spec.length * profile.base_unit
+    return width, length, math.ceil(width / cell - 1e-9), math.ceil(length / cell - 1e-9)
+
+
+def layout_jobs(jobs, grids, tray=DEFAULT_TRAY, errors=None, reports=None):
+    """Give every job without a translation a packed spot in its (group, level) tray.
+
+    The tray is `tray` cells of the default grid, bins of other grids take
+    the cells they cover. Hand placed jobs of the same layer are marked
+    occupied first. Jobs that do not fit are appended to `errors`, per
+    layer LayoutReports to `reports`.
+    """
+    columns, rows = tray
+    cell = grids.profile().base_unit
+    layers = {}
+    for index, job in enumerate(jobs):
+        layers.setdefault((job.group, job.level), []).append(index)
+
+    for (group, level), indexes in sorted(layers.items()):
+        fixed = []
+        requests = []
+        for index in indexes:
+            job = jobs[index]
+            width, length, cells_x, cells_y = _footprint(job, grids, cell)
+            if job.translation is None:
+                band = None
+                if job.auto_band:
+                    band = (int(job.auto_band[0] // cell), int(job.auto_band[1] // cell))
+                requests.append(tray_layout.PackRequest(index, cells_x, cells_y, band))
+            else:
+                # Translations are bin centers in cm, mark every cell the bin touches
+                x0 = math.floor((job.translation[0] * 10 - width / 2) / cell + 1e-9)
+                y0 = math.floor((job.translation[1] * 10 - length / 2) / cell + 1e-9)
+                x1 = math.ceil((job.translation[0] * 10 + width / 2) / cell - 1e-9)
+                y1 = math.ceil((job.translation[1] * 10 + length / 2) / cell - 1e-9)
+                fixed.append((x0, y0, x1 - x0, y1 - y0))
+        if not requests:
+            continue
+
+        placed, unplaced, occupancy = tray_layout.pack(requests, columns, rows, fixed)
+        for index, (x, y) in placed.items():
+            width, length, _, _ = _footprint(jobs[index], grids, cell)
+            jobs[index] = jobs[index]._replace(translation=to_translation(
+                x * cell + width / 2,
+                y * cell + length / 2,
+                level * LEVEL_HEIGHT_MM
+            ))
+        if errors is not None:
+            missing = {}
+            for index in unplaced:
+                missing[jobs[index].row] = missing.get(jobs[index].row, 0) + 1
+            for row, count in sorted(missing.items()):
+                errors.append((row, f'no room for {count} bin(s) in the {columns}x{rows} tray '
+                                    f'of group {group} level {level}'))
+        if reports is not None:
+            reports.append(tray_layout.LayoutReport(group, level, columns * rows, occupancy.used,
+                                                    len(placed), len(unplaced)))
+    return jobs
+
+
+def plan_records(records, grids, source='<batch>', tray=DEFAULT_TRAY, reports=None):
+    """Collect a validated plan, raises BatchPlanError listing every bad row"""
+    errors = []
+    jobs = list(iter_jobs(records, grids, errors))
+    if any(job.translation is None for job in jobs):
+        layout_jobs(jobs, grids, tray, errors, reports)
+    if errors:
+        raise BatchPlanError(source, sorted(errors))
+    return jobs
+
+
+def plan_batch(path, size_group, grids, tray=DEFAULT_TRAY, reports=None):
+    """Parse and validate a batch file, raises BatchPlanError listing every bad row"""
+    records = batch_readers.iter_records(path, size_group)
+    return plan_records(records, grids, os.path.basename(path), tray, reports)
+
+
+def scan_batch(path, size_group, grids):
+    """Validate a batch file in constant memory without keeping the jobs.
+
+    Returns (bin count, unique spec count, errors).
+    """
+    errors = []
+    specs = set()
+    bins = 0
+    for job in iter_jobs(batch_readers.iter_records(path, size_group), grids, errors):
+        specs.add(job.spec)
+        bins += 1
+    return bins, len(specs), errors
+
+
+def parse_args(argv, tool):
+    """(config module, path, size group, GridSet) of `python -m lib.<tool> <config file> [size group] [grid]`
+
+    Prints the usage and returns None without a config file. Tools run from
+    the add-in folder, where config is importable.
+    """
+    import config
+
+    if len(argv) < 2:
+        print(f'usage: python -m lib.{tool} <config file> [size group] [grid]')
+        return None
+    size_group = int(argv[2]) if len(argv) > 2 else 0
+    grids = grid_profiles.GridSet(config.GRID_CONFIG, argv[3] if len(argv) > 3 else config.ACTIVE_GRID)
+    return config, argv[1], size_group, grids
+
+
+def main(argv):
+    args = parse_args(argv, 'batch_planner')
+    if args is None:
+        return 2
+    _, path, size_group, grids = args
+    start = time.perf_counter()
+    try:
+        jobs = plan_batch(path, size_group, grids)
+    except BatchPlanError as e:
+        print(e)
+        return 1
+    elapsed = (time.perf_counter() - start) * 1000
+    specs = len(set((job.grid, job.spec) for job in jobs))
+    print(f'{len(jobs)} bins, {specs} unique specs planned in {elapsed:.2f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
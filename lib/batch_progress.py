@@ -0,0 +1,70 @@
+"""Progress bookkeeping of a batch built a chunk at a time.
+
+The batch command builds a few bins per custom event so Fusion stays
+responsive and a cancel is honoured between bins. `BatchProgress` keeps the
+bins done, throughput, ETA and the time spent per size group, it has no
+Fusion dependency.
+"""
+
+import time
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f'{seconds:.1f} s'
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    if minutes < 60:
+        return f'{minutes} min {seconds:02d} s'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours} h {minutes:02d} min'
+
+
+class BatchProgress:
+    """Bins done out of `total` with throughput, ETA and per group timing"""
+
+    def __init__(self, total, clock=time.perf_counter):
+        self.total = total
+        self.done = 0
+        self.clock = clock
+        self.started = clock()
+        self.groups = {}  # group -> [bins, seconds]
+
+    def record(self, group, seconds, bins=1):
+        self.done += bins
+        entry = self.groups.setdefault(group, [0, 0.0])
+        entry[0] += bins
+        entry[1] += seconds
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started
+
+    @property
+    def throughput(self):
+        """Bins per second so far, 0 before the first bin"""
+        elapsed = self.elapsed
+        return self.done / elapsed if self.done and elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds left, None until there is a throughput"""
+        rate = self.throughput
+        if not rate:
+            return None
+        return (self.total - self.done) / rate
+
+    @property
+    def finished(self):
+        return self.done >= self.total
+
+    def status(self):
+        """One line for the progress dialog"""
+        text = f'{self.done} of {self.total} bins'
+        if self.throughput:
+            text += f', {self.throughput:.1f} bins/s, about {format_duration(self.eta)} left'
+        return text
+
+    def group_summary(self):
+        """One line per size group in group order"""
+        return [f'Group {group}: {bins} bins in {format_duration(seconds)}'
+                for group, (bins, seconds) in sorted(self.groups.items())]
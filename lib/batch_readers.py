@@ -0,0 +1,234 @@
+"""Streaming readers for batch configuration files.
+
+Every reader is a generator yielding one `(row_number, record)` pair at a
+time, so memory use does not depend on the size of the file. Records are
+dicts using the CSV column names (Group, BinSize, Quantity, TrayPosition,
+Compartments, Features and the optional Grid), text rows use Level and
+Position instead of TrayPosition and always use the default grid.
+
+When a size group is requested, CSV, text and JSON Lines rows belonging to
+other groups are skipped on their raw text before any CSV/JSON parsing
+happens. Elements of a JSON array are decoded first and filtered on their
+Group, finding element boundaries in Python costs more than the C decoder
+saves. Rows that cannot be
+decoded are yielded as an `{'Invalid': message}` record, like bad text
+headers as `{'Header': line}`, so the planner reports them by row.
+"""
+
+import csv
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+CONFIG_EXTENSIONS = ('.csv', '.json', '.txt') + JSON_LINES_EXTENSIONS
+
+_JSON_GROUP = re.compile(r'"Group"\s*:\s*"?(-?\d+)')
+
+
+def _wanted(group_field, size_group):
+    """Cheap group check on an unparsed field, unknown values are kept for validation"""
+    if size_group == 0:  # 0 = all groups
+        return True
+    try:
+        return int(group_field) == size_group
+    except ValueError:
+        return True
+
+
+def csv_group_index(header_line):
+    """Parse the CSV header, returns (column names, index of the Group column or None)"""
+    header = next(csv.reader([header_line]), [])
+    return header, header.index('Group') if 'Group' in header else None
+
+
+def csv_records(header, group_index, numbered_lines, size_group=0):
+    """Yield records from (row_number, line) pairs of a CSV body"""
+    for row_number, line in numbered_lines:
+        if not line.strip():
+            continue
+        if group_index is not None and '"' not in line:
+            fields = line.split(',', group_index + 1)
+            if len(fields) > group_index and not _wanted(fields[group_index], size_group):
+                continue
+        values = next(csv.reader([line]))
+        record = dict(zip(header, values))
+        # Quoted rows and files without a Group column are checked once split
+        if not _wanted(record.get('Group', '0'), size_group):
+            continue
+        yield row_number, record
+
+
+def iter_csv_rows(file, size_group=0):
+    """Yield CSV rows of the requested group, other groups are never split into fields"""
+    header, group_index = csv_group_index(file.readline())
+    yield from csv_records(header, group_index, enumerate(file, start=2), size_group)
+
+
+def text_header_group(line):
+    """Group number of a "GROUP3_BINS:" header line, None if the line is not a header"""
+    if not line.startswith('GROUP'):
+        return None
+    return int(line.strip().split('GROUP')[1].split('_')[0].rstrip(':'))
+
+
+def text_records(numbered_lines, size_group=0, current_group=None):
+    """Yield records from (row_number, line) pairs of the text format"""
+    skipping = current_group != size_group and size_group != 0
+    for row_number, line in numbered_lines:
+        if line.startswith('GROUP'):
+            try:
+                current_group = text_header_group(line)
+            except ValueError:
+                yield row_number, {'Header': line.strip()}
+                current_group = None
+            skipping = current_group != size_group and size_group != 0
+            continue
+        if skipping or ',' not in line:
+            continue
+        # Pos[x,y] contains a comma, only the first three fields are split off
+        parts = line.strip().split(',', 3)
+        record = dict(zip(('BinSize', 'Quantity', 'Level', 'Position'), parts))
+        record['Group'] = current_group or 0
+        yield row_number, record
+
+
+def iter_text_rows(file, size_group=0):
+    """Yield rows of the "GROUPn" text format, lines of other groups are skipped unsplit"""
+    yield from text_records(enumerate(file, start=1), size_group)
+
+
+def json_line_group(line):
+    """Group of a JSON Lines row read from its raw text, 0 when absent"""
+    match = _JSON_GROUP.search(line)
+    if match:
+        return match.group(1)
+    # A Group that is not a number is kept for validation
+    return '' if '"Group"' in line else '0'
+
+
+def json_line_records(numbered_lines, size_group=0):
+    """Yield records from (row_number, line) pairs of JSON Lines input"""
+    for row_number, line in numbered_lines:
+        if not line.strip():
+            continue
+        if size_group != 0 and not _wanted(json_line_group(line), size_group):
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, invalid_json(e)
+
+
+def iter_json_lines(file, size_group=0):
+    """Yield bins from JSON Lines input, one object per line"""
+    yield from json_line_records(enumerate(file, start=1), size_group)
+
+
+def invalid_json(error):
+    return {'Invalid': f'malformed JSON: {error.msg} at column {error.colno}'}
+
+
+def _element_end(buffer):
+    """Index of the ',' or ']' closing the JSON element at the start of `buffer`, -1 if not buffered yet"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for index, char in enumerate(buffer):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            if depth == 0:
+                return index
+            depth -= 1
+        elif char == ',' and depth == 0:
+            return index
+    return -1
+
+
+def iter_json_array(file, size_group=0, key='bins'):
+    """Yield elements of the top level `key` array without loading the document.
+
+    The file is read in chunks and each array element is decoded on its own,
+    only the element being decoded is held in memory. Every element is decoded
+    before its Group is checked. A malformed element is
+    skipped up to the next top level comma and yielded as an invalid record.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+    # Seek to the opening bracket of the array
+    marker = f'"{key}"'
+    while True:
+        index = buffer.find(marker)
+        if index >= 0:
+            bracket = buffer.find('[', index + len(marker))
+            if bracket >= 0:
+                buffer = buffer[bracket + 1:]
+                break
+        if eof:
+            return
+        fill()
+
+    row_number = 0
+    while True:
+        stripped = buffer.lstrip(' \t\r\n,')
+        if not stripped and not eof:
+            buffer = ''
+            fill()
+            continue
+        buffer = stripped
+        if not buffer or buffer[0] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            skip = _element_end(buffer)
+            if skip < 0 and not eof:
+                fill()
+                continue
+            row_number += 1
+            yield row_number, invalid_json(e)
+            if skip < 0:
+                return
+            buffer = buffer[skip:]
+            continue
+        if end == len(buffer) and not eof:
+            # A number may continue in the next chunk
+            fill()
+            continue
+        buffer = buffer[end:]
+        row_number += 1
+        if isinstance(item, dict) and not _wanted(str(item.get('Group', 0)), size_group):
+            continue
+        yield row_number, item
+
+
+def iter_records(path, size_group=0):
+    """Open a batch file and stream its records based on the file extension"""
+    with open(path, 'r', newline='') as file:
+        if path.endswith('.csv'):
+            yield from iter_csv_rows(file, size_group)
+        elif path.endswith(JSON_LINES_EXTENSIONS):
+            yield from iter_json_lines(file, size_group)
+        elif path.endswith('.json'):
+            yield from iter_json_array(file, size_group)
+        else:
+            yield from iter_text_rows(file, size_group)
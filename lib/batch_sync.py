@@ -0,0 +1,121 @@
+"""Incremental batch re-runs.
+
+Generated components are stamped with their spec (grid included) and every
+placed occurrence with where it came from: source config, group, a slot
+naming the n-th bin of a spec in that group, and its translation. On a
+re-run the new plan is diffed against those stamps so only added bins are
+built, removed ones deleted and moved ones re-placed.
+"""
+
+import hashlib
+import json
+from typing import NamedTuple, Tuple
+
+from . import batch_planner
+
+ATTRIBUTE_GROUP = 'GridfinityGenerator'
+SPEC_ATTRIBUTE = 'spec'
+PLACEMENT_ATTRIBUTE = 'placement'
+MOVE_TOLERANCE = 1e-4  # cm
+
+
+class PlacedBin(NamedTuple):
+    """An occurrence stamped by a previous run, `handle` is the Fusion object"""
+    handle: object
+    source: str
+    group: int
+    slot: str
+    translation: Tuple[float, float, float]
+
+
+class SyncPlan(NamedTuple):
+    """What a re-run changes: job indexes to add, (job index, PlacedBin) to move and keep"""
+    add: Tuple[int, ...]
+    move: Tuple[Tuple[int, PlacedBin], ...]
+    keep: Tuple[Tuple[int, PlacedBin], ...]
+    delete: Tuple[PlacedBin, ...]
+
+    def summary(self):
+        return (f'{len(self.add)} added, {len(self.move)} moved, {len(self.delete)} removed, '
+                f'{len(self.keep)} unchanged')
+
+
+def spec_json(spec, grid):
+    return json.dumps([grid, spec.width, spec.length, spec.height,
+                       list(spec.compartments), list(spec.features)], separators=(',', ':'))
+
+
+def spec_from_json(value):
+    """(BinSpec, grid) of a spec attribute value"""
+    grid, width, length, height, compartments, features = json.loads(value)
+    return batch_planner.BinSpec(width, length, height, tuple(compartments), tuple(features)), grid
+
+
+def spec_hash(spec, grid):
+    """Short stable hash of a spec on a grid"""
+    return hashlib.sha1(spec_json(spec, grid).encode('utf-8')).hexdigest()[:16]
+
+
+def job_slots(jobs, grids):
+    """Slot of every job: group, spec hash and the ordinal of the bin among its equals"""
+    counts = {}
+    hashes = {}
+    slots = []
+    for job in jobs:
+        key = (job.group, job.spec, job.grid)
+        digest = hashes.get(key[1:])
+        if digest is None:
+            digest = hashes[key[1:]] = spec_hash(job.spec, grids.resolve(job.grid))
+        ordinal = counts.get(key, 0)
+        counts[key] = ordinal + 1
+        slots.append(f'{job.group}:{digest}:{ordinal}')
+    return slots
+
+
+def placement_json(source, group, slot, translation):
+    return json.dumps({'source': source, 'group': group, 'slot': slot,
+                       'translation': list(translation)}, separators=(',', ':'))
+
+
+def placed_bin(handle, value):
+    """PlacedBin of a placement attribute value, None when it cannot be read"""
+    try:
+        data = json.loads(value)
+        return PlacedBin(handle, data['source'], int(data['group']), data['slot'],
+                         tuple(data['translation']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def in_scope(placed, source, size_group):
+    """Whether a re-run of `source` for `size_group` (0 = all) owns a placed bin"""
+    return placed.source == source and (size_group == 0 or placed.group == size_group)
+
+
+def _moved(a, b):
+    return any(abs(x - y) > MOVE_TOLERANCE for x, y in zip(a, b))
+
+
+def diff_plan(slots, translations, existing):
+    """Diff planned slots and translations against the PlacedBins of a previous run"""
+    by_slot = {}
+    duplicates = []
+    for placed in existing:
+        if placed.slot in by_slot:
+            duplicates.append(placed)
+        else:
+            by_slot[placed.slot] = placed
+
+    add = []
+    move = []
+    keep = []
+    for index, slot in enumerate(slots):
+        placed = by_slot.pop(slot, None)
+        if placed is None:
+            add.append(index)
+        elif _moved(placed.translation, translations[index]):
+            move.append((index, placed))
+        else:
+            keep.append((index, placed))
+    delete = list(by_slot.values()) + duplicates
+    return SyncPlan(tuple(add), tuple(move), tuple(keep), tuple(delete))
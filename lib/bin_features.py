@@ -0,0 +1,139 @@
+"""Feature engine for magnet sockets, scoops and label ledges.
+
+`bin_features` computes the feature geometry of every cell and compartment
+of a bin in one pass, in mm in the coordinates of `bin_layout`. It is
+grouped so a backend applies each feature type with one operation
+whatever the cell count:
+
+- every magnet socket of the bin is a circle in one sketch and one cut,
+  under a floor raised once to hold them;
+- scoops and label ledges are profiles across the cavity, one per row of
+  compartments.
+
+Profiles of compartments with the same x extent are extruded together, a
+uniform grid gives a single extrude per feature type. Merged cells only add
+one extrude per distinct column span.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from . import bin_geometry
+from . import compartments as compartments_engine
+from . import grid_profiles
+
+SCOOP_RATIO = 0.5  # Scoop radius, of the smaller of compartment depth and cavity height
+LABEL_RATIO = 0.3  # Label ledge depth per base unit
+LABEL_LIMIT = 0.4  # Largest label ledge, of the compartment depth and of the cavity height
+_EPSILON = 1e-6
+
+
+class Ledge(NamedTuple):
+    """Profile leaning on the wall at `y`, extending `size` towards `direction` (+1 or -1 in y)"""
+    y: float
+    size: float
+    direction: int
+
+
+class LedgeGroup(NamedTuple):
+    """Ledges extruded together from x0 to x1"""
+    x0: float
+    x1: float
+    ledges: Tuple[Ledge, ...]
+
+
+class BinFeatures(NamedTuple):
+    """Feature geometry of one bin, empty tuples for features it does not have"""
+    floor: float  # Top of the floor the cavity, scoops and dividers start from
+    cavity: Tuple[float, float, float, float]  # Inner (x0, y0, x1, y1)
+    magnet_radius: float
+    magnet_depth: float  # Sockets are cut from z=0
+    magnets: Tuple[Tuple[float, float], ...]
+    scoops: Tuple[LedgeGroup, ...]  # Quarter round ramps from the floor up the front walls
+    labels: Tuple[LedgeGroup, ...]  # 45 degree ledges under the top of the back walls
+    top: float
+
+
+def bin_features(grid_config, width_units, length_units, height_units, compartments=(1, 1), features=()):
+    """Compute the BinFeatures of a bin, `features` are names or a {name: enabled} dict
+
+    Returns None for a bin without features. Raises ValueError when scoops or
+    labels are requested on a bin with no cavity above its floor. Results
+    are memoized like bin_layout.
+    """
+    if isinstance(features, dict):
+        features = [name for name, value in features.items() if value]
+    features = tuple(sorted(features))
+    if not features:
+        return None
+    if not isinstance(compartments, tuple):
+        compartments = tuple(compartments)
+    return _profile_features(grid_profiles.as_profile(grid_config), width_units, length_units,
+                             height_units, compartments, features)
+
+
+@lru_cache(maxsize=4096)
+def _profile_features(profile, width_units, length_units, height_units, compartments, features):
+    layout = bin_geometry.bin_layout(profile, width_units, length_units, height_units, compartments)
+    wall = layout.wall
+    cavity = (-layout.width / 2 + wall, -layout.length / 2 + wall,
+              layout.width / 2 - wall, layout.length / 2 - wall)
+
+    magnets = ()
+    floor = wall
+    if 'magnet' in features:
+        magnets = magnet_positions(profile, width_units, length_units)
+        floor = wall + profile.magnet_depth
+
+    rects = compartments_engine.compartment_rects(compartments, *cavity, wall)
+    depth = layout.height - floor
+    ledges = [name for name in ('scoop', 'label') if name in features]
+    if ledges and depth <= _EPSILON:
+        raise ValueError(f'bin is too low for {" and ".join(ledges)}: the floor is {floor:g} mm '
+                         f'of {layout.height:g} mm')
+    scoops = ()
+    if 'scoop' in features:
+        scoops = _group([(x0, x1, Ledge(y0, min(y1 - y0, depth) * SCOOP_RATIO, 1))
+                         for x0, y0, x1, y1 in rects], wall)
+    labels = ()
+    if 'label' in features:
+        labels = _group([(x0, x1, Ledge(y1, min(profile.base_unit * LABEL_RATIO,
+                                                 (y1 - y0) * LABEL_LIMIT, depth * LABEL_LIMIT), -1))
+                         for x0, y0, x1, y1 in rects], wall)
+
+    return BinFeatures(floor, cavity, profile.magnet_diameter / 2, profile.magnet_depth, magnets,
+                       scoops, labels, layout.height)
+
+
+def magnet_positions(profile, width_units, length_units):
+    """Socket centers of every grid cell under a bin, four per cell or one when the inset reaches the center"""
+    base = profile.base_unit
+    offset = base / 2 - profile.magnet_inset
+    if offset <= profile.magnet_diameter / 2:
+        offsets = ((0.0, 0.0),)
+    else:
+        offsets = ((-offset, -offset), (offset, -offset), (-offset, offset), (offset, offset))
+    columns = int(width_units)
+    rows = int(length_units)
+    x_start = -columns * base / 2
+    y_start = -rows * base / 2
+    return tuple((x_start + (i + 0.5) * base + dx, y_start + (j + 0.5) * base + dy)
+                 for j in range(rows) for i in range(columns) for dx, dy in offsets)
+
+
+def _group(entries, wall):
+    """Merge (x0, x1, ledge) entries of the same ledge across dividers, then group by x extent"""
+    spans = {}
+    for x0, x1, ledge in sorted(entries, key=lambda entry: (entry[2], entry[0])):
+        runs = spans.setdefault(ledge, [])
+        # Neighbouring compartments only have a divider between them
+        if runs and x0 - runs[-1][1] <= wall + _EPSILON:
+            runs[-1][1] = max(runs[-1][1], x1)
+        else:
+            runs.append([x0, x1])
+
+    groups = {}
+    for ledge, runs in spans.items():
+        for x0, x1 in runs:
+            groups.setdefault((round(x0, 6), round(x1, 6)), []).append(ledge)
+    return tuple(LedgeGroup(x0, x1, tuple(ledges)) for (x0, x1), ledges in sorted(groups.items()))
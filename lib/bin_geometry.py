@@ -0,0 +1,84 @@
+"""Backend independent bin geometry.
+
+`bin_layout` turns grid units into the boxes a bin is made of (outer block,
+shell cavity and compartment dividers) in mm. Geometry backends build
+their output from this layout, so the Fusion model and the headless mesh
+describe the same bin.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from . import compartments as compartments_engine
+from . import grid_profiles
+
+GENERATOR_VERSION = 3  # Bump when generated geometry changes, invalidates cached geometry
+
+class BinLayout(NamedTuple):
+    """Bin dimensions in mm, centered on the origin in XY with the floor at z=0"""
+    width: float
+    length: float
+    height: float
+    wall: float
+    divider_height: float
+    # Non-overlapping (x0, y0, x1, y1) footprints of the dividers inside the cavity
+    dividers: Tuple[Tuple[float, float, float, float], ...]
+
+
+def bin_layout(grid_config, width_units, length_units, height_units, compartments=(1, 1)):
+    """Compute the layout of a bin for a grid profile from config.GRID_CONFIG
+
+    `grid_config` is a GRID_CONFIG entry or a grid_profiles.GridProfile,
+    `compartments` a (columns, rows) tuple or a compartments.CompartmentGrid.
+    Layouts are immutable and memoized per profile and bin.
+    """
+    if not isinstance(compartments, tuple):
+        compartments = tuple(compartments)
+    return _profile_layout(grid_profiles.as_profile(grid_config), width_units, length_units,
+                           height_units, compartments)
+
+
+@lru_cache(maxsize=4096)
+def _profile_layout(profile, width_units, length_units, height_units, compartments):
+    width = width_units * profile.base_unit
+    length = length_units * profile.base_unit
+    height = height_units * profile.height_unit
+    wall = profile.wall_thickness
+
+    inner_x = width / 2 - wall
+    inner_y = length / 2 - wall
+    dividers = compartments_engine.divider_rects(compartments, -inner_x, -inner_y, inner_x, inner_y, wall)
+
+    return BinLayout(width, length, height, wall, height_units * profile.divider_height_per_unit, dividers)
+
+
+def spec_label(width_units, length_units, height_units, compartments=(1, 1), features=None):
+    """Short human readable bin description, e.g. 3x2x4 c2x2 magnet"""
+    label = f'{width_units}x{length_units}x{height_units}'
+    if compartments[0] > 1 or compartments[1] > 1:
+        label += f' c{compartments[0]}x{compartments[1]}'
+    if isinstance(features, dict):
+        features = [name for name, value in features.items() if value]
+    if features:
+        label += ' ' + '+'.join(sorted(features))
+    return label
+
+
+class BinBackend:
+    """Interface of a bin geometry backend.
+
+    Implementations build one bin per `generate_bin` call and return their
+    native result: a Fusion component or a triangle mesh.
+    """
+
+    name = None
+
+    def __init__(self, grid_config):
+        self.grid_config = grid_config
+        self.profile = grid_profiles.as_profile(grid_config)
+
+    def layout(self, width_units, length_units, height_units, compartments=(1, 1)):
+        return bin_layout(self.profile, width_units, length_units, height_units, compartments)
+
+    def generate_bin(self, width_units, length_units, height_units, compartments=(1, 1), features=None):
+        raise NotImplementedError
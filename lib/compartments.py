@@ -0,0 +1,136 @@
+"""Compartment lattice engine.
+
+Computes all dividers of a bin as one set of non-overlapping rectangles, so
+a backend can draw them in a single sketch and join them with a single
+extrude whatever the compartment count. Besides uniform grids it supports
+uneven column/row sizes and merged cells, the custom compartment layouts
+of the bin generator.
+"""
+
+from typing import NamedTuple, Tuple
+
+
+class CompartmentGrid(NamedTuple):
+    """Compartment layout, also usable wherever a (columns, rows) tuple is expected.
+
+    `merges` are (column, row, width, height) cell rectangles joined into a
+    single compartment. Weights give relative cell sizes, empty means uniform.
+    """
+    columns: int
+    rows: int
+    merges: Tuple[Tuple[int, int, int, int], ...] = ()
+    column_weights: Tuple[float, ...] = ()
+    row_weights: Tuple[float, ...] = ()
+
+
+def as_grid(compartments):
+    """Accept a plain (columns, rows) tuple or a CompartmentGrid"""
+    if isinstance(compartments, CompartmentGrid):
+        return compartments
+    return CompartmentGrid(int(compartments[0]), int(compartments[1]))
+
+
+def cell_spans(start, end, count, weights, wall):
+    """Interior (lo, hi) of each cell along one axis, dividers of `wall` between them"""
+    weights = tuple(weights) or (1.0,) * count
+    if len(weights) != count:
+        raise ValueError(f'expected {count} weights, got {len(weights)}')
+    usable = (end - start) - (count - 1) * wall
+    total = float(sum(weights))
+    spans = []
+    position = start
+    for weight in weights:
+        size = usable * weight / total
+        spans.append((position, position + size))
+        position += size + wall
+    return spans
+
+
+def owners(grid):
+    """Region id of every cell, merged cells share the id of their merge"""
+    owner = [[None] * grid.rows for _ in range(grid.columns)]
+    for region, (column, row, width, height) in enumerate(grid.merges):
+        if column < 0 or row < 0 or column + width > grid.columns or row + height > grid.rows:
+            raise ValueError(f'merged cells {(column, row, width, height)} are outside the grid')
+        for i in range(column, column + width):
+            for j in range(row, row + height):
+                if owner[i][j] is not None:
+                    raise ValueError(f'merged cells {(column, row, width, height)} overlap')
+                owner[i][j] = region
+    region = len(grid.merges)
+    for i in range(grid.columns):
+        for j in range(grid.rows):
+            if owner[i][j] is None:
+                owner[i][j] = region
+                region += 1
+    return owner
+
+
+def _runs(flags):
+    """(first, last) index pairs of consecutive True values"""
+    runs = []
+    first = None
+    for index, flag in enumerate(flags):
+        if flag and first is None:
+            first = index
+        elif not flag and first is not None:
+            runs.append((first, index - 1))
+            first = None
+    if first is not None:
+        runs.append((first, len(flags) - 1))
+    return runs
+
+
+def divider_rects(compartments, x0, y0, x1, y1, wall):
+    """Footprints (x0, y0, x1, y1) of all dividers inside the cavity (x0, y0)-(x1, y1).
+
+    Vertical dividers run through the junctions they cross, horizontal ones
+    stop at them, so no two rectangles overlap.
+    """
+    grid = as_grid(compartments)
+    if grid.columns < 1 or grid.rows < 1:
+        raise ValueError(f'compartments must be at least 1x1, got {grid.columns}x{grid.rows}')
+    owner = owners(grid)
+    xs = cell_spans(x0, x1, grid.columns, grid.column_weights, wall)
+    ys = cell_spans(y0, y1, grid.rows, grid.row_weights, wall)
+
+    # vertical[i][j]: divider between columns i-1 and i along row j
+    vertical = [[owner[i - 1][j] != owner[i][j] for j in range(grid.rows)]
+                for i in range(1, grid.columns)]
+    horizontal = [[owner[i][j - 1] != owner[i][j] for i in range(grid.columns)]
+                  for j in range(1, grid.rows)]
+
+    rects = []
+    for i, flags in enumerate(vertical, start=1):
+        left = xs[i - 1][1]
+        right = xs[i][0]
+        for first, last in _runs(flags):
+            rects.append((left, ys[first][0], right, ys[last][1]))
+
+    for j, flags in enumerate(horizontal, start=1):
+        bottom = ys[j - 1][1]
+        top = ys[j][0]
+        for first, last in _runs(flags):
+            start = first
+            for i in range(first + 1, last + 1):
+                # A vertical divider crossing this line owns the junction
+                if vertical[i - 1][j - 1] and vertical[i - 1][j]:
+                    rects.append((xs[start][0], bottom, xs[i - 1][1], top))
+                    start = i
+            rects.append((xs[start][0], bottom, xs[last][1], top))
+    return tuple(rects)
+
+
+def compartment_rects(compartments, x0, y0, x1, y1, wall):
+    """Interior footprint of every compartment, merged cells give one rectangle"""
+    grid = as_grid(compartments)
+    owner = owners(grid)
+    xs = cell_spans(x0, x1, grid.columns, grid.column_weights, wall)
+    ys = cell_spans(y0, y1, grid.rows, grid.row_weights, wall)
+    bounds = {}
+    for i in range(grid.columns):
+        for j in range(grid.rows):
+            lo_i, lo_j, hi_i, hi_j = bounds.get(owner[i][j], (i, j, i, j))
+            bounds[owner[i][j]] = (min(lo_i, i), min(lo_j, j), max(hi_i, i), max(hi_j, j))
+    return tuple((xs[lo_i][0], ys[lo_j][0], xs[hi_i][1], ys[hi_j][1])
+                 for lo_i, lo_j, hi_i, hi_j in (bounds[region] for region in sorted(bounds)))
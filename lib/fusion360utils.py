@@ -1,6 +1,11 @@
 import adsk.core
 import adsk.fusion
+import json
+import math
+import time
 import traceback
+from contextlib import contextmanager, nullcontext
+from .. import config
 
 app = adsk.core.Application.get()
 ui = app.userInterface
@@ -30,3 +35,126 @@ def add_handler(event, handler_function, local_handlers=None):
     if local_handlers:
         local_handlers.append(handler)
     return handler
+
+
+@contextmanager
+def deferred_compute(design, capture_history=True, label='Batch'):
+    """Suspend recompute while a block builds geometry, then recompute once.
+
+    With `capture_history` False a parametric design is switched to direct
+    modeling for the block so no timeline features are recorded. Fusion
+    permanently deletes the existing timeline when doing so, switching back
+    afterwards only starts a new, empty one, so callers must confirm with the
+    user first. The compute and design type settings are switched back even
+    when the block raises, timings go to the log.
+    """
+    previous_deferred = getattr(design, 'isComputeDeferred', None)
+    previous_type = design.designType
+    start = time.perf_counter()
+    try:
+        if previous_deferred is not None:
+            design.isComputeDeferred = True
+        if not capture_history and previous_type == adsk.fusion.DesignTypes.ParametricDesignType:
+            design.designType = adsk.fusion.DesignTypes.DirectDesignType
+        yield
+    finally:
+        built = time.perf_counter()
+        if previous_deferred is not None:
+            design.isComputeDeferred = previous_deferred
+        if design.designType != previous_type:
+            design.designType = previous_type
+        if previous_type == adsk.fusion.DesignTypes.ParametricDesignType:
+            design.computeAll()
+        done = time.perf_counter()
+        log(f'{label}: geometry built in {(built - start) * 1000:.0f} ms, '
+            f'recompute {(done - built) * 1000:.0f} ms')
+
+
+# Stage timing instrumentation, only active while config.DEBUG is set
+_NO_TIMER = nullcontext()
+_timings = {}  # (stage, key) -> list of seconds
+_counters = {}
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'key', 'start')
+
+    def __init__(self, stage, key):
+        self.stage = stage
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _timings.setdefault((self.stage, self.key), []).append(time.perf_counter() - self.start)
+        return False
+
+
+def timer(stage: str, key: str = ''):
+    """Context manager recording the duration of a stage, e.g. per bin spec"""
+    if not config.DEBUG:
+        return _NO_TIMER
+    return _StageTimer(stage, key)
+
+
+def count(name: str, amount: int = 1):
+    """Increment a named counter"""
+    if config.DEBUG:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def reset_timings():
+    _timings.clear()
+    _counters.clear()
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    rank = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def timing_summary():
+    """Rows of (stage, key, count, total, p50, p95, max) in ms, per stage and per key.
+
+    Rows with an empty key aggregate the stage over all keys.
+    """
+    by_stage = {}
+    rows = []
+    for (stage, key), samples in sorted(_timings.items()):
+        by_stage.setdefault(stage, []).extend(samples)
+        if key:
+            rows.append(_summary_row(stage, key, samples))
+    rows.extend(_summary_row(stage, '', samples) for stage, samples in sorted(by_stage.items()))
+    return rows
+
+
+def _summary_row(stage, key, samples):
+    ordered = sorted(samples)
+    return (stage, key, len(ordered), sum(ordered) * 1000, _percentile(ordered, 0.5) * 1000,
+            _percentile(ordered, 0.95) * 1000, ordered[-1] * 1000)
+
+
+def format_timing_summary():
+    """Plain text table of timing_summary() and the counters"""
+    lines = [f'{"stage":<16}{"bin spec":<28}{"n":>6}{"total":>10}{"p50":>9}{"p95":>9}{"max":>9}']
+    for stage, key, n, total, p50, p95, maximum in timing_summary():
+        lines.append(f'{stage:<16}{key or "(all)":<28}{n:>6}{total:>10.1f}{p50:>9.2f}{p95:>9.2f}{maximum:>9.2f}')
+    for name, value in sorted(_counters.items()):
+        lines.append(f'{name}: {value}')
+    return '\n'.join(lines)
+
+
+def export_timings(path: str):
+    """Save the raw samples, summary and counters as JSON"""
+    columns = ('stage', 'key', 'count', 'total_ms', 'p50_ms', 'p95_ms', 'max_ms')
+    data = {
+        'summary': [dict(zip(columns, row)) for row in timing_summary()],
+        'samples_ms': [{'stage': stage, 'key': key, 'values': [value * 1000 for value in samples]}
+                       for (stage, key), samples in sorted(_timings.items())],
+        'counters': dict(_counters),
+    }
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2)
@@ -0,0 +1,153 @@
+"""Persistent content-addressed cache of generated bin geometry.
+
+Files are stored under a hash of the bin spec, the grid profile and
+bin_geometry.GENERATOR_VERSION, so any change to one of them misses instead
+of returning stale geometry. The Fusion backend keeps `.f3d` archives, the
+mesh path STL and 3MF files. The directory is capped in size and the least
+recently used files are evicted first, a hit refreshes a file's mtime.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from . import bin_geometry
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(spec, profile):
+    """Hex digest identifying the geometry of a spec on a grid profile"""
+    data = [bin_geometry.GENERATOR_VERSION, list(profile[1:]),
+            spec.width, spec.length, spec.height, list(spec.compartments), list(spec.features)]
+    return hashlib.sha256(json.dumps(data, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class GeometryCache:
+    """Directory of cached geometry files with an LRU size cap and hit statistics"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None  # Bytes on disk, scanned on the first store
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def get(self, key, extension):
+        """Path of a cached file, or None on a miss.
+
+        A found file is not a hit yet, the caller reports with `record` whether
+        it could use it, so corrupt or evicted entries count as misses.
+        """
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        return path
+
+    def record(self, used):
+        """Count a file returned by `get` as a hit when it was used, else as a miss"""
+        if used:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key, extension, write):
+        """Store a file written by `write(temp_path)`, returns its cache path"""
+        path = self.path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writers such as Fusion's export manager expect the real extension
+        temp = os.path.join(os.path.dirname(path), f'{key}.{os.getpid()}.tmp{extension}')
+        try:
+            write(temp)
+            size = os.path.getsize(temp)
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        if self._size is None:
+            self._size = self.disk_usage()
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+        return path
+
+    def copy_to(self, key, extension, target):
+        """Copy a cached file to `target`, False on a miss"""
+        path = self.get(key, extension)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, target)
+        except OSError:
+            # Evicted by another process since get()
+            self.record(False)
+            return False
+        self.record(True)
+        return True
+
+    def _entries(self):
+        """(mtime, size, path) of every cached file"""
+        entries = []
+        try:
+            shards = os.scandir(self.directory)
+        except OSError:
+            return entries
+        with shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.is_file() and '.tmp' not in entry.name:
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_bytes=None):
+        """Delete least recently used files until the cache fits `target_bytes`.
+
+        Trims to 90% of the cap by default, so a full cache does not rescan
+        on every store.
+        """
+        target_bytes = self.max_bytes * 0.9 if target_bytes is None else target_bytes
+        entries = sorted(self._entries())
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, path in entries:
+            if size <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            self.evictions += 1
+        self._size = size
+
+    def clear(self):
+        self.evict(0)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def summary(self):
+        return (f'Geometry cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.0%}), '
+                f'{self.evictions} evicted')
@@ -0,0 +1,91 @@
+"""Grid profiles with precomputed derived dimensions.
+
+A profile wraps one entry of config.GRID_CONFIG (mm values) together with
+the values derived from it, Fusion's cm units among them. Profiles are
+built once per grid and reused, `GridSet` resolves the grid named on a
+batch row (or the default one) to its profile.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+MM_PER_CM = 10.0
+DIVIDER_HEIGHT_RATIO = 0.8  # Dividers stop below the rim
+DEFAULT_MINIMUM_FEATURE = 0.4  # mm, for profiles that do not set one
+# mm, standard Gridfinity 6x2 mm magnet sockets 8 mm in from the cell edges
+DEFAULT_MAGNET = {'magnet_diameter': 6.5, 'magnet_depth': 2.4, 'magnet_inset': 8.0}
+
+
+class GridProfile(NamedTuple):
+    """A grid system in mm with derived cm values for Fusion"""
+    name: str
+    base_unit: float
+    height_unit: float
+    xy_tolerance: float
+    wall_thickness: float
+    minimum_feature: float
+    base_unit_cm: float
+    height_unit_cm: float
+    xy_tolerance_cm: float
+    wall_thickness_cm: float
+    minimum_feature_cm: float
+    divider_height_per_unit: float  # mm of divider per height unit
+    magnet_diameter: float
+    magnet_depth: float
+    magnet_inset: float  # Socket centers from the cell edges, half a base unit or more centers one socket
+
+
+@lru_cache(maxsize=None)
+def _build_profile(name, items):
+    values = dict(items)
+    minimum_feature = values.get('minimum_feature', DEFAULT_MINIMUM_FEATURE)
+    return GridProfile(
+        name,
+        values['base_unit'],
+        values['height_unit'],
+        values['xy_tolerance'],
+        values['wall_thickness'],
+        minimum_feature,
+        values['base_unit'] / MM_PER_CM,
+        values['height_unit'] / MM_PER_CM,
+        values['xy_tolerance'] / MM_PER_CM,
+        values['wall_thickness'] / MM_PER_CM,
+        minimum_feature / MM_PER_CM,
+        values['height_unit'] * DIVIDER_HEIGHT_RATIO,
+        *(values.get(key, default) for key, default in DEFAULT_MAGNET.items()),
+    )
+
+
+def grid_profile(name, grid_config):
+    """Memoized profile of a config.GRID_CONFIG entry, rebuilt only if the entry changes"""
+    items = tuple(sorted((key, value) for key, value in grid_config.items()
+                         if isinstance(value, (int, float))))
+    return _build_profile(name, items)
+
+
+def as_profile(grid_config):
+    """Accept a GridProfile or a raw GRID_CONFIG dict"""
+    if isinstance(grid_config, GridProfile):
+        return grid_config
+    return grid_profile('', grid_config)
+
+
+class GridSet:
+    """The grid profiles available to a batch and the one rows use by default"""
+
+    def __init__(self, configs, default):
+        self.configs = configs
+        self.default = default
+        # Profiles are built up front, rows only look them up
+        self.profiles = {name: grid_profile(name, grid_config) for name, grid_config in configs.items()}
+        self.profile(default)
+
+    def profile(self, name=''):
+        profile = self.profiles.get(name or self.default)
+        if profile is None:
+            raise ValueError(f'unknown grid "{name}", expected one of {", ".join(sorted(self.configs))}')
+        return profile
+
+    def resolve(self, name=''):
+        """Validated grid name, '' means the default grid"""
+        return self.profile(name).name
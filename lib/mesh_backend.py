@@ -0,0 +1,222 @@
+"""Headless triangle mesh backend for bin generation.
+
+Builds bins as triangle meshes from the shared `bin_layout` without Fusion
+360, so geometry can be generated, measured and exported on any machine.
+Triangles are kept in a flat `array('f')` of 9 floats each (three xyz
+vertices, mm), the layout binary STL and bulk writers expect.
+
+Features come from `bin_features` like in the Fusion backend: the floor is
+raised over the socket depth and perforated by polygonal sockets of the
+magnet's area, scoops and label ledges are prisms along x that stop at the
+dividers they cross.
+"""
+
+import math
+from array import array
+
+from . import bin_features
+from . import bin_geometry
+
+SOCKET_SEGMENTS = 32  # Sides of a magnet socket, a multiple of 4
+ARC_SEGMENTS = 8  # Segments of a scoop's quarter round
+
+# Vertex order of the 12 triangles of a box, corners indexed as bit flags x|y<<1|z<<2
+_BOX_TRIANGLES = (
+    (0, 2, 3), (0, 3, 1),  # bottom (-z)
+    (4, 5, 7), (4, 7, 6),  # top (+z)
+    (0, 1, 5), (0, 5, 4),  # front (-y)
+    (2, 6, 7), (2, 7, 3),  # back (+y)
+    (0, 4, 6), (0, 6, 2),  # left (-x)
+    (1, 3, 7), (1, 7, 5),  # right (+x)
+)
+
+
+class Mesh:
+    """Triangle soup with outward facing counter-clockwise winding"""
+
+    def __init__(self, triangles=None):
+        self.triangles = triangles if triangles is not None else array('f')
+
+    @property
+    def triangle_count(self):
+        return len(self.triangles) // 9
+
+    def add_box(self, x0, y0, z0, x1, y1, z1):
+        xs = (x0, x1)
+        ys = (y0, y1)
+        zs = (z0, z1)
+        corners = [(xs[i & 1], ys[(i >> 1) & 1], zs[i >> 2]) for i in range(8)]
+        self.triangles.extend(
+            value
+            for triangle in _BOX_TRIANGLES
+            for corner in triangle
+            for value in corners[corner]
+        )
+
+    def add_quad(self, a, b, c, d):
+        """Planar convex quad, corners counter-clockwise seen from outside"""
+        self.triangles.extend(a + b + c + a + c + d)
+
+    def add_prism(self, profile, x0, x1):
+        """Extrude a (y, z) polygon from x0 to x1, it must be star-shaped from its first point"""
+        area = sum(y0 * z1 - y1 * z0 for (y0, z0), (y1, z1) in zip(profile, profile[1:] + profile[:1]))
+        if area < 0:
+            profile = profile[:1] + profile[:0:-1]
+        first = profile[0]
+        for (y0, z0), (y1, z1) in zip(profile[1:], profile[2:]):
+            self.triangles.extend((x1,) + first + (x1, y0, z0, x1, y1, z1))
+            self.triangles.extend((x0,) + first + (x0, y1, z1, x0, y0, z0))
+        for (y0, z0), (y1, z1) in zip(profile, profile[1:] + profile[:1]):
+            self.add_quad((x0, y0, z0), (x0, y1, z1), (x1, y1, z1), (x1, y0, z0))
+
+    def add_socket_tile(self, cx, cy, half, radius, z0, z1):
+        """Square slab of half size `half` around a polygonal hole of `radius`
+
+        Polygon corners lie on the rays through the square's corners, so each
+        ring segment between square and polygon is a convex quad.
+        """
+        rim = []
+        hole = []
+        for k in range(SOCKET_SEGMENTS):
+            angle = math.pi / 4 + 2 * math.pi * k / SOCKET_SEGMENTS
+            c, s = math.cos(angle), math.sin(angle)
+            reach = half / max(abs(c), abs(s))
+            rim.append((cx + reach * c, cy + reach * s))
+            hole.append((cx + radius * c, cy + radius * s))
+        for k in range(SOCKET_SEGMENTS):
+            (ax, ay), (bx, by) = rim[k], rim[k - SOCKET_SEGMENTS + 1]
+            (px, py), (qx, qy) = hole[k], hole[k - SOCKET_SEGMENTS + 1]
+            self.add_quad((ax, ay, z1), (bx, by, z1), (qx, qy, z1), (px, py, z1))
+            self.add_quad((ax, ay, z0), (px, py, z0), (qx, qy, z0), (bx, by, z0))
+            self.add_quad((ax, ay, z0), (bx, by, z0), (bx, by, z1), (ax, ay, z1))
+            self.add_quad((qx, qy, z0), (px, py, z0), (px, py, z1), (qx, qy, z1))
+
+    def extend(self, other):
+        self.triangles.extend(other.triangles)
+
+    def volume(self):
+        """Enclosed volume in mm^3 (divergence theorem over the triangles)"""
+        values = self.triangles
+        total = 0.0
+        for i in range(0, len(values), 9):
+            ax, ay, az, bx, by, bz, cx, cy, cz = values[i:i + 9]
+            total += ax * (by * cz - bz * cy) - ay * (bx * cz - bz * cx) + az * (bx * cy - by * cx)
+        return total / 6.0
+
+
+class MeshBackend(bin_geometry.BinBackend):
+    """Builds the shell, dividers and features of a bin as closed solids.
+
+    The shelled bin is emitted as a floor slab plus four walls, dividers sit
+    on the floor. Parts share faces but never overlap in volume.
+    """
+
+    name = 'mesh'
+
+    def generate_bin(self, width_units, length_units, height_units, compartments=(1, 1), features=None):
+        layout = self.layout(width_units, length_units, height_units, compartments)
+        geometry = bin_features.bin_features(self.profile, width_units, length_units, height_units,
+                                             compartments, features or ())
+        return build_mesh(layout, geometry)
+
+
+def build_mesh(layout, geometry=None):
+    """Mesh of a BinLayout with the BinFeatures of the bin, if any"""
+    mesh = Mesh()
+    half_w = layout.width / 2
+    half_l = layout.length / 2
+    wall = layout.wall
+    height = layout.height
+    floor = geometry.floor if geometry else wall
+
+    # Floor, perforated by the magnet sockets, and walls of the shelled box
+    if geometry and geometry.magnets:
+        add_socket_layer(mesh, layout, geometry)
+        mesh.add_box(-half_w, -half_l, geometry.magnet_depth, half_w, half_l, floor)
+    else:
+        mesh.add_box(-half_w, -half_l, 0, half_w, half_l, floor)
+    mesh.add_box(-half_w, -half_l, floor, half_w, -half_l + wall, height)
+    mesh.add_box(-half_w, half_l - wall, floor, half_w, half_l, height)
+    mesh.add_box(-half_w, -half_l + wall, floor, -half_w + wall, half_l - wall, height)
+    mesh.add_box(half_w - wall, -half_l + wall, floor, half_w, half_l - wall, height)
+
+    if layout.divider_height > floor:
+        for x0, y0, x1, y1 in layout.dividers:
+            mesh.add_box(x0, y0, floor, x1, y1, layout.divider_height)
+
+    if geometry:
+        for group in geometry.scoops:
+            for ledge in group.ledges:
+                add_ledge(mesh, layout, floor, group, ledge, scoop_profile(ledge, floor))
+        for group in geometry.labels:
+            for ledge in group.ledges:
+                add_ledge(mesh, layout, floor, group, ledge, label_profile(ledge, geometry.top))
+    return mesh
+
+
+def socket_radius(radius):
+    """Circumradius of the SOCKET_SEGMENTS polygon with the area of a circle of `radius`"""
+    return radius * math.sqrt(2 * math.pi / (SOCKET_SEGMENTS * math.sin(2 * math.pi / SOCKET_SEGMENTS)))
+
+
+def add_socket_layer(mesh, layout, geometry):
+    """The floor below the socket depth: a holed tile per socket, boxes around the tiles"""
+    half_w = layout.width / 2
+    half_l = layout.length / 2
+    radius = socket_radius(geometry.magnet_radius)
+    xs = sorted({x for x, _ in geometry.magnets})
+    ys = sorted({y for _, y in geometry.magnets})
+    # Tiles clear the socket and stay apart and inside the bin
+    gaps = [b - a for a, b in zip(xs, xs[1:])] + [b - a for a, b in zip(ys, ys[1:])]
+    edges = [half_w - abs(x) for x in xs] + [half_l - abs(y) for y in ys]
+    half = min([radius * 1.25] + [gap / 2 for gap in gaps] + edges)
+    depth = geometry.magnet_depth
+
+    tiles = [(x - half, y - half, x + half, y + half) for x, y in geometry.magnets]
+    for x, y in geometry.magnets:
+        mesh.add_socket_tile(x, y, half, radius, 0.0, depth)
+    for x0, y0, x1, y1 in _subtract_rects((-half_w, -half_l, half_w, half_l), tiles):
+        mesh.add_box(x0, y0, 0.0, x1, y1, depth)
+
+
+def _subtract_rects(outer, holes):
+    """Boxes covering `outer` minus non-overlapping `holes`, one per free x run of each y band"""
+    x0, y0, x1, y1 = outer
+    bounds = sorted({y0, y1} | {v for hole in holes for v in (hole[1], hole[3])})
+    rects = []
+    for band0, band1 in zip(bounds, bounds[1:]):
+        cuts = sorted((hole[0], hole[2]) for hole in holes if hole[1] <= band0 and hole[3] >= band1)
+        start = x0
+        for cut0, cut1 in cuts + [(x1, x1)]:
+            if cut0 > start:
+                rects.append((start, band0, cut0, band1))
+            start = max(start, cut1)
+    return rects
+
+
+def scoop_profile(ledge, floor):
+    """(y, z) polygon of a scoop, its corner at the wall foot first"""
+    y, size, direction = ledge
+    center_y, center_z = y + direction * size, floor + size
+    arc = [(center_y - direction * size * math.cos(t), center_z - size * math.sin(t))
+           for t in (math.pi / 2 * k / ARC_SEGMENTS for k in range(ARC_SEGMENTS + 1))]
+    return [(y, floor)] + arc
+
+
+def label_profile(ledge, top):
+    y, size, direction = ledge
+    return [(y, top), (y + direction * size, top), (y, top - size)]
+
+
+def add_ledge(mesh, layout, floor, group, ledge, profile):
+    """Extrude a ledge profile over its group's x extent, leaving out dividers it crosses"""
+    y0 = min(y for y, _ in profile)
+    y1 = max(y for y, _ in profile)
+    z0 = min(z for _, z in profile)
+    cuts = sorted((x0, x1) for x0, dy0, x1, dy1 in layout.dividers
+                  if dy0 <= y0 and dy1 >= y1 and layout.divider_height > z0 and x1 > group.x0 and x0 < group.x1)
+    start = group.x0
+    for cut0, cut1 in cuts + [(group.x1, group.x1)]:
+        if cut0 > start:
+            mesh.add_prism(profile, start, min(cut0, group.x1))
+        start = max(start, cut1)
@@ -0,0 +1,121 @@
+"""Binary STL and 3MF export of bin meshes.
+
+Each file is assembled in memory from the mesh's flat triangle array and
+written with a single buffer write. Batch export writes one file per unique
+bin spec plus a `manifest.csv` carrying the quantity of every spec, using
+the same BinSize/Compartments/Features/Quantity columns as batch configs.
+"""
+
+import csv
+import io
+import os
+import struct
+import zipfile
+from collections import Counter
+
+STL_HEADER = b'Gridfinity bin'
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_COLUMNS = ('File', 'Group', 'Grid', 'BinSize', 'Compartments', 'Features', 'Quantity')
+
+_3MF_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    '</Types>'
+)
+_3MF_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    '</Relationships>'
+)
+
+
+def spec_name(spec, grid):
+    """Stable file stem for a bin spec, e.g. bin_2x3x2_c1x2_magnet_micro_10mm"""
+    name = f'bin_{spec.width}x{spec.length}x{spec.height}_c{spec.compartments[0]}x{spec.compartments[1]}'
+    if spec.features:
+        name += '_' + '+'.join(spec.features)
+    return f'{name}_{grid}'
+
+
+def stl_bytes(mesh):
+    """Binary STL of a mesh.
+
+    Facet normals are written as zero, slicers derive them from the
+    counter-clockwise winding. The whole body is packed by one struct call.
+    """
+    count = mesh.triangle_count
+    body = struct.pack('<' + '12x9f2x' * count, *mesh.triangles)
+    return STL_HEADER.ljust(80, b' ') + struct.pack('<I', count) + body
+
+
+def write_stl(path, mesh):
+    data = stl_bytes(mesh)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def stl_triangle_count(path):
+    """Triangle count from a binary STL header"""
+    with open(path, 'rb') as file:
+        file.seek(80)
+        return struct.unpack('<I', file.read(4))[0]
+
+
+def model_xml(mesh, name):
+    """3MF model document with shared, de-duplicated vertices"""
+    values = mesh.triangles
+    index = {}
+    corners = [index.setdefault(vertex, len(index))
+               for vertex in zip(values[0::3], values[1::3], values[2::3])]
+    vertices = ''.join(f'<vertex x="{x:g}" y="{y:g}" z="{z:g}"/>' for x, y, z in index)
+    triangles = ''.join(f'<triangle v1="{a}" v2="{b}" v3="{c}"/>'
+                        for a, b, c in zip(corners[0::3], corners[1::3], corners[2::3]))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" '
+        'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        f'<resources><object id="1" name="{name}" type="model"><mesh>'
+        f'<vertices>{vertices}</vertices><triangles>{triangles}</triangles>'
+        '</mesh></object></resources><build><item objectid="1"/></build></model>'
+    )
+
+
+def write_3mf(path, mesh, name):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _3MF_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _3MF_RELS)
+        archive.writestr('3D/3dmodel.model', model_xml(mesh, name))
+    with open(path, 'wb') as file:
+        file.write(buffer.getvalue())
+
+
+def manifest_rows(jobs, grids):
+    """One manifest row per (group, grid, spec) with its quantity, in plan order"""
+    quantities = Counter((job.group, grids.resolve(job.grid), job.spec) for job in jobs)
+    rows = []
+    for (group, grid, spec), quantity in quantities.items():
+        unit = grids.profile(grid).base_unit
+        rows.append({
+            'File': spec_name(spec, grid),
+            'Group': group,
+            'Grid': grid,
+            'BinSize': f'{spec.width * unit:g}x{spec.length * unit:g}',
+            'Compartments': f'{spec.compartments[0]}x{spec.compartments[1]}',
+            'Features': '+'.join(('base',) + spec.features),
+            'Quantity': quantity,
+        })
+    return rows
+
+
+def write_manifest(directory, rows):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
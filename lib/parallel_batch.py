@@ -0,0 +1,167 @@
+"""Parallel headless batch generation.
+
+Unique (grid, spec) pairs of a plan are sharded across a ProcessPoolExecutor. Every
+worker builds meshes with the mesh backend and writes their exports, results
+are merged back in the order of the specs so output does not depend on
+scheduling. A failing spec is recorded in its result and never aborts the
+run, it is left out of the manifest. With a geometry cache directory, exports of specs built before are
+copied from the cache instead of being generated again.
+"""
+
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple, Optional, Tuple
+
+from . import geometry_cache
+from . import mesh_backend
+from . import mesh_export
+from .batch_planner import BinSpec
+
+SHARDS_PER_WORKER = 4  # Smaller shards keep workers busy when spec costs differ
+
+
+class SpecResult(NamedTuple):
+    index: int
+    spec: BinSpec
+    files: Tuple[str, ...]
+    triangles: int
+    seconds: float
+    worker: int
+    error: Optional[str] = None
+    grid: str = ''
+    cached: bool = False
+
+
+class BatchRunReport(NamedTuple):
+    results: Tuple[SpecResult, ...]
+    # worker pid -> (specs built, busy seconds)
+    worker_times: dict
+    wall_seconds: float
+    manifest: Optional[str]
+
+    @property
+    def failures(self):
+        return [result for result in self.results if result.error]
+
+    @property
+    def cache_hits(self):
+        return sum(1 for result in self.results if result.cached)
+
+
+def export_cached(cache, key, directory, name, formats):
+    """Copy every requested format of a spec from the cache, None unless all were cached"""
+    files = []
+    for extension in formats:
+        target = os.path.join(directory, name + '.' + extension)
+        if not cache.copy_to(key, '.' + extension, target):
+            return None
+        files.append(target)
+    return files
+
+
+def build_shard(shard, grid_configs, directory, formats, cache_directory=None,
+                cache_bytes=geometry_cache.DEFAULT_MAX_BYTES):
+    """Worker entry point: build and export every (index, (grid, spec)) of a shard"""
+    backends = {}
+    cache = geometry_cache.GeometryCache(cache_directory, cache_bytes) if cache_directory else None
+    formats = [extension for extension in ('stl', '3mf') if extension in formats]
+    results = []
+    for index, (grid, spec) in shard:
+        start = time.perf_counter()
+        try:
+            backend = backends.get(grid)
+            if backend is None:
+                backend = backends[grid] = mesh_backend.MeshBackend(grid_configs[grid])
+            name = mesh_export.spec_name(spec, grid)
+            key = geometry_cache.cache_key(spec, backend.profile)
+            if cache and directory:
+                files = export_cached(cache, key, directory, name, formats)
+                if files is not None:
+                    triangles = mesh_export.stl_triangle_count(files[0]) if 'stl' in formats else 0
+                    results.append(SpecResult(index, spec, tuple(files), triangles,
+                                              time.perf_counter() - start, os.getpid(),
+                                              grid=grid, cached=True))
+                    continue
+            mesh = backend.generate_bin(spec.width, spec.length, spec.height, spec.compartments,
+                                        {name: True for name in spec.features})
+            files = []
+            if directory:
+                if 'stl' in formats:
+                    files.append(os.path.join(directory, name + '.stl'))
+                    mesh_export.write_stl(files[-1], mesh)
+                if '3mf' in formats:
+                    files.append(os.path.join(directory, name + '.3mf'))
+                    mesh_export.write_3mf(files[-1], mesh, name)
+                if cache:
+                    for path in files:
+                        cache.put(key, os.path.splitext(path)[1],
+                                  lambda temp, path=path: shutil.copyfile(path, temp))
+            results.append(SpecResult(index, spec, tuple(files), mesh.triangle_count,
+                                      time.perf_counter() - start, os.getpid(), grid=grid))
+        except Exception:
+            results.append(SpecResult(index, spec, (), 0, time.perf_counter() - start,
+                                      os.getpid(), traceback.format_exc(), grid))
+    return results
+
+
+def shard_specs(specs, shard_count):
+    """Deterministic round-robin split of (index, (grid, spec)) pairs"""
+    indexed = list(enumerate(specs))
+    shard_count = max(1, min(shard_count, len(indexed)))
+    return [indexed[i::shard_count] for i in range(shard_count)]
+
+
+def succeeded_jobs(jobs, grids, results):
+    """Jobs whose spec was built, failed specs have no files to list in a manifest"""
+    failed = {(result.grid, result.spec) for result in results if result.error}
+    return [job for job in jobs if (grids.resolve(job.grid), job.spec) not in failed]
+
+
+def run_parallel(jobs, grids, directory=None, workers=None, formats=('stl', '3mf'),
+                 cache_directory=None, cache_bytes=geometry_cache.DEFAULT_MAX_BYTES):
+    """Generate (and export when `directory` is set) all unique specs of a plan.
+
+    `grids` is the GridSet the plan was built with. `workers` defaults to
+    the CPU count, 1 runs in-process without a pool. Exports are looked up
+    in and added to the geometry cache at `cache_directory` when given.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    specs = list(dict.fromkeys((grids.resolve(job.grid), job.spec) for job in jobs))
+    grid_configs = {grid: grids.configs[grid] for grid, _ in specs}
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    results = []
+    if workers == 1:
+        results.extend(build_shard(list(enumerate(specs)), grid_configs, directory, formats,
+                                   cache_directory, cache_bytes))
+    else:
+        shards = shard_specs(specs, workers * SHARDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build_shard, shard, grid_configs, directory, formats,
+                                       cache_directory, cache_bytes): shard
+                       for shard in shards}
+            for future in as_completed(futures):
+                try:
+                    results.extend(future.result())
+                except Exception:
+                    # The worker process itself died, fail every spec of its shard
+                    error = traceback.format_exc()
+                    results.extend(SpecResult(index, spec, (), 0, 0.0, 0, error, grid)
+                                   for index, (grid, spec) in futures[future])
+    results.sort(key=lambda result: result.index)
+
+    worker_times = {}
+    for result in results:
+        count, seconds = worker_times.get(result.worker, (0, 0.0))
+        worker_times[result.worker] = (count + 1, seconds + result.seconds)
+
+    manifest = None
+    if directory:
+        built = succeeded_jobs(jobs, grids, results)
+        manifest = mesh_export.write_manifest(directory, mesh_export.manifest_rows(built, grids))
+    return BatchRunReport(tuple(results), worker_times, time.perf_counter() - start, manifest)
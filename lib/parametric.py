@@ -0,0 +1,127 @@
+"""Expressions of parametric bins.
+
+Parametric bins are drawn from design user parameters shared by every bin
+of a grid (base unit, height unit, wall thickness and tolerance) instead of
+baked values, so one parameter edit resizes all of them in a single
+recompute. Only the bins follow: occurrence transforms cannot reference
+parameters, placed bins keep their centers and grow into neighbours spaced
+for the old size. Edits suit isolated bins, a tray is re-placed by running
+its batch again. Every XY coordinate of a bin layout is linear in the base unit
+and the wall thickness, its two coefficients are found by evaluating the
+layout on unit profiles.
+"""
+
+import re
+from typing import NamedTuple, Tuple
+
+from . import bin_geometry
+from . import grid_profiles
+
+PARAMETER_PREFIX = 'gf_'
+PARAMETERS = ('base_unit', 'height_unit', 'wall_thickness', 'xy_tolerance')
+PARAMETRIC_ATTRIBUTE = 'parametric'  # Grid a parametric bin component is driven by
+_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+_EPSILON = 1e-9
+
+
+def parameter_names(grid):
+    """User parameter name of every profile field of a grid"""
+    if not _NAME.match(grid):
+        raise ValueError(f'grid "{grid}" cannot be used in parameter names')
+    return {field: f'{PARAMETER_PREFIX}{grid}_{field}' for field in PARAMETERS}
+
+
+def profile_parameters(profile):
+    """(name, expression, comment) of the user parameters of a GridProfile"""
+    names = parameter_names(profile.name)
+    return [(names[field], f'{getattr(profile, field):g} mm', f'{profile.name} {field.replace("_", " ")}')
+            for field in PARAMETERS]
+
+
+def _number(value):
+    return f'{round(value, 9):.12g}'
+
+
+class LinearTerm(NamedTuple):
+    """A length of `base` base units plus `wall` wall thicknesses"""
+    base: float
+    wall: float
+
+    def value(self, profile):
+        """Length in mm on a GridProfile"""
+        return self.base * profile.base_unit + self.wall * profile.wall_thickness
+
+    def expression(self, grid, sign=1):
+        """Fusion expression of the term, or of its negation with `sign` -1"""
+        names = parameter_names(grid)
+        parts = []
+        for coefficient, name in ((self.base * sign, names['base_unit']),
+                                  (self.wall * sign, names['wall_thickness'])):
+            if abs(coefficient) < _EPSILON:
+                continue
+            if parts:
+                parts.append('-' if coefficient < 0 else '+')
+            elif coefficient < 0:
+                parts.append('-')
+            coefficient = abs(coefficient)
+            parts.append(name if abs(coefficient - 1) < _EPSILON else f'{_number(coefficient)} * {name}')
+        if parts and parts[0] == '-':
+            parts[:2] = ['-' + parts[1]]
+        return ' '.join(parts) or '0 mm'
+
+    def distance(self, grid, profile):
+        """Expression of the term's distance from the origin, None when it is zero"""
+        value = self.value(profile)
+        if abs(value) < _EPSILON:
+            return None
+        return self.expression(grid, 1 if value > 0 else -1)
+
+
+Rect = Tuple[LinearTerm, LinearTerm, LinearTerm, LinearTerm]
+
+
+class BinTerms(NamedTuple):
+    """Outline and divider footprints of a bin as (x0, y0, x1, y1) LinearTerms"""
+    outline: Rect
+    dividers: Tuple[Rect, ...]
+
+
+def _unit_layout(base_unit, wall_thickness, width_units, length_units, compartments):
+    profile = grid_profiles.grid_profile('', {'base_unit': base_unit, 'height_unit': 1.0,
+                                             'xy_tolerance': 0.0, 'wall_thickness': wall_thickness})
+    return bin_geometry.bin_layout(profile, width_units, length_units, 1, compartments)
+
+
+def bin_terms(width_units, length_units, compartments=(1, 1)):
+    """BinTerms of a bin, the same rectangles bin_layout computes in mm"""
+    per_base = _unit_layout(1.0, 0.0, width_units, length_units, compartments)
+    per_wall = _unit_layout(0.0, 1.0, width_units, length_units, compartments)
+
+    def rect(base_values, wall_values):
+        return tuple(LinearTerm(base, wall) for base, wall in zip(base_values, wall_values))
+
+    outline = rect((-per_base.width / 2, -per_base.length / 2, per_base.width / 2, per_base.length / 2),
+                   (0.0, 0.0, 0.0, 0.0))
+    dividers = tuple(rect(base, wall) for base, wall in zip(per_base.dividers, per_wall.dividers))
+    return BinTerms(outline, dividers)
+
+
+def height_expression(grid, height_units):
+    return f'{height_units} * {parameter_names(grid)["height_unit"]}'
+
+
+def divider_height_expression(grid, height_units):
+    return f'{height_expression(grid, height_units)} * {_number(grid_profiles.DIVIDER_HEIGHT_RATIO)}'
+
+
+def wall_expression(grid):
+    return parameter_names(grid)['wall_thickness']
+
+
+def retarget_expression(expression, old_grid, new_grid):
+    """Rewrite an expression referencing one grid's parameters to another grid's"""
+    old_names = parameter_names(old_grid)
+    new_names = parameter_names(new_grid)
+    for field in PARAMETERS:
+        expression = re.sub(rf'\b{re.escape(old_names[field])}\b', new_names[field], expression)
+    return expression
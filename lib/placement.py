@@ -0,0 +1,132 @@
+"""Bulk placement transforms and collision checks for a planned batch.
+
+All bins of a plan are handled as flat `array('d')` buffers instead of one
+Matrix3D per bin: 6 floats per bin for the bounding box (x0, y0, z0, x1,
+y1, z1, cm) and 16 per bin for the row-major 4x4 transform Fusion's
+`Matrix3D.setWithArray` takes. Snapping and overlap checks run on those
+buffers before anything is created in the design.
+"""
+
+from array import array
+from typing import NamedTuple
+
+from . import bin_geometry
+
+OVERLAP_TOLERANCE = 1e-4  # cm, bins sharing a face do not collide
+_IDENTITY = (1.0, 0.0, 0.0, 0.0,
+             0.0, 1.0, 0.0, 0.0,
+             0.0, 0.0, 1.0, 0.0,
+             0.0, 0.0, 0.0, 1.0)
+
+
+class Placement(NamedTuple):
+    """Per job bounding boxes and transforms of a plan, 6 and 16 floats per job"""
+    boxes: array
+    transforms: array
+
+    def __len__(self):
+        return len(self.boxes) // 6
+
+    def transform(self, index):
+        return self.transforms[index * 16:index * 16 + 16]
+
+    def box(self, index):
+        return tuple(self.boxes[index * 6:index * 6 + 6])
+
+    def translation(self, index):
+        """Snapped (x, y, z) translation of a job in cm"""
+        offset = index * 16
+        return self.transforms[offset + 3], self.transforms[offset + 7], self.transforms[offset + 11]
+
+
+def snap(center, half_size, step_cm):
+    """Move a bin center so its edge lies on the half grid step"""
+    half_step = step_cm / 2
+    return round((center - half_size) / half_step) * half_step + half_size
+
+
+def plan_placement(jobs, grids, snap_to_grid=True):
+    """Bounding boxes and transforms of every job in one pass, `grids` is a GridSet.
+
+    Bin edges snap to the default grid, the one trays are laid out on.
+    """
+    step = grids.profile().base_unit_cm
+    sizes = {}
+    boxes = array('d')
+    transforms = array('d', _IDENTITY * len(jobs))
+    for index, job in enumerate(jobs):
+        spec = job.spec
+        size = sizes.get((spec, job.grid))
+        if size is None:
+            profile = grids.profile(job.grid)
+            layout = bin_geometry.bin_layout(profile, spec.width, spec.length, spec.height)
+            size = sizes[spec, job.grid] = (layout.width / 20.0, layout.length / 20.0,
+                                            layout.height / 10.0)
+        half_w, half_l, height = size
+        x, y, z = job.translation
+        if snap_to_grid:
+            x = snap(x, half_w, step)
+            y = snap(y, half_l, step)
+        boxes.extend((x - half_w, y - half_l, z, x + half_w, y + half_l, z + height))
+        offset = index * 16
+        transforms[offset + 3] = x
+        transforms[offset + 7] = y
+        transforms[offset + 11] = z
+    return Placement(boxes, transforms)
+
+
+def _overlaps(a, b):
+    return all(a[axis] < b[axis + 3] - OVERLAP_TOLERANCE and b[axis] < a[axis + 3] - OVERLAP_TOLERANCE
+               for axis in range(3))
+
+
+def find_collisions(placement, existing=()):
+    """Overlapping pairs as (job index, other), other is a job index or ('existing', i).
+
+    Sweep and prune along x: boxes are visited by their left edge and only
+    compared with boxes whose x range is still open.
+    """
+    boxes = [placement.box(index) for index in range(len(placement))]
+    entries = [(box[0], index, box) for index, box in enumerate(boxes)]
+    entries += [(box[0], ('existing', index), tuple(box)) for index, box in enumerate(existing)]
+    entries.sort(key=lambda entry: entry[0])
+
+    collisions = []
+    active = []
+    for x0, key, box in entries:
+        active = [entry for entry in active if entry[2][3] - OVERLAP_TOLERANCE > x0]
+        for _, other_key, other_box in active:
+            if isinstance(key, tuple) and isinstance(other_key, tuple):
+                continue  # Existing occurrences are not our concern
+            if _overlaps(box, other_box):
+                pair = (other_key, key) if isinstance(key, tuple) else (key, other_key)
+                collisions.append(pair)
+        active.append((x0, key, box))
+    return collisions
+
+
+def box_collisions(boxes):
+    """Overlapping (i, j) index pairs, i < j, among (x0, y0, z0, x1, y1, z1) boxes"""
+    entries = sorted(enumerate(boxes), key=lambda entry: entry[1][0])
+    collisions = []
+    active = []
+    for index, box in entries:
+        active = [entry for entry in active if entry[1][3] - OVERLAP_TOLERANCE > box[0]]
+        for other, other_box in active:
+            if _overlaps(box, other_box):
+                collisions.append((min(index, other), max(index, other)))
+        active.append((index, box))
+    return sorted(collisions)
+
+
+def collision_errors(jobs, collisions, existing_names=()):
+    """BatchPlanError style (row, message) pairs for found collisions"""
+    errors = []
+    for index, other in collisions:
+        label = bin_geometry.spec_label(*jobs[index].spec)
+        if isinstance(other, tuple):
+            name = existing_names[other[1]] if other[1] < len(existing_names) else f'#{other[1]}'
+            errors.append((jobs[index].row, f'{label} bin overlaps existing occurrence {name}'))
+        else:
+            errors.append((jobs[index].row, f'{label} bin overlaps a bin from row {jobs[other].row}'))
+    return sorted(set(errors))
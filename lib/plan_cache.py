@@ -0,0 +1,116 @@
+"""Compiled batch plans cached next to their configs.
+
+A validated plan (jobs plus tray layout reports), or the row errors that
+stopped it, is pickled to `.index/<name>.g<group>.<grid>.plan` keyed by the
+SHA-256 of the config file, the grid profiles, the tray and PLAN_VERSION.
+Repeat runs of an unchanged config hash the file and unpickle, no row is
+parsed. Plans are compiled from batch_index.iter_records, which yields the
+same rows as batch_readers with or without a sidecar index, so a cached
+plan and its errors match plan_batch; PLAN_VERSION changes with that stream. Records are stored as plain tuples, not the NamedTuple classes, so
+a plan compiled by the CLI loads inside Fusion whatever the add-in's
+package name.
+"""
+
+import hashlib
+import os
+import pickle
+
+from . import batch_index
+from . import batch_planner
+from . import tray_layout
+
+PLAN_VERSION = 2  # Plans compiled while the index path dropped ungrouped rows are stale
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plan_key(digest, size_group, grids, tray):
+    """Everything a plan depends on besides the planner code"""
+    profiles = sorted(tuple(profile) for profile in grids.profiles.values())
+    return (PLAN_VERSION, digest, size_group, grids.default, tuple(tray), tuple(profiles))
+
+
+def plan_path(path, key):
+    """Cache file of a plan, one per config, size group and default grid"""
+    _, _, size_group, default_grid, _, _ = key
+    directory, name = os.path.split(path)
+    return os.path.join(directory, batch_index.INDEX_DIR, f'{name}.g{size_group}.{default_grid}.plan')
+
+
+def _pack_jobs(jobs):
+    return [(job.job_id, job.group, job.row, tuple(job.spec), job.translation, job.level,
+             job.auto_band, job.grid) for job in jobs]
+
+
+def _unpack_jobs(rows):
+    jobs = []
+    specs = {}
+    for job_id, group, row, spec, translation, level, auto_band, grid in rows:
+        # Jobs of the same bin share one spec tuple, as when planned from the file
+        spec = specs.get(spec) or specs.setdefault(spec, batch_planner.BinSpec(*spec))
+        jobs.append(batch_planner.BinJob(job_id, group, row, spec, translation, level, auto_band, grid))
+    return jobs
+
+
+def load_plan(path, key, reports=None):
+    """Jobs of a cached plan matching `key`, None on a miss.
+
+    Raises the cached BatchPlanError of a config that failed validation.
+    """
+    try:
+        with open(plan_path(path, key), 'rb') as file:
+            cached = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+    if cached['errors']:
+        raise batch_planner.BatchPlanError(os.path.basename(path), [tuple(error) for error in cached['errors']])
+    if reports is not None:
+        reports.extend(tray_layout.LayoutReport(*report) for report in cached['reports'])
+    return _unpack_jobs(cached['jobs'])
+
+
+def store_plan(path, key, jobs=(), reports=(), errors=()):
+    """Pickle a compiled plan, or the errors of an invalid one"""
+    target = plan_path(path, key)
+    data = {
+        'key': key,
+        'jobs': _pack_jobs(jobs),
+        'reports': [tuple(report) for report in reports],
+        'errors': [tuple(error) for error in errors],
+    }
+    batch_index.write_sidecar(target, lambda file: pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL),
+                              'wb')
+
+
+def compile_plan(path, size_group, grids, tray=batch_planner.DEFAULT_TRAY, reports=None, digest=None):
+    """Plan a config from its rows and cache the result, raises BatchPlanError like plan_batch"""
+    key = plan_key(digest or file_digest(path), size_group, grids, tray)
+    layouts = []
+    try:
+        jobs = batch_planner.plan_records(batch_index.iter_records(path, size_group), grids,
+                                          os.path.basename(path), tray, layouts)
+    except batch_planner.BatchPlanError as e:
+        store_plan(path, key, errors=e.errors)
+        raise
+    store_plan(path, key, jobs, layouts)
+    if reports is not None:
+        reports.extend(layouts)
+    return jobs
+
+
+def cached_plan(path, size_group, grids, tray=batch_planner.DEFAULT_TRAY, reports=None, digest=None):
+    """plan_batch through the plan cache, rows are only parsed when the config changed"""
+    digest = digest or file_digest(path)
+    jobs = load_plan(path, plan_key(digest, size_group, grids, tray), reports)
+    if jobs is None:
+        jobs = compile_plan(path, size_group, grids, tray, reports, digest)
+    return jobs
@@ -0,0 +1,131 @@
+"""Automatic bin layout for trays and drawers.
+
+Bins without a hand-written position are packed into the tray footprint on
+a grid of cells (one cell per grid unit). Occupancy is kept as one integer
+bitmask per cell row for every (group, level) layer, so checking a w x l
+spot is a handful of bit operations. Bins are placed first-fit decreasing
+by area. Hand-written positions are applied first and their cells marked
+occupied, they stay optional overrides.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+
+class LayoutReport(NamedTuple):
+    group: int
+    level: int
+    cells: int
+    used: int
+    placed: int
+    unplaced: int
+
+    @property
+    def fill_rate(self):
+        return self.used / self.cells if self.cells else 0.0
+
+    @property
+    def leftover(self):
+        return self.cells - self.used
+
+    def describe(self):
+        text = (f'group {self.group} level {self.level}: {self.placed} bins laid out, '
+                f'{self.fill_rate:.0%} filled, {self.leftover} cells free')
+        return text + (f', {self.unplaced} did not fit' if self.unplaced else '')
+
+
+class PackRequest(NamedTuple):
+    """A bin to place: size in cells and an optional preferred row range for its origin"""
+    key: object
+    width: int
+    length: int
+    rows: Optional[Tuple[int, int]] = None
+
+
+class OccupancyGrid:
+    """Cell occupancy of one tray layer as per-row bitmasks"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.full = (1 << columns) - 1
+        self.bits = [0] * rows
+        self.used = 0
+        # Lowest origin row still worth trying per bin shape, the grid only fills up
+        self._resume = {}
+
+    def mark(self, x, y, width, length):
+        """Occupy a block, clipped to the tray. Returns cells newly occupied"""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.columns, x + width), min(self.rows, y + length)
+        if x0 >= x1 or y0 >= y1:
+            return 0
+        mask = ((1 << (x1 - x0)) - 1) << x0
+        added = 0
+        for row in range(y0, y1):
+            added += bin(mask & ~self.bits[row]).count('1')
+            self.bits[row] |= mask
+        self.used += added
+        return added
+
+    def find(self, width, length, rows=None):
+        """First (x, y) where a width x length block fits, row-major, or None"""
+        if width > self.columns or length > self.rows:
+            return None
+        low, high = rows or (0, self.rows - length)
+        high = min(high, self.rows - length)
+        start = max(low, self._resume.get((width, length, rows), low))
+        for y in range(start, high + 1):
+            taken = 0
+            for row in range(y, y + length):
+                taken |= self.bits[row]
+            free = ~taken & self.full
+            # Bit x stays set only if cells x .. x+width-1 are all free
+            fits = free
+            shift = 1
+            while shift < width and fits:
+                span = min(shift, width - shift)
+                fits &= fits >> span
+                shift += span
+            if fits:
+                x = (fits & -fits).bit_length() - 1
+                self._resume[(width, length, rows)] = y
+                return x, y
+        self._resume[(width, length, rows)] = high + 1
+        return None
+
+    def place(self, width, length, rows=None):
+        """Find a spot for the block and occupy it, returns (x, y) or None"""
+        spot = self.find(width, length, rows)
+        if spot is not None:
+            x, y = spot
+            mask = ((1 << width) - 1) << x
+            for row in range(y, y + length):
+                self.bits[row] |= mask
+            self.used += width * length
+        return spot
+
+
+def pack(requests, columns, rows, fixed=()):
+    """Place requests into a columns x rows tray after marking `fixed` blocks.
+
+    `fixed` holds (x, y, width, length) cell blocks of hand placed bins.
+    Returns ({key: (x, y)}, [unplaced keys], OccupancyGrid).
+    """
+    grid = OccupancyGrid(columns, rows)
+    for x, y, width, length in fixed:
+        grid.mark(x, y, width, length)
+
+    placed = {}
+    unplaced = []
+    ordered = sorted(requests, key=lambda request: (-request.width * request.length,
+                                                    -request.length, -request.width))
+    for request in ordered:
+        spot = grid.place(request.width, request.length, request.rows)
+        if spot is None and request.rows is not None:
+            # The preferred band is full, anywhere in the tray will do
+            spot = grid.place(request.width, request.length)
+        if spot is None:
+            unplaced.append(request.key)
+        else:
+            placed[request.key] = spot
+    return placed, unplaced, grid